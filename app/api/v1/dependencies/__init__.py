@@ -1 +1 @@
-from .auth_dependencies import validate_login_request
+from .auth_dependencies import validate_login_request, delete_session
@@ -7,8 +7,9 @@ from app.core.security import (
     get_basic_headers
 )
 from app.core.config import settings
+from app.core.session_cache import session_cache
+from app.core.session_store import SessionRecord, session_store
 from app.schemas.auth_schemas import LoginParams
-from app.db.models import UserSession
 
 
 async def create_session(
@@ -17,7 +18,7 @@ async def create_session(
         ip_address: Optional[str] = None
 ) -> str:
     """
-    创建用户会话（基于MySQL），生成UUID作为会话ID
+    创建用户会话（写入配置的会话存储后端），生成UUID作为会话ID
     :param user_id: 用户唯一标识
     :param user_agent: 客户端User-Agent
     :param ip_address: 客户端IP地址
@@ -28,19 +29,31 @@ async def create_session(
     current_time = datetime.now(UTC)
     expires_at = current_time + timedelta(hours=settings.SESSION_EXPIRE_HOURS)
 
-    user_session = UserSession(
-        user_id=user_id,
+    record = SessionRecord(
         session_id=session_id,
-        created_at=current_time,
+        user_id=str(user_id),
         expires_at=expires_at,
         user_agent=user_agent,
         ip_address=ip_address
     )
-    await user_session.save()
+    await session_store.save(record)
+
+    # 重新登录时使该用户旧的缓存条目失效，并预热新会话
+    session_cache.invalidate_user(user_id)
+    session_cache.put(record)
 
     return session_id
 
 
+async def delete_session(session_id: str) -> None:
+    """
+    删除用户会话（登出），同时使本进程的缓存失效，其他 worker 的缓存通过会话存储中的撤销记录失效
+    :param session_id: 会话ID
+    """
+    session_cache.invalidate(session_id)
+    await session_store.delete(session_id)
+
+
 async def validate_login_request(
         payload: LoginParams,
         headers: Dict[str, str] = Depends(get_basic_headers)
@@ -1,9 +1,11 @@
+from datetime import datetime
 from typing import List, Dict, Optional, TypeAlias
 from fastapi import Depends, Query, Path
 from app.services.group_services.base_group_services import (
     query_groups_not_in_service,
     query_groups_in_service,
     query_group_notice_service,
+    query_group_history_service,
     create_group_service,
     join_group_service,
     leave_group_service,
@@ -110,6 +112,45 @@ async def query_group_notice_endpoint(
         raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法查看群公告')
 
 
+@group_router.get('/{group_uid}/messages', response_model=GroupMessageType)
+async def query_group_history_endpoint(
+    group_uid: str = Path(max_length=6),
+    limit: int = Query(default=50, ge=1, le=extra_params.MAX_GROUP_HISTORY_SIZE),
+    before: Optional[datetime] = Query(default=None),
+    user_id: int = Depends(get_current_user_id),
+) -> GroupMessageType:
+    """
+    分页查看指定群聊的历史消息
+    
+    :param group_uid: 群聊uid
+    :param limit: 返回的消息数量
+    :param before: 只返回早于此时间的消息，翻页时传入上一页最早一条消息的时间
+    :param user_id: 当前用户id，依赖自动获取
+    
+    :return: 按时间升序排列的历史消息
+    """
+    try:
+        response = await query_group_history_service(
+            user_id=user_id,
+            group_uid=group_uid,
+            limit=limit,
+            before=before,
+        )
+    except Exception as e:
+        err_logger.error(f'failed to get group history: {e} | params: user_id={user_id}; group_uid={group_uid}; before={before}')
+        raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法查看群消息')
+    
+    match response:
+        case 'user not in group':
+            raise ClientError(error_code=ErrorCodes.Forbidden, message="user not in group, can't view messages")
+        case _:
+            return {
+                'success': True,
+                'message': 'success in getting group history',
+                'data': {'group_messages': response}
+            }
+
+
 @group_router.post('/members/owner', response_model=Dict[str, bool | str | Dict[str, str]])
 async def create_group_endpoint(
     group_params: GroupSelfParams,
@@ -6,56 +6,102 @@ from fastapi import Query, Path, Depends
 from app.core.exceptions import ClientError, ServerError, UnAtomicError, ErrorCodes
 from app.core.security import get_current_user_id
 from app.core.extra_params import extra_params
-from app.schemas.card_schemas import StoreCardParams
+from app.schemas.card_schemas import StoreCardParams, MarketBuyParams
 from app.api.v1.endpoints.store_endpoints import store_router
 from app.services.store_services.store_card_services import (
     query_store_service,
     query_friend_store_service,
+    query_best_offers_service,
     list_card_service,
     delist_card_service,
-    buy_card_service
+    buy_card_service,
+    market_buy_card_service,
 )
 from app.services.user_services.user_user_services import confirm_friendship_service
 from log.log_config.service_logger import err_logger
 
 
 CardsType: TypeAlias = Dict[str, bool | str | Dict[str, List[StoreCardParams]]]
+StorePageType: TypeAlias = Dict[str, bool | str | Dict[str, Optional[str] | List[StoreCardParams]]]
 
 
-@store_router.get("/cards", response_model=CardsType)
+@store_router.get("/cards", response_model=StorePageType)
 async def query_card_endpoint(
     user_id: int = Depends(get_current_user_id),
     package: Optional[str] = Query(None, max_length=16),
     name_in: Optional[str] = Query(None, max_length=16),
     price_le: Optional[int] = Query(None, ge=0),
     price_ge: Optional[int] = Query(None, ge=0),
-) -> CardsType:
+    cursor: Optional[str] = Query(None, max_length=64),
+    page_size: int = Query(extra_params.STORE_PAGE_SIZE, ge=1, le=extra_params.MAX_STORE_PAGE_SIZE),
+) -> StorePageType:
     """
-    查看在售卡牌，包名即商店分区，可选名称或价格作为查询参数。
+    分页查看在售卡牌，包名即商店分区，可选名称或价格作为查询参数，按价格升序排列。
     
     :param user_id: 用户id
     :param package: 卡牌所属扩招包名称
     :param name_in: 卡牌名称中包含的字符串（模糊查询）
     :param price_le: 价格小于等于此值
     :param price_ge: 价格大于等于此值
+    :param cursor: 上一页返回的 next_cursor，不传时查询第一页
+    :param page_size: 每页数量
     
-    :return: 符合条件的在售卡牌
+    :return: 符合条件的在售卡牌，下一页的游标（没有下一页时为null）
     """
     try:
-        cards = await query_store_service(
+        cards, next_cursor = await query_store_service(
             user_id=user_id,
             package=package,
             name_in=name_in,
             price_le=price_le,
             price_ge=price_ge,
+            cursor=cursor,
+            page_size=page_size,
         )
         return {
             'success': True,
             'message': 'query card success',
+            'data': {'cards': cards, 'next_cursor': next_cursor}
+        }
+    except UnAtomicError as e:
+        match e.message:
+            case 'invalid cursor':
+                raise ClientError(error_code=ErrorCodes.InvalidParams, message='invalid cursor, please query from the first page')
+            case _:
+                raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法查看商店。')
+    except Exception as e:
+        err_logger.error(f'failed to query card from store: {e} | params: package={package}; name_in={name_in}; price={price_le}; price={price_ge}; cursor={cursor}')
+        raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法查看商店。')
+
+
+@store_router.get("/cards/{card_id}/offers", response_model=CardsType)
+async def query_best_offers_endpoint(
+    card_id: int = Path(ge=1),
+    limit: int = Query(10, ge=1, le=extra_params.MAX_STORE_OFFERS),
+    user_id: int = Depends(get_current_user_id),
+) -> CardsType:
+    """
+    查看指定卡牌价格最低的N个公开挂单
+    
+    :param card_id: 卡牌id
+    :param limit: 返回的挂单数量
+    :param user_id: 用户id
+    
+    :return: 按价格升序的在售卡牌
+    """
+    try:
+        cards = await query_best_offers_service(
+            card_id=card_id,
+            limit=limit,
+            user_id=user_id,
+        )
+        return {
+            'success': True,
+            'message': 'query best offers success',
             'data': {'cards': cards}
         }
     except Exception as e:
-        err_logger.error(f'failed to query card from store: {e} | params: package={package}; name_in={name_in}; price={price_le}; price={price_ge}')
+        err_logger.error(f'failed to query best offers from store: {e} | params: user_id={user_id}; card_id={card_id}; limit={limit}')
         raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法查看商店。')
 
 
@@ -185,6 +231,56 @@ async def buy_card(
         raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时不能购买卡牌。')
 
 
+@store_router.put('/cards/market', response_model=Dict[str, str | bool | Dict[str, int | List[Dict[str, int]]]])
+async def market_buy_card(
+    order: MarketBuyParams,
+    user_id: int = Depends(get_current_user_id),
+) -> Dict[str, str | bool | Dict[str, int | List[Dict[str, int]]]]:
+    """
+    市价购买商店中的卡牌，按价格从低到高在多个卖家的公开挂单中成交，单价不超过 max_price
+
+    :param order: 市价购买请求
+    :param user_id: 买家id，通过依赖获取
+    
+    :return: 成交数量、花费的比特和各挂单的成交明细
+    """
+    try:
+        fills, cost_byte = await market_buy_card_service(
+            user_id=user_id,
+            order=order,
+        )
+        filled_num = sum(fill.number for fill in fills)
+        return {
+            'success': True,
+            'message': f'success to buy {filled_num} cards, cost byte: {cost_byte}',
+            'data': {
+                'number': filled_num,
+                'cost_byte': cost_byte,
+                'fills': [fill.model_dump() for fill in fills],
+            }
+        }
+    
+    except UnAtomicError as e:
+        match e.message:
+            case 'card not found':
+                raise ClientError(error_code=ErrorCodes.NotFound, message='card not found')
+            case 'card not found with except_slippage':
+                raise ClientError(error_code=ErrorCodes.NotFound, message='no card on sale under the max price, please refresh the store and try again')
+            case 'card not enough':
+                raise ClientError(error_code=ErrorCodes.Conflict, message=f'only {e.extra["available"]} cards on sale under the max price', available=e.extra['available'])
+            case 'trade today too march':
+                raise ClientError(error_code=ErrorCodes.Forbidden, message=f'trading too frequently, you can only trade {extra_params.MAX_TRADE_DAY} times in 24 hour')
+            case 'user byte not enough':
+                raise ClientError(error_code=ErrorCodes.Conflict, message=f'byte not enough, need {e.extra["need_byte"]} byte at least。', need_byte=e.extra['need_byte'])
+            case 'user level not enough':
+                raise ClientError(error_code=ErrorCodes.Conflict, message=f'level not enough, this card will unlock at {e.extra["unlock_level"]} level', unlock_level=e.extra['unlock_level'])
+            case _:
+                raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时不能购买卡牌。')
+    except Exception as e:
+        err_logger.error(f'failed to market buy card from store: {e} | params: user_id={user_id}; order={order}')
+        raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时不能购买卡牌。')
+
+
 @store_router.put('/{store_user_id}/cards', response_model=Dict[str, str | bool | int])
 async def buy_friends_card(
     card_to_buy: StoreCardParams,
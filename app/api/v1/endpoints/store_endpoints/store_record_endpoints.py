@@ -1,13 +1,23 @@
-from typing import List, Dict, TypeAlias
-from fastapi import Depends
+from datetime import datetime
+from typing import AsyncIterator, List, Dict, Literal, Optional, TypeAlias
+from fastapi import Depends, Path, Query
+from fastapi.responses import StreamingResponse
 from app.core.security import get_current_user_id
 from app.core.exceptions import ErrorCodes, ServerError
-from app.schemas.record_schemas import StoreRecordParams
+from app.core.extra_params import extra_params
+from app.db.model_dependencies import MarketStatPeriod
+from app.schemas.record_schemas import StoreRecordParams, MarketStatParams
 from app.api.v1.endpoints.store_endpoints import store_router
-from app.services.store_services.store_record_services import query_buy_record_service, query_sell_record_service
+from app.services.store_services.store_record_services import (
+    query_buy_record_service,
+    query_sell_record_service,
+    export_trade_records_service,
+)
+from app.services.store_services.market_stats_services import query_market_stats_service
 from log.log_config.service_logger import err_logger
 
 RecordType: TypeAlias = Dict[str, bool | str | Dict[str, List[StoreRecordParams]]]
+MarketStatType: TypeAlias = Dict[str, bool | str | Dict[str, List[MarketStatParams]]]
 
 
 @store_router.get('/buy_record', response_model=RecordType)
@@ -46,3 +56,76 @@ async def query_sell_record_endpoint(
         'message': 'success in query sell record',
         'data': {'sell_record': sell_records}
     }
+
+
+@store_router.get('/records/export')
+async def export_trade_records_endpoint(
+    role: Literal['buy', 'sell'] = Query('buy'),
+    export_format: Literal['ndjson', 'csv'] = Query('ndjson', alias='format'),
+    days: int = Query(30, ge=1, le=extra_params.MAX_EXPORT_DAYS),
+    user_id: int = Depends(get_current_user_id),
+) -> StreamingResponse:
+    """
+    流式导出玩家自己的交易记录，边读取边写出，适合交易量大的玩家
+    
+    :param role: buy 为买入记录，sell 为出售记录
+    :param export_format: 导出格式，ndjson 或 csv
+    :param days: 导出最近多少天的记录
+    :param user_id: 用户id，通过依赖获取
+    
+    :return: 按交易时间升序的记录流
+    """
+    async def content() -> AsyncIterator[str]:
+        try:
+            async for chunk in export_trade_records_service(
+                user_id=user_id,
+                role=role,
+                export_format=export_format,
+                days=days,
+            ):
+                yield chunk
+        except Exception as e:
+            # 响应头已经发出，只能记录错误并中断输出
+            err_logger.error(f'failed to export trade records: {e} | params: user_id={user_id}; role={role}; format={export_format}; days={days}')
+            raise
+    
+    media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        content(),
+        media_type=f'{media_type}; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{role}_records.{export_format}"'},
+    )
+
+
+@store_router.get('/market/{card_id}/stats', response_model=MarketStatType)
+async def query_market_stats_endpoint(
+    card_id: int = Path(ge=1),
+    period: Literal['hour', 'day'] = Query('hour'),
+    limit: int = Query(24, ge=1, le=extra_params.MAX_MARKET_STAT_BUCKETS),
+    before: Optional[datetime] = Query(None),
+) -> MarketStatType:
+    """
+    获取卡牌的行情走势（按小时或按天的开高低收、成交量和成交量加权平均价）
+    
+    :param card_id: 卡牌id
+    :param period: 统计周期，hour 或 day
+    :param limit: 返回的区间数量
+    :param before: 只返回开始时间早于此时间的区间，用于向前翻页
+    
+    :return: 按时间升序排列的行情区间
+    """
+    try:
+        stats = await query_market_stats_service(
+            card_id=card_id,
+            period=MarketStatPeriod.HOUR if period == 'hour' else MarketStatPeriod.DAY,
+            limit=limit,
+            before=before,
+        )
+    except Exception as e:
+        err_logger.error(f'failed to query market stats: {e} | params: card_id={card_id}; period={period}; limit={limit}; before={before}')
+        raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法查看行情。')
+    return {
+        'success': True,
+        'message': 'success in query market stats',
+        'data': {'stats': stats}
+    }
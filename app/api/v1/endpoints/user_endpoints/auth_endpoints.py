@@ -1,10 +1,10 @@
 from datetime import datetime, UTC, timedelta
 from typing import Dict, Union
-from fastapi import Response, Depends
+from fastapi import Request, Response, Depends
 from app.core.exceptions import ErrorCodes, ServerError, ClientError
 from app.core.config import settings
 from app.api.v1.endpoints.user_endpoints import user_router
-from app.api.v1.dependencies import validate_login_request
+from app.api.v1.dependencies import validate_login_request, delete_session
 from app.schemas.auth_schemas import SignupParams
 from app.services.user_services.user_self_services import create_user
 from log.log_config.service_logger import info_logger, err_logger
@@ -55,6 +55,30 @@ async def login(
     else:
         raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法登录')
 
+
+@user_router.post("/logout", response_model=Dict[str, bool | str])
+async def logout(
+        request: Request,
+        response: Response,
+) -> Dict[str, bool | str]:
+    """
+    登出，删除当前会话
+    """
+    session_id = request.headers.get("session_id") or request.cookies.get("session_id")
+    try:
+        if session_id:
+            await delete_session(session_id)
+        response.delete_cookie(key="session_id", path='/')
+    except Exception as e:
+        err_logger.error(f"failed to logout: {e} | params: session_id={session_id}")
+        raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法登出')
+
+    return {
+        "success": True,
+        "message": "已登出"
+    }
+
+
 @user_router.post('/signup', response_model=Dict[str, bool | str])
 async def signup(signup_params: SignupParams) -> Dict[str, bool | str]:
     """
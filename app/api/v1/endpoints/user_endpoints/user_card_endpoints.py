@@ -6,18 +6,21 @@ from fastapi import Depends, Query
 
 from app.core.exceptions import ErrorCodes, ServerError, ClientError, UnAtomicError
 from app.core.security import get_current_user_id
-from app.schemas.card_schemas import UserCardParams, PullCardParams
+from app.core.extra_params import extra_params
+from app.schemas.card_schemas import UserCardParams, PullCardParams, CraftOperationParams, CraftResultParams
 from app.api.v1.endpoints.user_endpoints import user_router
 from app.services.user_services.user_card_services import (
     get_box_service,
     pull_card_service,
     compose_card_service,
-    decompose_card_service
+    decompose_card_service,
+    batch_craft_service
 )
 from log.log_config.service_logger import info_logger, err_logger
 
 
 CardsType: TypeAlias = Dict[str, bool | str | Dict[str, List[UserCardParams]]]
+CraftType: TypeAlias = Dict[str, bool | str | Dict[str, List[CraftResultParams]]]
 
 
 @user_router.get('/cards', response_model=CardsType)
@@ -167,3 +170,34 @@ async def decompose_card(
     except Exception as e:
         err_logger.error(f'fail to decompose card for user: {e} | params: user_id={user_id}; card_to_decompose={card_to_decompose}')
         raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法分解卡牌')
+
+
+@user_router.post('/cards/craft', response_model=CraftType)
+async def batch_craft_card(
+    operations: List[CraftOperationParams],
+    user_id: int = Depends(get_current_user_id),
+) -> CraftType:
+    """
+    批量合卡、分卡请求接口，所有操作在一个事务中完成
+    
+    :param operations: 按顺序执行的合成/分解操作
+    :param user_id: 玩家id
+    
+    :return: 每个操作的结果
+    """
+    if not operations or len(operations) > extra_params.MAX_CRAFT_BATCH:
+        raise ClientError(error_code=ErrorCodes.InvalidParams, message=f'operations should contain 1 to {extra_params.MAX_CRAFT_BATCH} items')
+    
+    try:
+        results = await batch_craft_service(
+            user_id=user_id,
+            operations=operations
+        )
+        return {
+            'success': True,
+            'message': 'batch craft finished',
+            'data': {'results': results}
+        }
+    except Exception as e:
+        err_logger.error(f'fail to batch craft card for user: {e} | params: user_id={user_id}; operations={operations}')
+        raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法合成或分解卡牌')
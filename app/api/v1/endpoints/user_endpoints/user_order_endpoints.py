@@ -6,7 +6,7 @@ from app.schemas.base_schemas import OrderParams
 from app.api.v1.endpoints.user_endpoints import user_router
 from app.services.user_services.user_order_services import (
     get_orders_service,
-    # generate_order_service,
+    generate_order_service,
     complete_order_service,
     delete_order_service,
 )
@@ -40,18 +40,28 @@ async def get_waiting_orders(
     }
     
 
-# @user_router.get('/orders/new', response_model=OrdersType)
-# async def get_new_orders(
-#     user_id: int = Depends(get_current_user_id),
-# ) -> OrdersType:
-#     """
-#     获取今日新订单（发起这个请求时订单才被创建）
-#
-#     :param user_id: 用户id
-#
-#     :return: 新的订单
-#     """
-#     pass
+@user_router.get('/orders/new', response_model=OrdersType)
+async def get_new_orders(
+    user_id: int = Depends(get_current_user_id),
+) -> OrdersType:
+    """
+    获取今日新订单（当天第一次发起这个请求时订单才被创建）
+
+    :param user_id: 用户id
+
+    :return: 新的订单，今天已经生成过订单时为空列表
+    """
+    try:
+        orders = await generate_order_service(user_id=user_id)
+    except Exception as e:
+        err_logger.error(f'failed to generate orders: {e} | params: user_id={user_id}')
+        raise ServerError(error_code=ErrorCodes.InternalServerError, message='服务器维护中，暂时无法获取新订单')
+    
+    return {
+        'success': True,
+        'message': 'get new orders successfully',
+        'data': {'orders': orders}
+    }
 
 
 @user_router.post('/orders/{order_id}', response_model=Dict[str, bool | str | Dict[str, int]])
@@ -22,6 +22,19 @@ class Settings:
 
     # 会话参数配置
     SESSION_EXPIRE_HOURS = 120
+    SESSION_STORE_BACKEND: str = 'mysql'    # 会话存储后端: mysql / memory / redis
+    SESSION_REDIS_URL: str = 'redis://localhost:6379/0'
+    SESSION_CACHE_MAX_SIZE: int = 10000     # 进程内会话缓存最大条目数
+    SESSION_CACHE_TTL_SECONDS: int = 300    # 会话缓存条目最长存活时间（秒），到期后回源数据库校验
+    SESSION_REVOCATION_CHECK_SECONDS: float = 1     # 会话缓存同步撤销记录的间隔（秒），其他 worker 登出的会话最多在此时间内仍被本进程接受
+
+    # 密码哈希线程池配置
+    HASH_POOL_MAX_WORKERS: int = 4      # 同时进行的Argon2计算数量
+    HASH_POOL_MAX_PENDING: int = 64     # 排队+执行中的最大任务数，超出后拒绝请求
+
+    # 卡牌目录配置
+    CARD_CATALOG_MAX_AGE_SECONDS: int = 0   # 卡牌目录自动重新加载的间隔（秒），0表示只在启动和手动刷新时加载
+
     SERVER_PORT: int = 8000
     SERVER_HOST: str = "127.0.0.1"
     ALLOWED_ORIGINS: list[str] = ["http://localhost:8000", "http://127.0.0.1:8000", "http://localhost:5173"]
@@ -69,3 +82,4 @@ TORTOISE_ORM_CONFIG = {
 current_dir = Path(__file__).parent.resolve()
 project_root = find_project_root(current_dir)
 frontend_dir = project_root / 'frontend'
+group_message_journal_dir = project_root / 'data' / 'group_message_journal'   # 群消息写入数据库之前的本地日志
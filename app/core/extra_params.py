@@ -2,6 +2,39 @@ class ExtraParams:
     MAX_GROUP_FOR_USER = 3
     MAX_GROUP_SIZE = 300
     MAX_TRADE_DAY = 300
+    TRADE_COUNTER_PRUNE_INTERVAL_SECONDS = 3600  # 清理滑出窗口的交易次数计数的间隔
+    MAX_CRAFT_BATCH = 50
+    SLIPPAGE_MATCH_ATTEMPTS = 5     # 滑点购买时最多尝试撮合的挂单数量
+    MAX_STORE_OFFERS = 50           # 单张卡牌最优报价查询的最大返回数量
+    MAX_MARKET_FILLS = 20           # 一次市价购买最多成交的挂单数量
+    STORE_ORDER_BOOK_RELOAD_SECONDS = 10    # 从商店表重建订单簿的间隔，同步其他 worker 进程的挂单变更
+    GROUP_NAME_INDEX_RELOAD_SECONDS = 10    # 从群聊表重建群聊名称索引的间隔，同步其他 worker 进程的群聊变更
+    STORE_PAGE_SIZE = 20            # 商店查询默认每页数量
+    MAX_STORE_PAGE_SIZE = 100       # 商店查询每页数量上限
+    MAX_MARKET_STAT_BUCKETS = 720   # 行情查询一次最多返回的区间数量
+    EXPORT_CHUNK_SIZE = 500         # 导出交易记录时每批读取的记录数量
+    MAX_EXPORT_DAYS = 90            # 导出交易记录的最大天数
+    ARCHIVE_AFTER_DAYS = 60         # 交易记录和群消息在原表中的保留天数，超过后移入归档表
+    ARCHIVE_BATCH_SIZE = 1000       # 归档时每个事务移动的记录数量
+    ARCHIVE_INTERVAL_SECONDS = 3600 # 归档任务的执行间隔
+    MAX_GROUP_HISTORY_SIZE = 100    # 群聊历史消息每页数量上限
+    ORDER_SWEEP_INTERVAL_SECONDS = 60   # 过期订单标记任务的执行间隔
+    ORDER_SWEEP_BATCH_SIZE = 1000       # 每条 UPDATE 标记的过期订单数量
+    DAILY_ORDER_COUNT = 24              # 每名玩家每日的订单数量
+    ORDER_MAX_KINDS = 3                 # 单个订单最多需要的卡牌种类
+    ORDER_GENERATION_BATCH_SIZE = 1000  # 批量生成订单时每批处理的玩家数量
+    ORDER_INSERT_BATCH_SIZE = 2000      # 每条多行 INSERT 写入的订单数量
+    ORDER_PREGENERATE = False           # 是否在每日零点为所有玩家预先生成订单，否则在玩家当日第一次请求时生成
+    LEDGER_RECONCILE_INTERVAL_SECONDS = 3600    # 比特流水对账任务的执行间隔
+    LEDGER_RECONCILE_BATCH_SIZE = 1000          # 对账时每批核对的玩家数量
+    CHAT_SEND_QUEUE_SIZE = 256                  # 每个群聊连接的发送队列长度
+    CHAT_SLOW_CONSUMER_POLICY = 'drop_oldest'   # 发送队列已满时的处理策略：drop_oldest 丢弃最早的消息，disconnect 断开连接
+    CHAT_METRICS_INTERVAL_SECONDS = 60          # 记录群聊发送队列指标的间隔
+    MAX_CHAT_CONNECTIONS_PER_USER = 5           # 同一用户同时在线的群聊连接（设备）数量上限
+    MAX_GROUP_MESSAGE_LENGTH = 1024             # 群消息内容的最大长度（与 group_message.content 一致）
+    GROUP_MESSAGE_FLUSH_SIZE = 200              # 群消息缓冲达到此数量时立即批量写入数据库
+    GROUP_MESSAGE_FLUSH_INTERVAL_MS = 50        # 群消息批量写入数据库的最长间隔（毫秒）
+    GROUP_MESSAGE_JOURNAL_FSYNC = False         # 群消息写入本地日志后是否同步到磁盘（防止机器掉电丢失，每条消息一次磁盘同步）
 
 
 extra_params = ExtraParams()
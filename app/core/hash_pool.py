@@ -0,0 +1,76 @@
+"""
+密码哈希线程池，避免 Argon2 计算阻塞事件循环
+"""
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+from passlib.context import CryptContext
+from app.core.exceptions import ErrorCodes, ClientError
+
+
+T = TypeVar('T')
+
+
+class PasswordHashPool:
+    """
+    有界的密码哈希线程池（argon2-cffi 计算期间会释放GIL）
+
+    - 线程数由 max_workers 限制
+    - 排队+执行中的任务数达到 max_pending 时直接拒绝（429），防止登录风暴堆积
+    - 记录任务在队列中的等待时间
+    """
+    def __init__(self, context: CryptContext, max_workers: int, max_pending: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password_hash')
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def hash(self, password: str) -> str:
+        """计算密码哈希"""
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """校验密码与哈希是否匹配"""
+        return await self._submit(self.context.verify, plain_password, hashed_password)
+
+    async def _submit(self, func: Callable[..., T], *args: Any) -> T:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ClientError(error_code=ErrorCodes.TooManyRequests, message='服务器繁忙，请稍后再试')
+
+        self.pending += 1
+        submitted_at = time.perf_counter()
+
+        def task() -> tuple[float, T]:
+            return time.perf_counter() - submitted_at, func(*args)
+
+        try:
+            wait_seconds, result = await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+        return result
+
+    def stats(self) -> Dict[str, int | float]:
+        """线程池排队统计"""
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'wait_seconds_avg': self.wait_seconds_total / self.completed if self.completed else 0.0,
+            'wait_seconds_max': self.wait_seconds_max,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
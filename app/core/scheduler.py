@@ -0,0 +1,115 @@
+"""
+进程内的周期任务调度
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from tortoise import timezone
+from log.log_config.service_logger import info_logger, err_logger
+
+
+@dataclass(slots=True)
+class PeriodicJob:
+    """周期任务"""
+    name: str
+    func: Callable[[], Awaitable[object]]
+    interval_seconds: float
+    run_at_start: bool = False
+    at: Optional[time] = None   # 每日执行的时间点，设置后忽略 interval_seconds
+
+
+class Scheduler:
+    """
+    在事件循环中按固定间隔执行异步任务，单次执行失败只记录日志，不影响下一次执行
+
+    多个 worker 进程会各自执行一份任务，注册的任务须能安全地并发执行（如按批加锁、以主键去重）
+    """
+    def __init__(self) -> None:
+        self._jobs: List[PeriodicJob] = []
+        self._tasks: Dict[str, asyncio.Task[None]] = {}
+
+    def every(
+        self,
+        interval_seconds: float,
+        func: Callable[[], Awaitable[object]],
+        name: str | None = None,
+        run_at_start: bool = False,
+    ) -> None:
+        """
+        注册周期任务，须在 start 之前调用
+
+        :param interval_seconds: 两次执行之间的间隔（从上一次执行结束开始计算）
+        :param func: 无参数的异步函数
+        :param name: 任务名称，用于日志，默认为函数名
+        :param run_at_start: 启动后是否立即执行一次
+        """
+        self._jobs.append(PeriodicJob(
+            name=name or func.__name__,
+            func=func,
+            interval_seconds=interval_seconds,
+            run_at_start=run_at_start,
+        ))
+
+    def daily(
+        self,
+        at: time,
+        func: Callable[[], Awaitable[object]],
+        name: str | None = None,
+        run_at_start: bool = False,
+    ) -> None:
+        """
+        注册每日任务，须在 start 之前调用
+
+        :param at: 每日执行的时间点（ORM 配置的时区）
+        :param func: 无参数的异步函数
+        :param name: 任务名称，用于日志，默认为函数名
+        :param run_at_start: 启动后是否立即执行一次
+        """
+        self._jobs.append(PeriodicJob(
+            name=name or func.__name__,
+            func=func,
+            interval_seconds=24 * 3600,
+            run_at_start=run_at_start,
+            at=at,
+        ))
+
+    @staticmethod
+    def _seconds_until(job: PeriodicJob) -> float:
+        if job.at is None:
+            return job.interval_seconds
+        now = timezone.now()
+        next_run = datetime.combine(now.date(), job.at, tzinfo=now.tzinfo)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    async def _run(self, job: PeriodicJob) -> None:
+        if not job.run_at_start:
+            await asyncio.sleep(self._seconds_until(job))
+        while True:
+            try:
+                await job.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                err_logger.error(f'periodic job failed: {e} | params: job={job.name}')
+            await asyncio.sleep(self._seconds_until(job))
+
+    async def start(self) -> None:
+        """启动所有已注册的任务（应用启动时调用）"""
+        for job in self._jobs:
+            if job.name not in self._tasks:
+                self._tasks[job.name] = asyncio.create_task(self._run(job), name=f'scheduler:{job.name}')
+                info_logger.info(f'periodic job started | params: job={job.name}; interval={job.interval_seconds}s; at={job.at}')
+
+    async def stop(self) -> None:
+        """取消所有任务并等待其退出（应用关闭时调用）"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+scheduler = Scheduler()
@@ -1,22 +1,29 @@
 import string
 import secrets
 from passlib.context import CryptContext
-from datetime import datetime, UTC
 from typing import Dict, Optional, Union
 from tortoise.exceptions import DoesNotExist
 from fastapi import Request, Depends
-from app.db.models import User, UserSession, Group
+from app.db.models import User, Group
 from app.core.config import settings
 from app.core.exceptions import ErrorCodes, RedirectionError, ClientError
+from app.core.hash_pool import PasswordHashPool
+from app.core.session_cache import session_cache
+from app.core.session_store import session_store
 
 
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# 密码哈希线程池
+password_hash_pool = PasswordHashPool(
+    context=pwd_context,
+    max_workers=settings.HASH_POOL_MAX_WORKERS,
+    max_pending=settings.HASH_POOL_MAX_PENDING,
+)
 
 
-def get_string_hash(password: str) -> str:
-    global pwd_context
-    return pwd_context.hash(password)
+async def get_string_hash(password: str) -> str:
+    return await password_hash_pool.hash(password)
 
 
 async def varify_password(
@@ -24,7 +31,6 @@ async def varify_password(
         plain_password: str
 ) -> Dict[str, Union[str, bool]]:
     """验证密码"""
-    global pwd_context
     try:
         user_item = await User.get(name=user_name).values('password', 'id')
     except DoesNotExist:
@@ -34,7 +40,7 @@ async def varify_password(
             'message': 'user does not exist'
         }
 
-    if pwd_context.verify(plain_password, user_item['password']):
+    if await password_hash_pool.verify(plain_password, user_item['password']):
         return {
             'success': True,
             'user_id': user_item['id'],
@@ -66,20 +72,22 @@ async def verify_session_id(request: Request) -> Optional[str]:
     if not session_id:
         return None
 
-    # 校验会话有效性
-    try:
-        session_item = await UserSession.get(
-            session_id=session_id,
-            expires_at__gt=datetime.now(UTC),
-            user_agent=request.headers.get("User-Agent", None),
-            ip_address=request.client.host
-        ).values('user_id')
+    user_agent = request.headers.get("User-Agent", None)
+    ip_address = request.client.host
 
-        user_id: str = session_item['user_id']
-        return user_id
+    # 1.优先从进程内缓存读取会话（先同步其他 worker 的登出），未命中时回源会话存储并写入缓存
+    await session_cache.sync_revocations(session_store)
+    record = session_cache.get(session_id)
+    if record is None:
+        record = await session_store.get(session_id)
+        if record is None:
+            return None
+        session_cache.put(record)
 
-    except DoesNotExist:
+    # 2.校验会话绑定的客户端信息
+    if record.user_agent != user_agent or record.ip_address != ip_address:
         return None
+    return record.user_id
 
 
 async def get_basic_headers(
@@ -0,0 +1,115 @@
+"""
+进程内会话缓存，位于会话存储（SessionStore）之前，命中时不再访问存储后端
+
+缓存是每个 worker 进程各自的，本进程登出时直接失效；其他 worker 登出的会话通过会话存储中的撤销记录失效，
+每 revocation_check_seconds 最多读取一次，因此其他 worker 登出的会话最多在这段时间内仍被本进程接受
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.session_store import SessionRecord, SessionStore
+
+
+class SessionCache:
+    """
+    有界 LRU 会话缓存
+
+    - 超过 max_size 时淘汰最久未使用的条目
+    - 条目在会话 expires_at 到期或缓存 ttl 到期时失效（取二者较早者）
+    - 登出/重新登录时通过 invalidate 显式失效，其他 worker 的登出通过 sync_revocations 失效
+    """
+    def __init__(self, max_size: int, ttl_seconds: int, revocation_check_seconds: float = 1):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.revocation_check_seconds = revocation_check_seconds
+        self._revocation_cursor: Optional[str] = None
+        self._revocation_checked_at = 0.0
+        # session_id -> (会话记录, 写入缓存的时间)
+        self._entries: OrderedDict[str, Tuple[SessionRecord, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def sync_revocations(self, store: SessionStore) -> None:
+        """
+        读取会话存储中新的撤销记录并使对应条目失效，距上一次读取不足 revocation_check_seconds 时直接返回（读取缓存前调用）
+
+        :param store: 记录撤销记录的会话存储
+        """
+        now = time.monotonic()
+        if self._revocation_cursor is not None and now - self._revocation_checked_at < self.revocation_check_seconds:
+            return
+        if self._revocation_cursor is None or now - self._revocation_checked_at > self.ttl_seconds:
+            # 第一次读取，或长时间未读取（期间的撤销记录可能已被清理）：清空缓存，从当前位置开始读取
+            self._entries.clear()
+            _, self._revocation_cursor = await store.revocations_since(None)
+        else:
+            revoked, self._revocation_cursor = await store.revocations_since(self._revocation_cursor)
+            for session_id in revoked:
+                self._entries.pop(session_id, None)
+        self._revocation_checked_at = now
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        """
+        读取未过期的会话条目，过期条目在此时被删除
+
+        :param session_id: 会话id
+
+        :return: 命中返回会话记录，否则返回None
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        record, cached_at = entry
+        if record.is_expired() or time.monotonic() - cached_at > self.ttl_seconds:
+            del self._entries[session_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return record
+
+    def put(self, record: SessionRecord) -> None:
+        """写入会话条目，超出容量时淘汰最久未使用的条目"""
+        self._entries[record.session_id] = (record, time.monotonic())
+        self._entries.move_to_end(record.session_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, session_id: str) -> None:
+        """使指定会话失效（登出时调用）"""
+        self._entries.pop(session_id, None)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """使指定用户的所有会话失效（重新登录时调用）"""
+        user_id = str(user_id)
+        stale = [sid for sid, (record, _) in self._entries.items() if record.user_id == user_id]
+        for session_id in stale:
+            del self._entries[session_id]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int | float]:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+session_cache = SessionCache(
+    max_size=settings.SESSION_CACHE_MAX_SIZE,
+    ttl_seconds=settings.SESSION_CACHE_TTL_SECONDS,
+    revocation_check_seconds=settings.SESSION_REVOCATION_CHECK_SECONDS,
+)
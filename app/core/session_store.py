@@ -0,0 +1,265 @@
+"""
+会话存储后端，create_session 与 verify_session_id 通过 SessionStore 读写会话
+
+- mysql: 基于 UserSession 表（默认，原有行为）
+- memory: 进程内字典，适用于单节点部署和测试
+- redis: 基于 Redis 协议的键值存储，会话随 key 过期自动清理
+
+删除会话（登出）时同时记录一条撤销记录，各 worker 的进程内会话缓存（app.core.session_cache）
+通过 revocations_since 增量读取，使其他 worker 登出的会话失效
+"""
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from tortoise import timezone
+from tortoise.exceptions import DoesNotExist
+from app.core.config import settings
+from app.db.models import UserSession, SessionRevocation
+
+
+# 撤销记录的保留时间：只需覆盖会话缓存条目的最长存活时间，更早缓存的条目已经过期
+REVOCATION_RETENTION_SECONDS = settings.SESSION_CACHE_TTL_SECONDS + settings.SESSION_REVOCATION_CHECK_SECONDS
+
+
+@dataclass(slots=True)
+class SessionRecord:
+    """会话记录"""
+    session_id: str
+    user_id: str
+    expires_at: datetime
+    user_agent: Optional[str]
+    ip_address: Optional[str]
+
+    def is_expired(self) -> bool:
+        return self.expires_at <= datetime.now(UTC)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'expires_at': self.expires_at.isoformat(),
+            'user_agent': self.user_agent,
+            'ip_address': self.ip_address,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SessionRecord':
+        return cls(
+            session_id=data['session_id'],
+            user_id=str(data['user_id']),
+            expires_at=as_aware(datetime.fromisoformat(data['expires_at'])),
+            user_agent=data.get('user_agent'),
+            ip_address=data.get('ip_address'),
+        )
+
+
+class SessionStore(ABC):
+    """会话存储抽象"""
+
+    @abstractmethod
+    async def save(self, record: SessionRecord) -> None:
+        """保存一条会话"""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        """读取未过期的会话，不存在或已过期返回None"""
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        """删除会话，并记录撤销记录"""
+
+    @abstractmethod
+    async def revocations_since(self, cursor: Optional[str]) -> Tuple[List[str], str]:
+        """
+        读取 cursor 之后撤销的会话
+
+        :param cursor: 上一次读取返回的位置，为None时只返回当前位置
+
+        :return: 撤销的会话id列表，新的读取位置
+        """
+
+
+class MySQLSessionStore(SessionStore):
+    """基于 UserSession 表的会话存储"""
+
+    async def save(self, record: SessionRecord) -> None:
+        await UserSession.create(
+            user_id=record.user_id,
+            session_id=record.session_id,
+            expires_at=record.expires_at,
+            user_agent=record.user_agent,
+            ip_address=record.ip_address,
+        )
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        try:
+            session_item = await UserSession.get(
+                session_id=session_id,
+                expires_at__gt=datetime.now(UTC),
+            ).values('user_id', 'expires_at', 'user_agent', 'ip_address')
+        except DoesNotExist:
+            return None
+
+        return SessionRecord(
+            session_id=session_id,
+            user_id=str(session_item['user_id']),
+            expires_at=as_aware(session_item['expires_at']),
+            user_agent=session_item['user_agent'],
+            ip_address=session_item['ip_address'],
+        )
+
+    async def delete(self, session_id: str) -> None:
+        await UserSession.filter(session_id=session_id).delete()
+        await SessionRevocation.create(session_id=session_id)
+        await SessionRevocation.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=REVOCATION_RETENTION_SECONDS),
+        ).delete()
+
+    async def revocations_since(self, cursor: Optional[str]) -> Tuple[List[str], str]:
+        if cursor is None:
+            last_id = await SessionRevocation.all().order_by('-id').first().values_list('id', flat=True)
+            return [], str(last_id or 0)
+        rows = await SessionRevocation.filter(id__gt=int(cursor)).order_by('id').values_list('id', 'session_id')
+        if not rows:
+            return [], cursor
+        return [session_id for _, session_id in rows], str(rows[-1][0])
+
+
+class MemorySessionStore(SessionStore):
+    """进程内会话存储，过期会话在读取或写入时被清理"""
+
+    def __init__(self) -> None:
+        self._sessions: Dict[str, SessionRecord] = {}
+        self._revocations: Deque[Tuple[int, float, str]] = deque()     # (序号, 撤销时间, 会话id)
+        self._revocation_sequence = 0
+
+    async def save(self, record: SessionRecord) -> None:
+        self._purge_expired()
+        self._sessions[record.session_id] = record
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        record = self._sessions.get(session_id)
+        if record is None:
+            return None
+        if record.is_expired():
+            del self._sessions[session_id]
+            return None
+        return record
+
+    async def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        now = time.monotonic()
+        self._revocation_sequence += 1
+        self._revocations.append((self._revocation_sequence, now, session_id))
+        while self._revocations[0][1] < now - REVOCATION_RETENTION_SECONDS:
+            self._revocations.popleft()
+
+    async def revocations_since(self, cursor: Optional[str]) -> Tuple[List[str], str]:
+        if cursor is None:
+            return [], str(self._revocation_sequence)
+        after = int(cursor)
+        return (
+            [session_id for sequence, _, session_id in self._revocations if sequence > after],
+            str(self._revocation_sequence),
+        )
+
+    def _purge_expired(self) -> None:
+        expired = [sid for sid, record in self._sessions.items() if record.is_expired()]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+
+class RedisSessionStore(SessionStore):
+    """
+    基于 Redis 协议的会话存储
+
+    client 需要提供 redis.asyncio.Redis 的 get / set(ex=) / delete / xadd / xrange / xrevrange 接口，
+    测试时可以传入 fakeredis.aioredis.FakeRedis。撤销记录写入 {key_prefix}revocations 流，按时间裁剪
+    """
+
+    def __init__(self, client: Any, key_prefix: str = 'session:') -> None:
+        self.client = client
+        self.key_prefix = key_prefix
+        self.revocation_key = f'{key_prefix}revocations'
+
+    def _key(self, session_id: str) -> str:
+        return f'{self.key_prefix}{session_id}'
+
+    async def save(self, record: SessionRecord) -> None:
+        ttl = int((record.expires_at - datetime.now(UTC)).total_seconds())
+        if ttl <= 0:
+            return
+        await self.client.set(self._key(record.session_id), json.dumps(record.to_dict()), ex=ttl)
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        raw = await self.client.get(self._key(session_id))
+        if raw is None:
+            return None
+        record = SessionRecord.from_dict(json.loads(raw))
+        if record.is_expired():
+            return None
+        return record
+
+    async def delete(self, session_id: str) -> None:
+        await self.client.delete(self._key(session_id))
+        # 流的id以毫秒时间戳开头，按 MINID 裁剪超过保留时间的记录
+        await self.client.xadd(
+            self.revocation_key,
+            {'session_id': session_id},
+            minid=int((time.time() - REVOCATION_RETENTION_SECONDS) * 1000),
+            approximate=True,
+        )
+
+    async def revocations_since(self, cursor: Optional[str]) -> Tuple[List[str], str]:
+        if cursor is None:
+            entries = await self.client.xrevrange(self.revocation_key, count=1)
+            return [], as_text(entries[0][0]) if entries else '0-0'
+        entries = await self.client.xrange(self.revocation_key, min=f'({cursor}')
+        if not entries:
+            return [], cursor
+        return (
+            [as_text(fields.get(b'session_id', fields.get('session_id'))) for _, fields in entries],
+            as_text(entries[-1][0]),
+        )
+
+
+def as_aware(value: datetime) -> datetime:
+    """数据库读出的时间可能不带时区（use_tz=False），统一按UTC处理"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value
+
+
+def as_text(value: bytes | str) -> str:
+    """Redis 客户端未开启 decode_responses 时返回 bytes"""
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def create_session_store(backend: str) -> SessionStore:
+    """
+    根据配置创建会话存储后端
+
+    :param backend: mysql / memory / redis
+
+    :return: 会话存储对象
+    """
+    match backend:
+        case 'mysql':
+            return MySQLSessionStore()
+        case 'memory':
+            return MemorySessionStore()
+        case 'redis':
+            try:
+                from redis import asyncio as redis_asyncio
+            except ImportError:
+                raise RuntimeError("SESSION_STORE_BACKEND='redis' 需要安装 redis 依赖: pip install .[redis]")
+            return RedisSessionStore(redis_asyncio.Redis.from_url(settings.SESSION_REDIS_URL))
+        case _:
+            raise ValueError(f'unknown session store backend: {backend}')
+
+
+session_store = create_session_store(settings.SESSION_STORE_BACKEND)
@@ -68,4 +68,21 @@ class TaskStatus(IntEnum):
     WAITING = 0
     CONFIRM = 1
     TIMEOUT = 2
-    
\ No newline at end of file
+    
+
+class MarketStatPeriod(IntEnum):
+    """
+    市场行情统计周期
+    """
+    HOUR = 0
+    DAY = 1
+
+
+class ByteLedgerReason(IntEnum):
+    """
+    比特流水的变动原因
+    """
+    OPENING = 0         # 对账时补记的期初余额（启用流水之前的余额）
+    PULL_CARD = 1       # 抽卡消耗
+    STORE_TRADE = 2     # 商店交易，买家为支出，卖家为收入
+    ORDER = 3           # 完成订单奖励
@@ -11,7 +11,9 @@ from app.db.model_dependencies import (
     Package,
     RestaurantBusiness,
     City,
-    TaskStatus
+    TaskStatus,
+    MarketStatPeriod,
+    ByteLedgerReason,
 )
 
 
@@ -175,7 +177,7 @@ class UserCard(Model):
 
 class UserSession(Model):
     """
-    用户会话表(后续考虑迁移到redis)
+    用户会话表(SESSION_STORE_BACKEND为mysql时使用，见app.core.session_store)
     """
     id = fields.IntField(pk=True)
     session_id = fields.CharField(max_length=36, description='会话id，36位uuid')
@@ -192,6 +194,25 @@ class UserSession(Model):
 
     class Meta:
         table = 'user_session'
+        indexes = [
+            ('session_id',),
+        ]
+
+
+class SessionRevocation(Model):
+    """
+    会话撤销记录表（SESSION_STORE_BACKEND为mysql时使用），登出时写入，
+    各 worker 的进程内会话缓存按自增id增量读取，使其他 worker 登出的会话失效；超过保留时间的记录在写入时清理
+    """
+    id = fields.IntField(pk=True)
+    session_id = fields.CharField(max_length=36, description='被撤销的会话id')
+    created_at = fields.DatetimeField(auto_now_add=True, description='撤销时间')
+
+    class Meta:
+        table = 'session_revocation'
+        indexes = [
+            ('created_at',),
+        ]
 
 
 class Group(Model):
@@ -281,6 +302,30 @@ class GroupMessage(Model):
     
     class Meta:
         table = 'group_message'
+        indexes = [
+            ('group', 'created_at'),
+        ]
+
+
+class GroupMessageArchive(Model):
+    """
+    群消息归档表，超过保留期的群消息（群公告除外）按批从 group_message 移入，
+    不再与群和用户建立外键，群或用户删除后归档记录仍然保留
+    """
+    id = fields.IntField(pk=True, generated=False, description='与原 group_message 记录的id相同')
+    group_id = fields.IntField(description='群组id')
+    user_id = fields.IntField(null=True, description='发送该消息的用户id')
+    message_type = fields.IntEnumField(enum_type=MessageType, default=MessageType.TEXT)
+    content = fields.CharField(max_length=1024, description='内容')
+    created_at = fields.DatetimeField()
+    month = fields.IntField(description='消息所在月份，如202601，便于按月清理归档')
+
+    class Meta:
+        table = 'group_message_archive'
+        indexes = [
+            ('group_id', 'created_at'),
+            ('month',),
+        ]
         
 
 class Store(Model):
@@ -308,6 +353,7 @@ class Store(Model):
         table = 'store'
         indexes = [
             ("card", "is_publish", "price"),
+            ("is_publish", "price", "id"),     # 商店分页查询按 (price, id) 游标翻页
         ]
         unique_together = (('card', 'owner'),)
 
@@ -341,6 +387,76 @@ class StoreRecord(Model):
         ]
 
 
+class TradeCounter(Model):
+    """
+    买家交易次数计数表，按时间分桶记录每名买家的交易次数，在购买事务中原子地增加并校验滑动窗口内的总次数，
+    多个 worker 进程共享同一份计数
+    """
+    id = fields.IntField(pk=True)
+    user: fields.ForeignKeyRelation["User"] = fields.ForeignKeyField(
+        model_name='models.User',
+        related_name='trade_counter',
+        on_delete=fields.CASCADE,
+    )
+    bucket = fields.IntField(description='桶起始时间（unix 时间戳，秒）')
+    number = fields.IntField(default=0, description='桶内的交易次数')
+
+    class Meta:
+        table = 'trade_counter'
+        unique_together = (('user', 'bucket'),)
+        indexes = [
+            ('bucket',),    # 清理滑出窗口的桶
+        ]
+
+
+class StoreRecordArchive(Model):
+    """
+    交易记录归档表，超过保留期的交易记录按批从 store_record 移入，
+    不再与用户和卡牌建立外键，用户删除后归档记录仍然保留
+    """
+    id = fields.IntField(pk=True, generated=False, description='与原 store_record 记录的id相同')
+    buyer_id = fields.IntField(description='买家id')
+    seller_id = fields.IntField(description='卖家id')
+    card_id = fields.IntField(description='卡牌id')
+    number = fields.IntField(description='交易数量')
+    price = fields.IntField(description='交易单价')
+    created_at = fields.DatetimeField(description='交易时间')
+    month = fields.IntField(description='交易所在月份，如202601，便于按月清理归档')
+
+    class Meta:
+        table = 'store_record_archive'
+        indexes = [
+            ('buyer_id', 'created_at'),
+            ('seller_id', 'created_at'),
+            ('month',),
+        ]
+
+
+class MarketStat(Model):
+    """
+    市场行情表，按卡牌和统计周期聚合成交记录，在写入交易记录的同一事务中增量更新
+    """
+    id = fields.IntField(pk=True)
+    card: fields.ForeignKeyRelation["Card"] = fields.ForeignKeyField(
+        model_name='models.Card',
+        related_name='market_stat',
+        on_delete=fields.CASCADE,
+    )
+    period = fields.IntEnumField(enum_type=MarketStatPeriod, description='0为按小时统计，1为按天统计')
+    bucket_start = fields.DatetimeField(description='统计区间的开始时间')
+    open = fields.IntField(description='区间内第一笔成交单价')
+    high = fields.IntField(description='区间内最高成交单价')
+    low = fields.IntField(description='区间内最低成交单价')
+    close = fields.IntField(description='区间内最后一笔成交单价')
+    volume = fields.IntField(default=0, description='区间内成交卡牌数量')
+    turnover = fields.BigIntField(default=0, description='区间内成交总额（单价*数量之和），turnover/volume 即成交量加权平均价')
+    trades = fields.IntField(default=0, description='区间内成交笔数')
+
+    class Meta:
+        table = 'market_stat'
+        unique_together = (('card', 'period', 'bucket_start'),)
+
+
 class Order(Model):
     """
     订单表
@@ -350,7 +466,7 @@ class Order(Model):
         model_name='models.User',
         related_name='order',
     )
-    require_card: Dict[int, int] = fields.JSONField(default=dict, description='订单需要的卡牌，键为卡牌id，值为数量')
+    require_card: Dict[str, int] = fields.JSONField(default=dict, description='订单需要的卡牌，键为卡牌id字符串，值为数量')
     byte = fields.IntField(description='完成订单可以获得的比特')
     exp = fields.IntField(description='完成订单可以获得的经验')
     status = fields.IntEnumField(
@@ -364,6 +480,32 @@ class Order(Model):
     
     class Meta:
         table = 'order'
+        indexes = [
+            ('user', 'status', 'expires_at'),   # 查看玩家待完成的订单
+            ('status', 'expires_at'),           # 批量标记过期订单
+        ]
+
+
+class ByteLedger(Model):
+    """
+    比特流水表，只追加不修改，每次比特变动在修改 user.byte 的同一事务中写入一条，
+    玩家的流水之和应等于其比特余额，由对账任务定期核对
+    """
+    id = fields.BigIntField(pk=True)
+    user: fields.ForeignKeyRelation["User"] = fields.ForeignKeyField(
+        model_name='models.User',
+        related_name='byte_ledger',
+    )
+    delta = fields.IntField(description='比特变动量，收入为正，支出为负')
+    reason = fields.IntEnumField(enum_type=ByteLedgerReason, description='0为期初余额，1为抽卡，2为商店交易，3为完成订单')
+    ref_id = fields.IntField(null=True, description='关联的业务id：商店交易为卡牌id，订单为订单id')
+    created_at = fields.DatetimeField(auto_now_add=True, description='变动时间')
+
+    class Meta:
+        table = 'byte_ledger'
+        indexes = [
+            ('user', 'reason'),
+        ]
 
 
 class Restaurant(Model):
@@ -0,0 +1,118 @@
+"""
+原生 SQL 的方言差异
+
+批量写入原语（grant_cards、consume_cards、apply_byte_deltas、record_trades、交易次数计数）用原生 SQL 完成条件更新和 upsert，
+占位符、标识符引号、upsert 语法和加锁读取在 MySQL 与 SQLite（测试）之间不同，统一由 SqlDialect 拼接。
+只支持这两种数据库，应用启动时由 check_sql_dialect 校验配置的数据库，不支持时启动失败，而不是在请求中报错
+"""
+from dataclasses import dataclass
+from typing import Dict, Mapping, Sequence, Tuple, Type
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.models import Model
+
+
+class UnsupportedDialectError(RuntimeError):
+    """配置的数据库不支持批量写入原语使用的原生 SQL"""
+
+
+@dataclass(frozen=True, slots=True)
+class SqlDialect:
+    """一种数据库的 SQL 写法"""
+    name: str
+    placeholder: str            # 参数占位符
+    quote_char: str             # 标识符引号
+    excluded_format: str        # upsert 中引用待插入的值，{column} 为加引号的列名
+    greatest_function: str      # 多参数取最大值的函数
+    least_function: str         # 多参数取最小值的函数
+    for_update: str             # 加锁读取的后缀，不支持行锁的数据库为空
+
+    def quote(self, identifier: str) -> str:
+        return f'{self.quote_char}{identifier}{self.quote_char}'
+
+    def excluded(self, column: str) -> str:
+        """upsert 中待插入行的列值"""
+        return self.excluded_format.format(column=self.quote(column))
+
+    def increment(self, column: str) -> str:
+        """upsert 时在已有值上累加待插入的值"""
+        return f'{self.quote(column)} + {self.excluded(column)}'
+
+    def greatest(self, column: str) -> str:
+        return f'{self.greatest_function}({self.quote(column)}, {self.excluded(column)})'
+
+    def least(self, column: str) -> str:
+        return f'{self.least_function}({self.quote(column)}, {self.excluded(column)})'
+
+    def placeholders(self, count: int) -> str:
+        """逗号分隔的 count 个占位符"""
+        return ', '.join([self.placeholder] * count)
+
+    def insert(self, table: str, columns: Sequence[str], rows: int) -> str:
+        """多行 INSERT 语句，参数按行依次排列"""
+        row = f'({self.placeholders(len(columns))})'
+        return (
+            f'INSERT INTO {self.quote(table)} ({", ".join(self.quote(column) for column in columns)}) '
+            f'VALUES {", ".join([row] * rows)}'
+        )
+
+    def upsert(self, conflict_columns: Sequence[str], assignments: Mapping[str, str]) -> str:
+        """
+        INSERT 之后的冲突处理子句
+
+        :param conflict_columns: 唯一索引的列（MySQL 由 ON DUPLICATE KEY 自动匹配，SQLite 需要显式指定）
+        :param assignments: {列名: 新值表达式}，表达式用 excluded/increment/greatest/least 引用待插入的值
+        """
+        updates = ', '.join(f'{self.quote(column)} = {expression}' for column, expression in assignments.items())
+        if self.name == 'mysql':
+            return f'ON DUPLICATE KEY UPDATE {updates}'
+        conflict = ', '.join(self.quote(column) for column in conflict_columns)
+        return f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}'
+
+
+DIALECTS: Dict[str, SqlDialect] = {
+    'mysql': SqlDialect(
+        name='mysql',
+        placeholder='%s',
+        quote_char='`',
+        excluded_format='VALUES({column})',
+        greatest_function='GREATEST',
+        least_function='LEAST',
+        for_update=' FOR UPDATE',
+    ),
+    'sqlite': SqlDialect(
+        name='sqlite',
+        placeholder='?',
+        quote_char='"',
+        excluded_format='excluded.{column}',
+        greatest_function='MAX',
+        least_function='MIN',
+        # SQLite 的写事务对整个数据库加锁
+        for_update='',
+    ),
+}
+
+
+def get_dialect(name: str) -> SqlDialect:
+    try:
+        return DIALECTS[name]
+    except KeyError:
+        raise UnsupportedDialectError(
+            f'unsupported database dialect: {name}, supported: {", ".join(DIALECTS)}'
+        ) from None
+
+
+def model_connection(model: Type[Model]) -> Tuple[BaseDBAsyncClient, SqlDialect]:
+    """
+    模型当前使用的连接（在事务中时为事务的连接）及其方言
+
+    :return: (连接, 方言)
+    """
+    connection = model._meta.db
+    return connection, get_dialect(connection.capabilities.dialect)
+
+
+async def check_sql_dialect() -> None:
+    """校验所有已配置的数据库连接都受支持（应用启动时在 ORM 初始化之后调用）"""
+    for connection in connections.all():
+        get_dialect(connection.capabilities.dialect)
@@ -1,3 +1,4 @@
+from datetime import time
 from tortoise.contrib.fastapi import register_tortoise
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,8 +6,21 @@ from fastapi.exceptions import RequestValidationError
 from app.core.config import TORTOISE_ORM_CONFIG, settings
 from app.core.exceptions import RedirectionError, ServerError, ClientError, handle_http_exception
 from app.core.middleware import log_middleware
-from app.core.security import validate_session_request
+from app.core.security import validate_session_request, password_hash_pool
+from app.core.extra_params import extra_params
+from app.core.scheduler import scheduler
+from app.db.sql_dialect import check_sql_dialect
 from app.api.v1.endpoints import card_router, user_router, store_router, group_router
+from app.services.card_services.card_catalog import card_catalog
+from app.services.card_services.gacha_tables import gacha_tables
+from app.services.store_services.store_order_book import store_order_book
+from app.services.store_services.trade_limiter import prune_trade_counters_job
+from app.services.group_services.group_name_index import group_name_index
+from app.services.archive_services.record_archive_services import archive_records_job
+from app.services.user_services.user_order_services import expire_orders_job, generate_daily_orders_job
+from app.services.user_services.user_balance_services import reconcile_byte_ledger_job
+from app.services.group_services.group_chat_services import log_chat_queue_metrics_job
+from app.services.group_services.group_message_journal import group_message_journal
 
 
 app = FastAPI(
@@ -42,6 +56,40 @@ app.exception_handler(ClientError)(handle_http_exception)
 app.exception_handler(ServerError)(handle_http_exception)
 app.exception_handler(RequestValidationError)(handle_http_exception)
 
+# 启动时校验数据库方言，批量写入原语的原生 SQL 只支持 MySQL 和 SQLite
+app.add_event_handler("startup", check_sql_dialect)
+# 启动时加载卡牌目录并预先构建抽卡概率表
+app.add_event_handler("startup", card_catalog.load)
+app.add_event_handler("startup", gacha_tables.warm)
+# 启动时从商店表构建订单簿
+app.add_event_handler("startup", store_order_book.load)
+# 启动时加载群聊名称索引
+app.add_event_handler("startup", group_name_index.load)
+# 启动时重放未写入数据库的群消息日志并启动后台批量写入，关闭时写入剩余的消息
+app.add_event_handler("startup", group_message_journal.start)
+app.add_event_handler("shutdown", group_message_journal.stop)
+# 周期任务：重建订单簿，同步其他 worker 进程的挂单变更
+scheduler.every(extra_params.STORE_ORDER_BOOK_RELOAD_SECONDS, store_order_book.load, name='reload_store_order_book')
+# 周期任务：重建群聊名称索引，同步其他 worker 进程的群聊创建、改名和解散
+scheduler.every(extra_params.GROUP_NAME_INDEX_RELOAD_SECONDS, group_name_index.load, name='reload_group_name_index')
+# 周期任务：归档过期的交易记录和群消息
+scheduler.every(extra_params.ARCHIVE_INTERVAL_SECONDS, archive_records_job, run_at_start=True)
+# 周期任务：清理滑出24小时窗口的交易次数计数
+scheduler.every(extra_params.TRADE_COUNTER_PRUNE_INTERVAL_SECONDS, prune_trade_counters_job)
+# 周期任务：批量标记过期订单
+scheduler.every(extra_params.ORDER_SWEEP_INTERVAL_SECONDS, expire_orders_job, run_at_start=True)
+# 周期任务：核对比特余额与流水，为启用流水之前的玩家补记期初余额
+scheduler.every(extra_params.LEDGER_RECONCILE_INTERVAL_SECONDS, reconcile_byte_ledger_job)
+# 周期任务：记录群聊发送队列指标
+scheduler.every(extra_params.CHAT_METRICS_INTERVAL_SECONDS, log_chat_queue_metrics_job)
+# 每日任务：为所有玩家预先生成当日订单（未开启时在玩家当日第一次请求 /player/orders/new 时生成）
+if extra_params.ORDER_PREGENERATE:
+    scheduler.daily(time(0, 0, 5), generate_daily_orders_job)
+app.add_event_handler("startup", scheduler.start)
+app.add_event_handler("shutdown", scheduler.stop)
+# 关闭时释放密码哈希线程池
+app.add_event_handler("shutdown", password_hash_pool.shutdown)
+
 
 if __name__ == '__main__':
     import uvicorn
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Literal, Optional
 from pydantic import Field
 from app.schemas import BaseParams
 from app.db.model_dependencies import Package
@@ -50,6 +50,25 @@ class StoreCardParams(CardParams):
         return f'<UserCardParams (card_id={self.card_id}; name={self.name}; image={self.image}; rarity={self.rarity}; package={self.package}; store_id={self.store_id}; number={self.number}; price={self.price}; is_publish={self.is_publish})>'
 
     
+class MarketBuyParams(BaseParams):
+    """
+    市价购买请求模型，按价格从低到高依次从多个卖家的公开挂单中成交
+    """
+    card_id: int = Field(ge=1, title='卡牌id')
+    number: int = Field(ge=1, title='购买数量')
+    max_price: int = Field(ge=1, title='可接受的最高单价')
+    allow_partial: bool = Field(default=False, title='是否允许部分成交', description='否则可成交数量不足时整单失败')
+
+
+class MarketFillParams(BaseParams):
+    """
+    市价购买中与单个挂单的成交
+    """
+    store_id: int = Field(ge=1, title='卡牌的商店id')
+    number: int = Field(ge=1, title='成交数量')
+    price: int = Field(ge=1, title='成交单价')
+
+    
 class UserCardParams(CardParams):
     """
     玩家卡牌模型，用于校验合卡、分卡的请求参数
@@ -67,6 +86,28 @@ class PullCardParams(BaseParams):
     times: int = Field(default=1, ge=1, le=100, title='抽卡次数')
     package: str = Field(default='base', min_length=1, max_length=16)
 
+
+class CraftOperationParams(BaseParams):
+    """
+    批量合成/分解中的单个操作
+    """
+    action: Literal['compose', 'decompose'] = Field(title='操作类型', description='compose为合成，decompose为分解')
+    card_id: int = Field(ge=1, title='目标卡牌id')
+    number: int = Field(default=1, ge=1, title='目标卡牌数量')
+
+
+class CraftResultParams(BaseParams):
+    """
+    批量合成/分解中单个操作的结果
+    """
+    index: int = Field(ge=0, title='操作在请求中的序号')
+    action: Literal['compose', 'decompose'] = Field(title='操作类型')
+    card_id: int = Field(ge=1, title='目标卡牌id')
+    number: int = Field(ge=1, title='目标卡牌数量')
+    success: bool = Field(title='操作是否成功')
+    message: str = Field(default='', title='操作结果')
+    cards: List[UserCardParams] = Field(default_factory=list, title='相关卡牌', description='分解获得的卡牌，或合成缺少的材料')
+
     
 if __name__ == '__main__':
     pass
@@ -10,4 +10,15 @@ class StoreRecordParams(BaseParams):
     number: int = Field(ge=1, title='交易数量')
     price: int = Field(ge=1, title='交易单价')
     trade_time: datetime = Field(title='交易时间')
-    
\ No newline at end of file
+    
+
+class MarketStatParams(BaseParams):
+    bucket_start: datetime = Field(title='统计区间开始时间')
+    open: int = Field(ge=1, title='开盘价', description='区间内第一笔成交单价')
+    high: int = Field(ge=1, title='最高价')
+    low: int = Field(ge=1, title='最低价')
+    close: int = Field(ge=1, title='收盘价', description='区间内最后一笔成交单价')
+    volume: int = Field(ge=0, title='成交量', description='区间内成交卡牌数量')
+    turnover: int = Field(ge=0, title='成交额')
+    trades: int = Field(ge=0, title='成交笔数')
+    vwap: float = Field(ge=0, title='成交量加权平均价')
@@ -0,0 +1,111 @@
+"""
+交易记录和群消息的归档服务
+
+超过保留期（ARCHIVE_AFTER_DAYS）的 store_record 和 group_message（群公告除外）按主键顺序分批移入归档表，
+每批的写入归档和删除原记录在同一事务中完成。
+读取历史记录时，只有查询范围早于 archive_boundary() 才需要同时查询归档表：
+在此之后的记录一定还在原表中，在此之前的记录可能在原表或归档表中（归档任务可能滞后），但不会同时存在于两张表
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+from app.core.extra_params import extra_params
+from app.db.models import StoreRecord, StoreRecordArchive, GroupMessage, GroupMessageArchive
+from app.db.model_dependencies import MessageType
+from log.log_config.service_logger import info_logger
+
+
+def archive_boundary(now: Optional[datetime] = None) -> datetime:
+    """
+    可能已被归档的记录的时间上界
+
+    :param now: 当前时间，默认为 ORM 配置时区的当前时间
+
+    :return: 早于此时间的记录可能在归档表中
+    """
+    return (now or timezone.now()) - timedelta(days=extra_params.ARCHIVE_AFTER_DAYS)
+
+
+def month_of(at: datetime) -> int:
+    """记录所在月份，如 202601"""
+    return at.year * 100 + at.month
+
+
+async def archive_store_records(
+    cutoff: Optional[datetime] = None,
+    batch_size: int = extra_params.ARCHIVE_BATCH_SIZE,
+) -> int:
+    """
+    将早于 cutoff 的交易记录分批移入归档表
+
+    :param cutoff: 归档时间点，默认为 archive_boundary()
+    :param batch_size: 每个事务移动的记录数量
+
+    :return: 移动的记录数量
+    """
+    cutoff = cutoff or archive_boundary()
+    moved = 0
+    while True:
+        async with in_transaction():
+            rows = await StoreRecord.filter(
+                created_at__lt=cutoff,
+            ).order_by('id').limit(batch_size).values(
+                'id', 'buyer_id', 'seller_id', 'card_id', 'number', 'price', 'created_at',
+            )
+            if not rows:
+                break
+            await StoreRecordArchive.bulk_create([
+                StoreRecordArchive(month=month_of(row['created_at']), **row)
+                for row in rows
+            ])
+            await StoreRecord.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+    return moved
+
+
+async def archive_group_messages(
+    cutoff: Optional[datetime] = None,
+    batch_size: int = extra_params.ARCHIVE_BATCH_SIZE,
+) -> int:
+    """
+    将早于 cutoff 的群消息分批移入归档表，群公告始终保留在原表中
+
+    :param cutoff: 归档时间点，默认为 archive_boundary()
+    :param batch_size: 每个事务移动的记录数量
+
+    :return: 移动的记录数量
+    """
+    cutoff = cutoff or archive_boundary()
+    moved = 0
+    while True:
+        async with in_transaction():
+            rows = await GroupMessage.filter(
+                created_at__lt=cutoff,
+            ).exclude(
+                message_type=MessageType.NOTICE,
+            ).order_by('id').limit(batch_size).values(
+                'id', 'group_id', 'user_id', 'message_type', 'content', 'created_at',
+            )
+            if not rows:
+                break
+            await GroupMessageArchive.bulk_create([
+                GroupMessageArchive(month=month_of(row['created_at']), **row)
+                for row in rows
+            ])
+            await GroupMessage.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+    return moved
+
+
+async def archive_records_job() -> None:
+    """归档周期任务"""
+    cutoff = archive_boundary()
+    store_records = await archive_store_records(cutoff)
+    group_messages = await archive_group_messages(cutoff)
+    if store_records or group_messages:
+        info_logger.info(f'archived records | params: cutoff={cutoff}; store_record={store_records}; group_message={group_messages}')
@@ -0,0 +1,208 @@
+"""
+进程内卡牌目录
+
+卡牌数据基本是静态的，启动时从 Card 表加载一次并建立索引，所有卡牌相关服务从目录读取卡牌信息，
+卡牌数据变更后调用 card_catalog.refresh() 重新加载（version 随之递增）
+"""
+import time
+import asyncio
+from bisect import bisect_right
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from app.core.config import settings
+from app.db.models import Card
+from app.db.model_dependencies import Package
+from app.schemas.card_schemas import CardParams, UserCardParams
+from app.utils.ngram_index import NgramIndex
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogCard:
+    """目录中的只读卡牌"""
+    id: int
+    name: str
+    image: str
+    rarity: int
+    package: Package
+    unlock_level: int
+    description: str
+    compose_materials: Mapping[int, int]
+    decompose_materials: Mapping[int, int]
+
+    def to_card_params(self) -> CardParams:
+        return CardParams(
+            card_id=self.id,
+            name=self.name,
+            image=self.image,
+            rarity=self.rarity,
+            package=self.package,
+            unlock_level=self.unlock_level,
+            description=self.description,
+        )
+
+    def to_user_card_params(self, number: int) -> UserCardParams:
+        return UserCardParams(
+            card_id=self.id,
+            name=self.name,
+            image=self.image,
+            rarity=self.rarity,
+            package=self.package,
+            unlock_level=self.unlock_level,
+            description=self.description,
+            number=number,
+        )
+
+
+class CardCatalog:
+    """
+    不可变的卡牌目录快照，按 id、名称、名称子串、(卡包, 稀有度)、解锁等级建立索引
+    """
+    def __init__(self, cards: Iterable[CatalogCard], version: int):
+        self.version = version
+        self._by_id: Dict[int, CatalogCard] = {}
+        self._by_name: Dict[str, CatalogCard] = {}
+        by_package_rarity: Dict[Tuple[str, int], List[CatalogCard]] = {}
+        by_unlock_level: Dict[int, List[CatalogCard]] = {}
+
+        for card in sorted(cards, key=lambda c: c.id):
+            self._by_id[card.id] = card
+            self._by_name[card.name] = card
+            by_package_rarity.setdefault((card.package, card.rarity), []).append(card)
+            by_unlock_level.setdefault(card.unlock_level, []).append(card)
+
+        self._by_package_rarity: Dict[Tuple[str, int], Tuple[CatalogCard, ...]] = {
+            key: tuple(value) for key, value in by_package_rarity.items()
+        }
+        self._by_unlock_level: Dict[int, Tuple[CatalogCard, ...]] = {
+            key: tuple(value) for key, value in by_unlock_level.items()
+        }
+        self.unlock_levels: Tuple[int, ...] = tuple(sorted(self._by_unlock_level))
+        self._name_index: NgramIndex[int] = NgramIndex((card.id, card.name) for card in self._by_id.values())
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, card_id: int) -> bool:
+        return card_id in self._by_id
+
+    def __iter__(self) -> Iterator[CatalogCard]:
+        return iter(self._by_id.values())
+
+    def __getitem__(self, card_id: int) -> CatalogCard:
+        """取得目录中的卡牌，卡牌不存在时抛出 KeyError（调用方已确认 card_id in catalog 时使用）"""
+        return self._by_id[card_id]
+
+    def get(self, card_id: int) -> Optional[CatalogCard]:
+        return self._by_id.get(card_id)
+
+    def get_by_name(self, name: str) -> Optional[CatalogCard]:
+        return self._by_name.get(name)
+
+    def by_package_rarity(self, package: str, rarity: int) -> Tuple[CatalogCard, ...]:
+        return self._by_package_rarity.get((package, rarity), ())
+
+    def unlocked_at(self, level: int) -> Tuple[CatalogCard, ...]:
+        """恰好在指定等级解锁的卡牌"""
+        return self._by_unlock_level.get(level, ())
+
+    def effective_level(self, level: int) -> int:
+        """
+        不超过 level 的最大解锁等级，等级在两个解锁等级之间时可用卡牌集合不变，可以共用同一份派生数据
+
+        :return: 没有任何卡牌解锁时返回0
+        """
+        index = bisect_right(self.unlock_levels, level)
+        return self.unlock_levels[index - 1] if index else 0
+
+    def filter(
+        self,
+        name_in: Optional[str] = None,
+        rarity: Optional[int] = None,
+        package: Optional[str] = None,
+        max_unlock_level: Optional[int] = None,
+    ) -> List[CatalogCard]:
+        """
+        按条件筛选卡牌
+
+        :param name_in: 卡牌名称包含的字符串（不区分大小写和全角/半角）
+        :param rarity: 稀有度
+        :param package: 卡包
+        :param max_unlock_level: 解锁等级小于等于此值（即该等级玩家可用的卡牌）
+
+        :return: 符合条件的卡牌，按id排序
+        """
+        if name_in is not None:
+            cards: Iterable[CatalogCard] = [self._by_id[card_id] for card_id in sorted(self._name_index.search(name_in))]
+        elif package is not None and rarity is not None:
+            cards = self.by_package_rarity(package, rarity)
+        else:
+            cards = self._by_id.values()
+
+        return [
+            card for card in cards
+            if (rarity is None or card.rarity == rarity)
+            and (package is None or card.package == package)
+            and (max_unlock_level is None or card.unlock_level <= max_unlock_level)
+        ]
+
+
+class CardCatalogService:
+    """
+    持有当前的卡牌目录快照，刷新时整体替换快照，读取方拿到的快照不会被修改
+    """
+    def __init__(self, max_age_seconds: int = 0):
+        self.max_age_seconds = max_age_seconds
+        self._catalog = CardCatalog((), version=0)
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def current(self) -> CardCatalog:
+        """当前快照（未加载时为空目录）"""
+        return self._catalog
+
+    async def get(self) -> CardCatalog:
+        """获取当前快照，未加载或超过 max_age_seconds 时先从数据库加载"""
+        if self._loaded_at is None or (
+            self.max_age_seconds and time.monotonic() - self._loaded_at > self.max_age_seconds
+        ):
+            await self.refresh()
+        return self._catalog
+
+    async def load(self) -> None:
+        """启动时加载卡牌目录"""
+        await self.refresh()
+
+    async def refresh(self) -> CardCatalog:
+        """从 Card 表重新加载卡牌目录，version 递增"""
+        async with self._lock:
+            rows = await Card.all().values(
+                'id', 'name', 'image', 'rarity', 'package', 'unlock_level', 'description',
+                'compose_materials', 'decompose_materials',
+            )
+            cards = [
+                CatalogCard(
+                    id=row['id'],
+                    name=row['name'],
+                    image=row['image'],
+                    rarity=int(row['rarity']),
+                    package=Package(row['package']),
+                    unlock_level=row['unlock_level'],
+                    description=row['description'],
+                    # JSONField 存储后键会变为字符串，这里统一转换为卡牌id
+                    compose_materials=MappingProxyType(
+                        {int(card_id): num for card_id, num in (row['compose_materials'] or {}).items()}
+                    ),
+                    decompose_materials=MappingProxyType(
+                        {int(card_id): num for card_id, num in (row['decompose_materials'] or {}).items()}
+                    ),
+                )
+                for row in rows
+            ]
+            self._catalog = CardCatalog(cards, version=self._catalog.version + 1)
+            self._loaded_at = time.monotonic()
+            return self._catalog
+
+
+card_catalog = CardCatalogService(max_age_seconds=settings.CARD_CATALOG_MAX_AGE_SECONDS)
@@ -1,7 +1,6 @@
 from typing import List
-from tortoise.exceptions import DoesNotExist
 from app.schemas.card_schemas import UserCardParams, CardParams
-from app.db.models import Card
+from app.services.card_services.card_catalog import card_catalog
 
 
 async def query_card_info_service(card_id: int) -> CardParams | str:
@@ -12,20 +11,12 @@ async def query_card_info_service(card_id: int) -> CardParams | str:
     
     :return:卡牌信息模型
     """
-    try:
-        card = await Card.get(id=card_id)
-    except DoesNotExist:
+    catalog = await card_catalog.get()
+    card = catalog.get(card_id)
+    if card is None:
         return 'card not found'
     
-    return CardParams(
-        card_id=card.id,
-        name=card.name,
-        image=card.image,
-        rarity=card.rarity,
-        package=card.package,
-        unlock_level=card.unlock_level,
-        description=card.description,
-    )
+    return card.to_card_params()
     
     
 async def query_card_compose_materials_service(card_id: int) -> List[UserCardParams] | str:
@@ -37,30 +28,17 @@ async def query_card_compose_materials_service(card_id: int) -> List[UserCardPar
     :return: 合成所需材料
     """
     # 1.确认卡牌存在
-    try:
-        card = await Card.get(id=card_id)
-    except DoesNotExist:
+    catalog = await card_catalog.get()
+    card = catalog.get(card_id)
+    if card is None:
         return 'card not found'
     
-    # 2.查询合成所需材料
-    materials = await Card.filter(id__in=list(card.compose_materials.keys())).all()
-    
-    # 3.组织为UserCardParams返回
-    compose_materials = []
-    for material in materials:
-        compose_materials.append(
-            UserCardParams(
-                card_id=material.id,
-                name=material.name,
-                image=material.image,
-                rarity=material.rarity,
-                package=material.package,
-                unlock_level=material.unlock_level,
-                description=material.description,
-                number=card.compose_materials[material.id],
-            )
-        )
-    return compose_materials
+    # 2.从卡牌目录中查找合成所需材料并组织为UserCardParams返回
+    return [
+        catalog[material_id].to_user_card_params(number)
+        for material_id, number in card.compose_materials.items()
+        if material_id in catalog
+    ]
     
 
 async def query_card_decompose_materials_service(card_id: int) -> List[UserCardParams] | str:
@@ -71,27 +49,15 @@ async def query_card_decompose_materials_service(card_id: int) -> List[UserCardP
     
     :return: 分解产物
     """
-    try:
-        card = await Card.get(id=card_id)
-    except DoesNotExist:
+    # 1.确认卡牌存在
+    catalog = await card_catalog.get()
+    card = catalog.get(card_id)
+    if card is None:
         return 'card not found'
         
-    # 2.查询分解获得材料
-    products = await Card.filter(id__in=list(card.decompose_materials.keys())).all()
-    
-    # 3.组织为UserCardParams返回
-    decompose_materials = []
-    for product in products:
-        decompose_materials.append(
-            UserCardParams(
-                card_id=product.id,
-                name=product.name,
-                image=product.image,
-                rarity=product.rarity,
-                package=product.package,
-                unlock_level=product.unlock_level,
-                description=product.description,
-                number=card.compose_materials[product.id],
-            )
-        )
-    return decompose_materials
+    # 2.从卡牌目录中查找分解获得材料并组织为UserCardParams返回
+    return [
+        catalog[product_id].to_user_card_params(number)
+        for product_id, number in card.decompose_materials.items()
+        if product_id in catalog
+    ]
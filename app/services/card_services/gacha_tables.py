@@ -0,0 +1,137 @@
+"""
+抽卡概率表
+
+按 (卡包, 等级) 从卡牌目录预先构建 Walker/Vose 别名表，每次抽卡为 O(1)，一次请求的 times 次抽卡批量完成。
+单张卡牌的概率 = 稀有度概率 / 该稀有度下可抽卡牌数量，与先抽稀有度再等概率抽卡牌的两步抽法等价；
+某一稀有度下没有可抽卡牌时，其余稀有度按权重重新归一化。
+"""
+import random
+from typing import Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+from app.db.model_dependencies import CardRarity
+from app.services.card_services.card_catalog import CardCatalog, CatalogCard, card_catalog
+
+
+T = TypeVar('T')
+
+# 稀有度权重：75% 普通, 20% 稀有, 4% 史诗, 1% 传说（特殊卡牌不进入卡池）
+RARITY_WEIGHTS: Dict[int, int] = {
+    CardRarity.COMMON: 75,
+    CardRarity.RARE: 20,
+    CardRarity.EPIC: 4,
+    CardRarity.LEGENDARY: 1,
+}
+
+
+class AliasTable(Generic[T]):
+    """
+    Vose 别名表，构建 O(n)，单次采样 O(1)
+    """
+    __slots__ = ('items', '_prob', '_alias')
+
+    def __init__(self, items: Sequence[T], weights: Sequence[float]):
+        if not items or len(items) != len(weights):
+            raise ValueError('items and weights must be non-empty and of the same length')
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError('weights must sum to a positive number')
+
+        n = len(items)
+        self.items: Tuple[T, ...] = tuple(items)
+        self._prob: List[float] = [0.0] * n
+        self._alias: List[int] = list(range(n))
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 剩余项因浮点误差应视为概率1
+        for i in large + small:
+            self._prob[i] = 1.0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def sample(self, k: int, rng: random.Random | None = None) -> List[T]:
+        """
+        批量采样
+
+        :param k: 采样次数
+        :param rng: 随机数生成器，测试时可传入固定种子的 random.Random
+
+        :return: 长度为k的采样结果
+        """
+        rand = (rng or random).random
+        items, prob, alias = self.items, self._prob, self._alias
+        n = len(items)
+        result = []
+        for _ in range(k):
+            u = rand() * n
+            i = int(u)
+            result.append(items[i] if u - i < prob[i] else items[alias[i]])
+        return result
+
+    def probabilities(self) -> List[float]:
+        """由别名表还原每一项的精确概率，与 items 一一对应，用于校验抽卡分布"""
+        n = len(self.items)
+        result = [0.0] * n
+        for i in range(n):
+            result[i] += self._prob[i] / n
+            result[self._alias[i]] += (1.0 - self._prob[i]) / n
+        return result
+
+
+def build_gacha_table(catalog: CardCatalog, package: str, level: int) -> Optional[AliasTable[CatalogCard]]:
+    """
+    构建指定卡包在指定等级下的抽卡别名表
+
+    :return: 没有可抽卡牌时返回None
+    """
+    cards: List[CatalogCard] = []
+    weights: List[float] = []
+    for rarity, rarity_weight in RARITY_WEIGHTS.items():
+        pool = [card for card in catalog.by_package_rarity(package, rarity) if card.unlock_level <= level]
+        if not pool:
+            continue
+        cards.extend(pool)
+        weights.extend([rarity_weight / len(pool)] * len(pool))
+
+    if not cards:
+        return None
+    return AliasTable(cards, weights)
+
+
+class GachaTables:
+    """
+    抽卡别名表缓存，键为 (卡包, 有效等级)，卡牌目录版本变化时整体失效
+
+    有效等级为不超过玩家等级的最大解锁等级，处于两个解锁等级之间的玩家共用同一张表
+    """
+    def __init__(self) -> None:
+        self._version = -1
+        self._tables: Dict[Tuple[str, int], Optional[AliasTable[CatalogCard]]] = {}
+
+    def get(self, catalog: CardCatalog, package: str, level: int) -> Optional[AliasTable[CatalogCard]]:
+        if catalog.version != self._version:
+            self._tables = {}
+            self._version = catalog.version
+
+        key = (package, catalog.effective_level(level))
+        if key not in self._tables:
+            self._tables[key] = build_gacha_table(catalog, *key)
+        return self._tables[key]
+
+    async def warm(self) -> None:
+        """为所有卡包和解锁等级预先构建别名表（启动时调用）"""
+        catalog = await card_catalog.get()
+        packages = {card.package for card in catalog}
+        for package in packages:
+            for level in catalog.unlock_levels:
+                self.get(catalog, package, level)
+
+
+gacha_tables = GachaTables()
@@ -7,6 +7,7 @@ from app.db.models import Group, GroupMessage, GroupUser
 from app.db.model_dependencies import GroupMemberStatus, MessageType
 from app.schemas.group_schemas import GroupUserParams, GroupSelfParams
 from app.schemas.base_schemas import UserParams
+from app.services.group_services.group_name_index import group_name_index
 
 
 async def confirm_user_is_admin(
@@ -211,7 +212,7 @@ async def modify_group_info_service(
     
     # 2.查询群对象
     try:
-        group = await Group.get()
+        group = await Group.get(uid=new_group_params.uid)
     except DoesNotExist:
         return 'group not found'
     
@@ -230,6 +231,7 @@ async def modify_group_info_service(
         group.join_free = new_group_params.join_free
     
     await group.save()
+    group_name_index.add(group.id, group.name)
     return 'success in modify group info'
 
 
@@ -1,15 +1,19 @@
 """
 基本的群组功能服务，包括搜索群聊、创建群聊、加入群聊、退出群聊
 """
+from datetime import datetime
 from typing import List, Optional
 from tortoise.queryset import Q
 from tortoise.transactions import atomic
 from tortoise.exceptions import DoesNotExist
 from app.core.security import generate_unique_uid
 from app.core.extra_params import extra_params
-from app.db.models import Group, GroupUser, GroupMessage
+from app.db.models import User, Group, GroupUser, GroupMessage, GroupMessageArchive
 from app.db.model_dependencies import GroupMemberStatus, MessageType
 from app.schemas.group_schemas import GroupParams, GroupSelfParams, GroupMessageParams
+from app.services.group_services.group_name_index import group_name_index
+from app.services.archive_services.record_archive_services import archive_boundary
+from app.utils.ngram_index import normalize_text
 
 
 async def query_groups_not_in_service(
@@ -39,14 +43,20 @@ async def query_groups_not_in_service(
             )]
         except DoesNotExist:
             return []
-    # 2.构建 Q 对象执行复合查询
+    # 2.构建 Q 对象执行复合查询，名称条件先通过名称索引解析为群聊id，
+    #   索引最近一次重建之后（可能由其他 worker 进程）新建的群聊直接按名称查询数据库
     query = Q()
+    needle = normalize_text(name_in) if name_in is not None else ''
     if name_in is not None:
-        query &= Q(name__icontains=name_in)
+        group_ids = group_name_index.search(name_in)
+        query &= Q(id__in=list(group_ids)) | Q(id__gt=group_name_index.loaded_max_id, name__icontains=needle)
     if level_ge is not None:
         query &= Q(level__gte=level_ge)
     
     groups = await Group.filter(query).all()
+    # 3.按数据库中的当前名称复核，剔除索引重建前已被其他 worker 进程改名的群聊
+    if name_in is not None:
+        groups = [group for group in groups if needle in normalize_text(group.name)]
     return [
         GroupParams(
             uid=group.uid,
@@ -125,6 +135,7 @@ async def create_group_service(
         signature=group_params.signature,
         tags=group_params.tags,
     )
+    group_name_index.add(group.id, group.name)
     # 3.将群主加入群聊
     await GroupUser.create(
         group_id=group.id,
@@ -231,7 +242,7 @@ async def query_group_notice_service(
     # 3.组织为GroupMessageParams并返回
     return [
         GroupMessageParams(
-            group_uid=group_user.group.uid,
+            group_uid=group_uid,
             user_name=group_notice.user.name,
             content=group_notice.content,
             message_type=MessageType.NOTICE,
@@ -239,4 +250,67 @@ async def query_group_notice_service(
         )
         for group_notice in group_notice_list
     ]
-    
\ No newline at end of file
+    
+
+
+async def query_group_history_service(
+    user_id: int,
+    group_uid: str,
+    limit: int,
+    before: Optional[datetime] = None,
+) -> List[GroupMessageParams] | str:
+    """
+    分页查看群聊历史消息，查询范围可能包含已归档的消息时同时查询归档表
+    
+    :param user_id: 玩家id，用于校验是否在群中
+    :param group_uid: 指定的群聊uid
+    :param limit: 返回的消息数量
+    :param before: 只返回早于此时间的消息，用于向前翻页，为None时返回最新的消息
+    
+    :return: 按时间升序排列的消息列表
+    """
+    # 1.校验玩家是否在群中
+    group_user = await GroupUser.filter(
+        group__uid=group_uid,
+        user_id=user_id,
+        status__in=[GroupMemberStatus.MEMBER, GroupMemberStatus.ADMIN, GroupMemberStatus.OWNER],
+    ).values('group_id')
+    if not group_user:
+        return 'user not in group'
+    group_id = group_user[0]['group_id']
+    
+    # 2.先从原表中读取；不足一页，或查询范围早于归档时间点（归档任务可能正在按批移动这段时间的消息）时，
+    # 再从归档表中读取，按 (created_at, id) 合并后取最新的一页
+    fields = ('id', 'user_id', 'message_type', 'content', 'created_at')
+    query = GroupMessage.filter(group_id=group_id)
+    if before is not None:
+        query = query.filter(created_at__lt=before)
+    messages = await query.order_by('-created_at', '-id').limit(limit).values(*fields)
+    boundary = archive_boundary()
+    if (
+        len(messages) < limit
+        or (before is not None and before <= boundary)
+        or messages[-1]['created_at'] < boundary
+    ):
+        archive_query = GroupMessageArchive.filter(group_id=group_id)
+        if before is not None:
+            archive_query = archive_query.filter(created_at__lt=before)
+        messages += await archive_query.order_by('-created_at', '-id').limit(limit).values(*fields)
+        messages.sort(key=lambda message: (message['created_at'], message['id']), reverse=True)
+        messages = messages[:limit]
+    
+    # 3.一次查询取得发言人名称，组织为GroupMessageParams并返回
+    names = {
+        user['id']: user['name']
+        for user in await User.filter(id__in={message['user_id'] for message in messages}).values('id', 'name')
+    }
+    return [
+        GroupMessageParams(
+            group_uid=group_uid,
+            user_name=names.get(message['user_id'], 'unknown'),
+            content=message['content'],
+            message_type=message['message_type'],
+            created_at=message['created_at'],
+        )
+        for message in reversed(messages)
+    ]
@@ -0,0 +1,122 @@
+"""
+群聊长连接的发送队列
+
+每个连接持有一个有界的发送队列，由该连接自己的写协程依次发送；广播只把已编码的消息帧放入各连接的队列，
+一个慢连接不会阻塞对群内其他成员的推送，也不会阻塞发送者的接收循环。
+队列满时按 CHAT_SLOW_CONSUMER_POLICY 处理：丢弃最早的消息，或断开该连接
+"""
+import asyncio
+from enum import StrEnum
+from typing import Dict, Optional
+from fastapi import WebSocket
+from app.core.extra_params import extra_params
+from log.log_config.service_logger import info_logger
+
+
+class SlowConsumerPolicy(StrEnum):
+    """发送队列已满时的处理策略"""
+    DROP_OLDEST = 'drop_oldest'     # 丢弃队列中最早的消息，保证最新的消息能送达
+    DISCONNECT = 'disconnect'       # 断开连接，由客户端重连后拉取历史消息
+
+
+class ChatConnection:
+    """
+    一个用户的群聊长连接及其发送队列
+    """
+    def __init__(
+        self,
+        user_id: int,
+        websocket: WebSocket,
+        queue_size: int = extra_params.CHAT_SEND_QUEUE_SIZE,
+        policy: SlowConsumerPolicy = SlowConsumerPolicy(extra_params.CHAT_SLOW_CONSUMER_POLICY),
+    ):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.policy = policy
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self._writer: Optional[asyncio.Task[None]] = None
+        self._closing: Optional[asyncio.Task[None]] = None     # 关闭连接的任务，持有引用避免被垃圾回收
+        self.closed = False
+        # 队列指标
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        """发送队列中等待发送的消息数量"""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """启动写协程（连接建立后调用）"""
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write(), name=f'chat-writer:{self.user_id}')
+
+    def send(self, frame: str) -> bool:
+        """
+        将消息帧放入发送队列，不等待发送完成
+
+        :param frame: 推送给客户端的 JSON 文本（见 app.utils.encode_frame），广播时由所有接收者共享
+
+        :return: 连接已关闭或因队列已满被断开时返回False
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            match self.policy:
+                case SlowConsumerPolicy.DROP_OLDEST:
+                    self._queue.get_nowait()
+                    self._queue.put_nowait(frame)
+                    self.dropped += 1
+                case SlowConsumerPolicy.DISCONNECT:
+                    info_logger.warning(f'disconnect slow chat consumer | params: user_id={self.user_id}; depth={self.depth}')
+                    self._start_close(code=1013)
+                    return False
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    async def _write(self) -> None:
+        while True:
+            frame = await self._queue.get()
+            try:
+                await self.websocket.send_text(frame)
+                self.sent += 1
+            except Exception as e:
+                # 客户端已断开，由接收循环负责清理连接
+                info_logger.error(f'failed to send chat message: {e} | params: user_id={self.user_id}')
+                self.closed = True
+                return
+
+    def _start_close(self, code: int) -> asyncio.Task[None]:
+        """立即将连接标记为关闭（之后的 send 直接返回False），并在后台关闭连接，重复调用时返回同一个任务"""
+        self.closed = True
+        if self._closing is None:
+            self._closing = asyncio.create_task(self._close(code), name=f'chat-close:{self.user_id}')
+        return self._closing
+
+    async def close(self, code: int = 1000) -> None:
+        """停止写协程并关闭连接，丢弃未发送的消息；连接正在关闭时等待其完成"""
+        await asyncio.shield(self._start_close(code))
+
+    async def _close(self, code: int) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            # 连接已经被客户端关闭
+            pass
+
+    def metrics(self) -> Dict[str, int]:
+        """连接的发送队列指标"""
+        return {
+            'user_id': self.user_id,
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+        }
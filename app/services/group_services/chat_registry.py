@@ -0,0 +1,96 @@
+"""
+群聊在线连接注册表
+
+同一用户可以同时有多个连接（多个设备或标签页），每个连接各自订阅进入的群。
+注册表同时维护 群 -> 订阅的连接 和 用户 -> 连接 两个映射，连接和断开只修改该连接订阅的群，
+与在线群聊的总数无关，广播时不需要查询数据库。所有修改都是不含 await 的同步操作，在事件循环中天然互斥，不需要加锁；
+群的连接集合使用不可变的 frozenset，修改时整体替换（写时复制），广播持有的集合不会被并发修改
+"""
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from app.core.extra_params import extra_params
+from app.services.group_services.chat_connection import ChatConnection
+
+
+class ChatRegistry:
+    """
+    连接与群订阅的双向索引
+    """
+    def __init__(self, max_connections_per_user: int = extra_params.MAX_CHAT_CONNECTIONS_PER_USER) -> None:
+        self.max_connections_per_user = max_connections_per_user
+        self._user_connections: Dict[int, Tuple[ChatConnection, ...]] = {}     # 按连接时间排列
+        self._group_connections: Dict[int, FrozenSet[ChatConnection]] = {}
+        self._subscriptions: Dict[ChatConnection, FrozenSet[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def connect(self, connection: ChatConnection, group_ids: Iterable[int]) -> List[ChatConnection]:
+        """
+        登记连接及其订阅的群，不影响同一用户的其他连接
+
+        :param connection: 新的连接
+        :param group_ids: 连接订阅的群（须已校验为群成员）
+
+        :return: 同一用户的连接数超过上限时被注销的最早的连接，由调用方关闭
+        """
+        evicted: List[ChatConnection] = []
+        user_connections = self._user_connections.get(connection.user_id, ()) + (connection,)
+        while len(user_connections) > self.max_connections_per_user:
+            evicted.append(user_connections[0])
+            self._unsubscribe(user_connections[0])
+            user_connections = user_connections[1:]
+        self._user_connections[connection.user_id] = user_connections
+
+        groups = frozenset(group_ids)
+        self._subscriptions[connection] = groups
+        for group_id in groups:
+            self._group_connections[group_id] = self._group_connections.get(group_id, frozenset()) | {connection}
+        return evicted
+
+    def disconnect(self, connection: ChatConnection) -> bool:
+        """
+        注销连接及其群订阅，同一用户的其他连接不受影响
+
+        :return: 连接未登记（或已被注销）时返回False
+        """
+        if connection not in self._subscriptions:
+            return False
+        self._unsubscribe(connection)
+        user_connections = tuple(
+            user_connection
+            for user_connection in self._user_connections[connection.user_id]
+            if user_connection is not connection
+        )
+        if user_connections:
+            self._user_connections[connection.user_id] = user_connections
+        else:
+            del self._user_connections[connection.user_id]
+        return True
+
+    def _unsubscribe(self, connection: ChatConnection) -> None:
+        for group_id in self._subscriptions.pop(connection, ()):
+            connections = self._group_connections[group_id] - {connection}
+            if connections:
+                self._group_connections[group_id] = connections
+            else:
+                # 群聊无在线连接时删除记录
+                del self._group_connections[group_id]
+
+    def group_connections(self, group_id: int) -> FrozenSet[ChatConnection]:
+        """订阅了群的所有连接（包括同一用户的多个设备）"""
+        return self._group_connections.get(group_id, frozenset())
+
+    def user_connections(self, user_id: int) -> Tuple[ChatConnection, ...]:
+        """用户的所有在线连接，按连接时间排列"""
+        return self._user_connections.get(user_id, ())
+
+    def subscriptions(self, connection: ChatConnection) -> FrozenSet[int]:
+        """连接订阅的群"""
+        return self._subscriptions.get(connection, frozenset())
+
+    def connections(self) -> List[ChatConnection]:
+        """所有在线连接"""
+        return list(self._subscriptions)
+
+
+chat_registry = ChatRegistry()
@@ -1,39 +1,37 @@
-import asyncio
 from datetime import datetime
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Set, List, Dict
-from app.db.models import User, GroupUser, GroupMessage, Group
+from typing import Any, List, Dict
+from app.core.extra_params import extra_params
+from app.db.models import User, GroupUser, Group
 from app.db.model_dependencies import GroupMemberStatus, MessageType
+from app.services.group_services.chat_connection import ChatConnection
+from app.services.group_services.chat_registry import chat_registry
+from app.services.group_services.group_message_journal import group_message_journal
+from app.utils.json_frames import encode_frame
 from log.log_config.service_logger import info_logger, err_logger
 
-# 全局连接管理：用户ID -> WebSocket连接
-active_connections: Dict[int, WebSocket] = {}
-# 群聊关联：群ID -> 在线用户ID集合
-group_online_users: Dict[int, Set[int]] = {}
-# 并发安全锁
-lock = asyncio.Lock()
 
-
-async def save_group_message(
+def save_group_message(
     group_id: int,
     user_id: int,
     content: str,
     message_type: MessageType = MessageType.TEXT
-) -> None:
+) -> datetime:
     """
-    保存群消息到数据库
+    记录群消息，写入本地日志后立即返回，由 group_message_journal 在后台批量写入数据库
     :param group_id: 群组id
     :param user_id: 用户id
     :param content: 消息内容
     :param message_type: 消息类型
-    :return:
+    :return: 消息时间
     """
-    await GroupMessage.create(
+    entry = group_message_journal.append(
         group_id=group_id,
         user_id=user_id,
         content=content,
         message_type=message_type
     )
+    return entry.created_at
 
 
 async def check_group_member(
@@ -49,33 +47,36 @@ async def check_group_member(
     return bool(member)
 
 
-async def clean_user_connection(user_id: int) -> None:
-    """清理用户连接和群关联"""
-    async with lock:
-        if user_id in active_connections:
-            del active_connections[user_id]
-        # 从所有群聊中移除该用户
-        for group_id in group_online_users:
-            if user_id in group_online_users[group_id]:
-                group_online_users[group_id].remove(user_id)
-                # 群聊无在线用户时删除记录
-                if not group_online_users[group_id]:
-                    del group_online_users[group_id]
+async def clean_user_connection(connection: ChatConnection) -> None:
+    """清理连接和其订阅的群，停止连接的写协程；同一用户其他设备的连接不受影响"""
+    chat_registry.disconnect(connection)
+    await connection.close()
                     
                     
-async def broadcast_group_message(group_id: int, message: dict[str, str]) -> None:
-    """推送消息到群内所有在线用户"""
-    async with lock:
-        online_user_ids = group_online_users.get(group_id, set())
-    
-    for user_id in online_user_ids:
-        websocket = active_connections.get(user_id)
-        if websocket:
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                info_logger.error(f'failed to broadcast message: {e} | params: group_id={group_id}; user_id={user_id}; message={message}')
-                continue
+async def broadcast_group_message(group_id: int, message: Dict[str, Any]) -> None:
+    """推送消息到订阅了群的所有连接（同一用户的每个设备各一份）：消息只编码一次，编码后的文本帧放入各连接的发送队列，不等待发送完成"""
+    frame = encode_frame(message)
+    for connection in chat_registry.group_connections(group_id):
+        connection.send(frame)
+
+
+def chat_queue_metrics() -> List[Dict[str, int]]:
+    """所有在线连接的发送队列指标，按队列深度从高到低排列"""
+    return sorted(
+        (connection.metrics() for connection in chat_registry.connections()),
+        key=lambda metrics: metrics['depth'],
+        reverse=True,
+    )
+
+
+async def log_chat_queue_metrics_job() -> None:
+    """记录发送队列最深的连接，用于发现慢连接"""
+    metrics = chat_queue_metrics()
+    if metrics:
+        info_logger.info(
+            f'chat send queues | params: connections={len(metrics)}; '
+            f'dropped={sum(item["dropped"] for item in metrics)}; deepest={metrics[:5]}'
+        )
 
 
 async def group_chat_service(
@@ -93,43 +94,54 @@ async def group_chat_service(
     :return:
     """
     user = await User.get(id=user_id)
+    connection = ChatConnection(user_id=user_id, websocket=websocket)
     try:
-        # 1.记录用户连接
-        async with lock:
-            active_connections[user_id] = websocket
-
-        # 2.接收前端发送的群聊ID列表（用户进入的群）
+        # 1.接收前端发送的群聊ID列表（用户进入的群）
         if not group_uids:
             raise WebSocketDisconnect(code=1003)
-        groups = await Group.filter(uid__in=group_uids).values('id')
-        group_ids = [group['id'] for group in groups]
+        groups = await Group.filter(uid__in=group_uids).values('id', 'uid')
         
-        # 3.校验该用户在这些群中，并关联群聊与在线用户
+        # 2.校验该用户在这些群中
         user_groups = await GroupUser.filter(
             user_id=user_id,
             status__in=[GroupMemberStatus.MEMBER, GroupMemberStatus.ADMIN, GroupMemberStatus.OWNER]
         ).values('group_id')
         user_group_ids = {group['group_id'] for group in user_groups}
-        async with lock:
-            for group_id in group_ids:
-                if group_id not in user_group_ids:
-                    info_logger.warning(f'user {user_id} trying to chat in group {group_id} but not a member')
-                    continue
-                if group_id not in group_online_users:
-                    group_online_users[group_id] = set()
-                group_online_users[group_id].add(user_id)
+        joined_groups: Dict[str, int] = {}
+        for group in groups:
+            if group['id'] not in user_group_ids:
+                info_logger.warning(f'user {user_id} trying to chat in group {group["id"]} but not a member')
+                continue
+            joined_groups[group['uid']] = group['id']
+        
+        # 3.启动连接的写协程，登记连接及其订阅的群；同一用户的连接数超过上限时关闭最早的连接
+        connection.start()
+        for evicted in chat_registry.connect(connection, joined_groups.values()):
+            await evicted.close()
 
         # 4. 循环接收前端消息
         while True:
             data = await websocket.receive_json()
 
-            # 处理用户发送群消息
+            # 处理用户发送群消息，只能发送到连接时进入的群
             group_uid = data.get("group_uid")
+            group_id = joined_groups.get(group_uid)
+            if group_id is None:
+                info_logger.warning(f'user {user_id} trying to chat in group {group_uid} without joining it')
+                continue
+            # 消息内容须为不超过 group_message.content 长度的非空字符串，否则无法写入数据库
             content = data.get("content")
-            msg_type_enum = MessageType(data.get("message_type", 0))
+            if not isinstance(content, str) or not content or len(content) > extra_params.MAX_GROUP_MESSAGE_LENGTH:
+                info_logger.warning(f'user {user_id} sent invalid message content to group {group_uid}')
+                continue
+            try:
+                msg_type_enum = MessageType(data.get("message_type", 0))
+            except ValueError:
+                info_logger.warning(f'user {user_id} sent invalid message type to group {group_uid}')
+                continue
 
-            # 保存消息到数据库
-            await save_group_message(group_id, user_id, content, msg_type_enum)
+            # 记录消息（写入本地日志后立即返回，后台批量写入数据库）
+            created_at = save_group_message(group_id, user_id, content, msg_type_enum)
 
             # 构造推送消息（含用户/群/内容信息）
             push_msg = {
@@ -138,7 +150,7 @@ async def group_chat_service(
                 "user_name": user.name,
                 "content": content,
                 "message_type": msg_type_enum.value,
-                "timestamp": datetime.now()
+                "timestamp": created_at
             }
 
             # 广播给群内在线用户
@@ -150,6 +162,5 @@ async def group_chat_service(
         err_logger.error(f'error while user chatting: {e} | params: user_id={user_id}; group_uids={group_uids}')
     finally:
         # 清理连接和群关联
-        if user_id:
-            await clean_user_connection(user_id)
+        await clean_user_connection(connection)
             
\ No newline at end of file
@@ -0,0 +1,325 @@
+"""
+群聊消息的异步批量持久化（write-behind）
+
+群聊消息先追加写入本地日志段文件，再放入内存缓冲，随后立即广播，不等待数据库写入；
+后台协程每 GROUP_MESSAGE_FLUSH_SIZE 条或每 GROUP_MESSAGE_FLUSH_INTERVAL_MS 毫秒将缓冲的消息用多行 INSERT 写入数据库，
+写入成功后删除对应的日志段。进程崩溃时未写入数据库的消息保留在日志段中，由下一次启动的进程重放。
+
+每个进程使用自己的日志段（文件名以 进程id-启动时间 为前缀），并对同名的 .lock 文件持有排他锁；
+启动时只重放锁已释放（所属进程已退出）的日志段，多个 worker 进程可以共用同一目录。
+因数据本身无法写入数据库（如群已被删除）的消息移入目录下的死信文件，不阻塞之后的消息
+"""
+import os
+import json
+import time
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import IO, List, Optional, Tuple
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError, ValidationError
+from tortoise.transactions import in_transaction
+from app.core.config import group_message_journal_dir
+from app.core.extra_params import extra_params
+from app.db.models import GroupMessage
+from app.db.model_dependencies import MessageType
+from log.log_config.service_logger import info_logger, err_logger
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    # Windows 下没有 fcntl，只支持单进程运行，启动时重放目录中所有其他进程的日志段
+    HAS_FCNTL = False
+
+
+DEAD_LETTER_FILE = 'dead_letter.log'
+# 消息本身无法写入数据库的异常（群或用户已被删除、内容为空或超长），重试不会成功
+DATA_ERRORS = (IntegrityError, ValidationError, ValueError)
+
+
+@dataclass(slots=True)
+class JournalEntry:
+    """一条待写入数据库的群消息"""
+    group_id: int
+    user_id: int
+    content: str
+    message_type: MessageType
+    created_at: datetime
+
+    def to_line(self) -> str:
+        return json.dumps(
+            [self.group_id, self.user_id, self.content, int(self.message_type), self.created_at.isoformat()],
+            ensure_ascii=False,
+        ) + '\n'
+
+    @classmethod
+    def from_line(cls, line: str) -> 'JournalEntry':
+        group_id, user_id, content, message_type, created_at = json.loads(line)
+        return cls(group_id, user_id, content, MessageType(message_type), datetime.fromisoformat(created_at))
+
+    def to_model(self) -> GroupMessage:
+        return GroupMessage(
+            group_id=self.group_id,
+            user_id=self.user_id,
+            content=self.content,
+            message_type=self.message_type,
+            created_at=self.created_at,
+        )
+
+
+def try_lock(path: Path) -> Optional[IO[str]]:
+    """
+    以非阻塞方式对文件加排他锁
+
+    :return: 加锁成功返回打开的文件（关闭即释放锁），锁被其他进程持有时返回None
+    """
+    file = open(path, 'a+')
+    if HAS_FCNTL:
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return None
+    return file
+
+
+def read_segment(path: Path) -> List[JournalEntry]:
+    """读取日志段，忽略崩溃时没有写完的最后一行"""
+    entries = []
+    for line in path.read_text(encoding='utf-8').splitlines():
+        try:
+            entries.append(JournalEntry.from_line(line))
+        except ValueError:
+            err_logger.error(f'skip broken group message journal line | params: segment={path.name}; line={line[:200]}')
+    return entries
+
+
+class GroupMessageJournal:
+    """
+    群消息的本地日志与批量写入
+    """
+    def __init__(
+        self,
+        directory: Path,
+        flush_size: int = extra_params.GROUP_MESSAGE_FLUSH_SIZE,
+        flush_interval_ms: int = extra_params.GROUP_MESSAGE_FLUSH_INTERVAL_MS,
+        fsync: bool = extra_params.GROUP_MESSAGE_JOURNAL_FSYNC,
+    ):
+        self.directory = directory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.fsync = fsync
+        self._token = f'{os.getpid()}-{time.time_ns()}'
+        self._lock: Optional[IO[str]] = None
+        self._file: Optional[IO[str]] = None
+        self._segment: Optional[Path] = None
+        self._sequence = 0
+        self._buffer: List[JournalEntry] = []
+        self._pending: List[Tuple[Path, List[JournalEntry]]] = []     # 已轮换、等待写入数据库的日志段
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def _open_segment(self) -> None:
+        self._sequence += 1
+        segment = self.directory / f'{self._token}-{self._sequence:06d}.ndjson'
+        self._file = open(segment, 'a', encoding='utf-8')
+        self._segment = segment
+
+    def _rotate(self) -> None:
+        """关闭当前日志段，将其与缓冲中的消息一起移入待写入队列"""
+        if not self._buffer or self._file is None or self._segment is None:
+            return
+        self._file.close()
+        self._pending.append((self._segment, self._buffer))
+        self._buffer = []
+        self._open_segment()
+
+    def append(
+        self,
+        group_id: int,
+        user_id: int,
+        content: str,
+        message_type: MessageType = MessageType.TEXT,
+        created_at: Optional[datetime] = None,
+    ) -> JournalEntry:
+        """
+        记录一条群消息，写入本地日志段后返回，不等待数据库写入
+
+        :param group_id: 群组id
+        :param user_id: 用户id
+        :param content: 消息内容
+        :param message_type: 消息类型
+        :param created_at: 消息时间，默认当前时间
+
+        :return: 记录的消息
+        """
+        if self._file is None:
+            raise RuntimeError('group message journal is not started')
+        entry = JournalEntry(group_id, user_id, content, message_type, created_at or timezone.now())
+        # 写入操作系统缓冲后进程崩溃不会丢失；开启 fsync 时同时保证机器掉电不丢失（每条消息一次磁盘同步）
+        self._file.write(entry.to_line())
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.flush_size:
+            self._wakeup.set()
+        return entry
+
+    async def flush(self) -> int:
+        """
+        将缓冲和待写入队列中的消息按日志段顺序写入数据库，每个日志段写入成功后删除
+
+        :return: 写入的消息数量
+        """
+        self._rotate()
+        flushed = 0
+        while self._pending:
+            segment, entries = self._pending[0]
+            flushed += await self._insert(entries)
+            segment.unlink(missing_ok=True)
+            self._pending.pop(0)
+        return flushed
+
+    async def _insert(self, entries: List[JournalEntry]) -> int:
+        """
+        在一个事务中批量写入消息；批量写入因个别消息失败时逐条重试，仍然失败的消息移入死信文件。
+        逐条重试时数据库不可用则抛出异常，已处理的消息从 entries 中移除，剩余的消息由调用方下一轮重试
+
+        :return: 写入数据库的消息数量
+        """
+        try:
+            async with in_transaction():
+                await GroupMessage.bulk_create([entry.to_model() for entry in entries], batch_size=self.flush_size)
+            return len(entries)
+        except DATA_ERRORS as e:
+            err_logger.error(f'failed to insert group message batch, retry one by one: {e} | params: messages={len(entries)}')
+
+        inserted = 0
+        dead: List[JournalEntry] = []
+        for index, entry in enumerate(entries):
+            try:
+                await entry.to_model().save()
+                inserted += 1
+            except DATA_ERRORS as e:
+                err_logger.error(f'failed to insert group message: {e} | params: group_id={entry.group_id}; user_id={entry.user_id}')
+                dead.append(entry)
+            except Exception:
+                self._dead_letter(dead)
+                del entries[:index]
+                raise
+        self._dead_letter(dead)
+        return inserted
+
+    def _dead_letter(self, entries: List[JournalEntry]) -> None:
+        """将无法写入数据库的消息追加到死信文件（格式与日志段相同），供人工处理"""
+        if not entries:
+            return
+        with open(self.directory / DEAD_LETTER_FILE, 'a', encoding='utf-8') as file:
+            file.writelines(entry.to_line() for entry in entries)
+        err_logger.error(f'moved group messages to dead letter file | params: messages={len(entries)}; file={DEAD_LETTER_FILE}')
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # 数据库不可用时消息留在待写入队列和日志段中，下一轮重试
+                pending = sum(len(entries) for _, entries in self._pending)
+                err_logger.error(f'failed to flush group messages: {e} | params: pending={pending}')
+                await asyncio.sleep(self.flush_interval)
+
+    async def replay(self) -> int:
+        """
+        重放已退出进程留下的日志段，数据库中已存在（群、用户、时间相同）的消息不重复写入
+
+        :return: 补写的消息数量
+        """
+        tokens = {path.name.rsplit('-', 1)[0] for path in self.directory.glob('*.ndjson')}
+        tokens |= {path.stem for path in self.directory.glob('*.lock')}
+        tokens.discard(self._token)
+
+        replayed = 0
+        for token in sorted(tokens):
+            lock_path = self.directory / f'{token}.lock'
+            owner_lock = try_lock(lock_path)
+            if owner_lock is None:
+                # 所属进程仍在运行
+                continue
+            try:
+                for segment in sorted(self.directory.glob(f'{token}-*.ndjson')):
+                    entries = read_segment(segment)
+                    for start in range(0, len(entries), self.flush_size):
+                        replayed += await self._insert_missing(entries[start:start + self.flush_size])
+                    segment.unlink()
+            finally:
+                owner_lock.close()
+            lock_path.unlink(missing_ok=True)
+        return replayed
+
+    async def _insert_missing(self, entries: List[JournalEntry]) -> int:
+        """写入数据库中还不存在的消息（进程可能在写入数据库之后、删除日志段之前退出）"""
+        if not entries:
+            return 0
+        existing = set(await GroupMessage.filter(
+            group_id__in=list({entry.group_id for entry in entries}),
+            created_at__in=list({entry.created_at for entry in entries}),
+        ).values_list('group_id', 'user_id', 'created_at'))
+        missing = [
+            entry
+            for entry in entries
+            if (entry.group_id, entry.user_id, entry.created_at) not in existing
+        ]
+        if not missing:
+            return 0
+        return await self._insert(missing)
+
+    async def start(self) -> None:
+        """创建日志目录、重放已退出进程的日志段并启动后台写入（应用启动时调用）"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = try_lock(self.directory / f'{self._token}.lock')
+        try:
+            replayed = await self.replay()
+            if replayed:
+                info_logger.info(f'replayed group message journal | params: messages={replayed}')
+        except Exception as e:
+            # 重放失败的日志段保留在目录中，由之后启动的进程重试，不影响本进程启动
+            err_logger.error(f'failed to replay group message journal: {e} | params: directory={self.directory}')
+        self._open_segment()
+        self._closing = False
+        self._task = asyncio.create_task(self._run(), name='group-message-journal')
+
+    async def stop(self) -> None:
+        """停止后台写入并写入剩余的消息（应用关闭时调用），写入失败的消息保留在日志段中；start 中途失败时只释放已打开的文件"""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            try:
+                await self.flush()
+            except Exception as e:
+                err_logger.error(f'failed to flush group messages on shutdown: {e} | params: pending={len(self._pending)}')
+        # 当前日志段中的消息已在 flush 时移入待写入队列，只需删除空的日志段
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._segment is not None and not self._buffer:
+            self._segment.unlink(missing_ok=True)
+            self._segment = None
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+            if not self._pending and not self._buffer:
+                (self.directory / f'{self._token}.lock').unlink(missing_ok=True)
+
+
+group_message_journal = GroupMessageJournal(group_message_journal_dir)
@@ -0,0 +1,33 @@
+"""
+群聊名称子串索引
+
+启动时从 Group 表加载，创建、改名、解散群聊时同步更新，
+搜索群聊时先把 name_in 解析为群聊id集合，再用 id IN (...) 查询，避免 LIKE '%x%' 全表扫描。
+
+索引是进程内的，其他 worker 进程的变更只能通过定时重建（GROUP_NAME_INDEX_RELOAD_SECONDS）同步，
+在两次重建之间：上次重建后新建的群聊（id 大于 loaded_max_id）由搜索直接查询数据库补齐，
+被改名或解散的群聊由搜索按数据库中的当前名称复核剔除
+"""
+import asyncio
+from app.db.models import Group
+from app.utils.ngram_index import NgramIndex
+
+
+class GroupNameIndex(NgramIndex[int]):
+    """群聊id -> 群聊名称的子串索引"""
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = asyncio.Lock()
+        self.loaded_max_id = 0      # 上次重建时 Group 表的最大id，更大的id可能未被本进程索引
+
+    async def load(self) -> None:
+        """从 Group 表重建索引（启动时及定时调用）"""
+        async with self._lock:
+            rows = await Group.all().values('id', 'name')
+            self.clear()
+            for row in rows:
+                self.add(row['id'], row['name'])
+            self.loaded_max_id = max((row['id'] for row in rows), default=0)
+
+
+group_name_index = GroupNameIndex()
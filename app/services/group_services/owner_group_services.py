@@ -6,6 +6,7 @@ from tortoise.transactions import atomic
 from tortoise.exceptions import DoesNotExist
 from app.db.models import Group, GroupUser
 from app.db.model_dependencies import GroupMemberStatus
+from app.services.group_services.group_name_index import group_name_index
 
 
 async def confirm_user_is_owner(
@@ -51,6 +52,7 @@ async def delete_group_service(
     # 2.删除群聊
     group = await Group.get(uid=group_uid)
     await group.delete()
+    group_name_index.remove(group.id)
     return 'delete group success'
 
 
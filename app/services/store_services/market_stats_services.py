@@ -0,0 +1,111 @@
+"""
+市场行情统计服务
+
+每次成交在写入 StoreRecord 的同一事务中，用一条 upsert 更新该卡牌所在小时和当天的行情（开高低收、成交量、成交额），
+查询价格走势时直接读取预先聚合的区间，不扫描交易记录表
+"""
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+from tortoise import timezone
+from app.db.models import MarketStat
+from app.db.model_dependencies import MarketStatPeriod
+from app.db.sql_dialect import model_connection
+from app.schemas.record_schemas import MarketStatParams
+
+
+def bucket_start_of(at: datetime, period: MarketStatPeriod) -> datetime:
+    """
+    计算时间所在统计区间的开始时间
+
+    :param at: 成交时间
+    :param period: 统计周期
+
+    :return: 小时或当天的开始时间
+    """
+    match period:
+        case MarketStatPeriod.HOUR:
+            return at.replace(minute=0, second=0, microsecond=0)
+        case MarketStatPeriod.DAY:
+            return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def record_trades(
+    card_id: int,
+    fills: Sequence[Tuple[int, int]],
+    at: Optional[datetime] = None,
+) -> None:
+    """
+    将一次购买中同一卡牌的成交计入行情统计，须在写入交易记录的事务中调用
+
+    :param card_id: 卡牌id
+    :param fills: 按成交顺序排列的 (单价, 数量)
+    :param at: 成交时间，默认当前时间
+
+    :return: None
+    """
+    if not fills:
+        return None
+    at = at or timezone.now()
+    prices = [price for price, _ in fills]
+    open_price, close_price, high, low = prices[0], prices[-1], max(prices), min(prices)
+    volume = sum(number for _, number in fills)
+    turnover = sum(price * number for price, number in fills)
+    rows = [
+        (card_id, int(period), bucket_start_of(at, period), open_price, high, low, close_price, volume, turnover, len(fills))
+        for period in MarketStatPeriod
+    ]
+
+    connection, dialect = model_connection(MarketStat)
+    columns = ('card_id', 'period', 'bucket_start', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'trades')
+    sql = dialect.insert(MarketStat._meta.db_table, columns, len(rows)) + ' ' + dialect.upsert(
+        ('card_id', 'period', 'bucket_start'),
+        {
+            'high': dialect.greatest('high'),
+            'low': dialect.least('low'),
+            'close': dialect.excluded('close'),
+            'volume': dialect.increment('volume'),
+            'turnover': dialect.increment('turnover'),
+            'trades': dialect.increment('trades'),
+        },
+    )
+
+    await connection.execute_query(sql, [value for row in rows for value in row])
+    return None
+
+
+async def query_market_stats_service(
+    card_id: int,
+    period: MarketStatPeriod,
+    limit: int,
+    before: Optional[datetime] = None,
+) -> List[MarketStatParams]:
+    """
+    查询卡牌最近的行情区间
+
+    :param card_id: 卡牌id
+    :param period: 统计周期
+    :param limit: 返回的区间数量
+    :param before: 只返回开始时间早于此时间的区间，用于向前翻页
+
+    :return: 按时间升序排列的行情区间（没有成交的区间不返回）
+    """
+    query = MarketStat.filter(card_id=card_id, period=period)
+    if before is not None:
+        query = query.filter(bucket_start__lt=before)
+    rows = await query.order_by('-bucket_start').limit(limit).values(
+        'bucket_start', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'trades',
+    )
+    return [
+        MarketStatParams(
+            bucket_start=row['bucket_start'],
+            open=row['open'],
+            high=row['high'],
+            low=row['low'],
+            close=row['close'],
+            volume=row['volume'],
+            turnover=row['turnover'],
+            trades=row['trades'],
+            vwap=row['turnover'] / row['volume'] if row['volume'] else float(row['close']),
+        )
+        for row in reversed(rows)
+    ]
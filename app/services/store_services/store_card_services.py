@@ -1,11 +1,18 @@
-from datetime import datetime, timedelta, UTC
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 from tortoise.queryset import Q
-from tortoise.transactions import atomic
+from tortoise.transactions import in_transaction
 from app.core.exceptions import UnAtomicError
 from app.core.extra_params import extra_params
-from app.schemas.card_schemas import StoreCardParams
+from app.schemas.card_schemas import StoreCardParams, MarketBuyParams, MarketFillParams
 from app.db.models import Store, User, UserCard, StoreRecord
+from app.db.model_dependencies import ByteLedgerReason
+from app.services.card_services.card_catalog import card_catalog
+from app.utils.keyset_cursor import encode_cursor, decode_cursor
+from app.services.store_services.market_stats_services import record_trades
+from app.services.store_services.store_order_book import store_order_book
+from app.services.store_services.trade_limiter import trade_limiter
+from app.services.user_services.user_balance_services import apply_byte_deltas
+from app.services.user_services.user_inventory_services import grant_cards
 
 
 async def query_store_service(
@@ -14,55 +21,82 @@ async def query_store_service(
 	name_in: Optional[str] = None,
 	price_le: Optional[int] = None,
 	price_ge: Optional[int] = None,
-) -> List[StoreCardParams]:
+	cursor: Optional[str] = None,
+	page_size: int = extra_params.STORE_PAGE_SIZE,
+) -> Tuple[List[StoreCardParams], Optional[str]]:
 	"""
-	查看在售卡牌，可选名称或价格作为查询参数。
+	分页查看在售卡牌，可选名称或价格作为查询参数，按 (价格, 商店id) 升序排列。
 	
 	:param user_id: 用户id, 用于过滤用户等级未解锁的卡牌
 	:param package: 扩展包名称
 	:param name_in: 卡牌名称中包含的字符串（模糊查询）
 	:param price_le: 价格小于等于此值
 	:param price_ge: 价格大于等于此值
+	:param cursor: 上一页返回的游标，为None时查询第一页
+	:param page_size: 每页数量，不超过 MAX_STORE_PAGE_SIZE
 	
-	:return: 查询结果卡牌列表
+	:return: 查询结果卡牌列表，下一页的游标（没有下一页时为None）
 	"""
-	# 1.查询用户等级
-	user = await User.get(id=user_id)
-	# 2.使用 Q 对象构建查询条件
-	query = Q(card__unlock_level__gte=user.level)
-	if package is not None:
-		query &= Q(card__package=package)
-	if name_in is not None:
-		query &= Q(card__name__icontains=name_in)
+	# 1.解析游标
+	after: Optional[Tuple[int, int]] = None
+	if cursor is not None:
+		try:
+			after = decode_cursor(cursor, 2)
+		except ValueError:
+			raise UnAtomicError(message='invalid cursor')
+		if not all(isinstance(value, int) for value in after):
+			raise UnAtomicError(message='invalid cursor')
+	page_size = min(page_size, extra_params.MAX_STORE_PAGE_SIZE)
 	
-	query &= Q(is_publish=True)     # 为了利用复合索引，把这一参数写在中间
+	# 2.从卡牌目录中筛选出用户等级已解锁且符合条件的卡牌
+	catalog = await card_catalog.get()
+	level = await User.filter(id=user_id).first().values_list('level', flat=True)
+	cards = {
+		card.id: card
+		for card in catalog.filter(name_in=name_in, package=package, max_unlock_level=level)
+	}
+	if not cards:
+		return [], None
 	
+	# 3.使用 Q 对象构建查询条件；所有卡牌都符合条件时也按卡牌过滤，目录加载之后新增的卡牌的挂单不在结果中
+	query = Q(is_publish=True, card_id__in=list(cards))
 	if price_le is not None:
 		query &= Q(price__lte=price_le)
 	if price_ge is not None:
 		query &= Q(price__gte=price_ge)
-
-	store_items = await Store.filter(query).select_related('card', 'owner').all()
+	if after is not None:
+		after_price, after_id = after
+		query &= Q(price__gt=after_price) | Q(price=after_price, id__gt=after_id)
 	
-	# 3.将要返回的数据组织为pydantic.BaseModel
-	cards = [
+	# 4.只查询需要的列，多取一行用于判断是否有下一页
+	store_items = await Store.filter(query).order_by('price', 'id').limit(page_size + 1).values(
+		'id', 'card_id', 'number', 'price', 'owner__name',
+	)
+	next_cursor = None
+	if len(store_items) > page_size:
+		store_items = store_items[:page_size]
+		next_cursor = encode_cursor(store_items[-1]['price'], store_items[-1]['id'])
+	
+	# 5.将要返回的数据组织为pydantic.BaseModel
+	result = [
 		StoreCardParams(
-			card_id=store_card.card.id,
-			store_id=store_card.id,
-			name=store_card.card.name,
-			image=store_card.card.image,
-			rarity=store_card.card.rarity,
-			package=store_card.card.package,
-			description=store_card.card.description,
-			number=store_card.number,
-			price=store_card.price,
-			owner_name=store_card.owner.name,
+			card_id=item['card_id'],
+			store_id=item['id'],
+			name=cards[item['card_id']].name,
+			image=cards[item['card_id']].image,
+			rarity=cards[item['card_id']].rarity,
+			package=cards[item['card_id']].package,
+			unlock_level=cards[item['card_id']].unlock_level,
+			description=cards[item['card_id']].description,
+			number=item['number'],
+			price=item['price'],
+			owner_name=item['owner__name'],
 			is_publish=True,
 		)
-		for store_card in store_items
+		for item in store_items
 	]
 
-	return cards
+	return result, next_cursor
 
 
 async def query_friend_store_service(
@@ -99,7 +133,57 @@ async def query_friend_store_service(
 	return cards
 
 
-@atomic()
+async def query_best_offers_service(
+	card_id: int,
+	limit: int,
+	user_id: Optional[int] = None,
+) -> List[StoreCardParams]:
+	"""
+	从订单簿查看指定卡牌最优（价格最低）的N个公开挂单
+	
+	:param card_id: 卡牌id
+	:param limit: 返回数量
+	:param user_id: 当前用户id，不返回其本人的挂单
+	
+	:return: 按价格升序的在售卡牌，卡牌不存在时返回空列表
+	"""
+	# 1.从卡牌目录和订单簿中读取卡牌信息和挂单
+	catalog = await card_catalog.get()
+	card = catalog.get(card_id)
+	if card is None:
+		return []
+	offers = store_order_book.best_offers(card_id=card_id, limit=limit, exclude_owner=user_id)
+	if not offers:
+		# 订单簿中没有挂单时从数据库重建该卡牌的挂单（其他 worker 可能刚刚上架）
+		await store_order_book.reload_card(card_id)
+		offers = store_order_book.best_offers(card_id=card_id, limit=limit, exclude_owner=user_id)
+	if not offers:
+		return []
+	
+	# 2.一次查询取得所有卖家名称
+	owners = await User.filter(id__in={offer.owner_id for offer in offers}).values('id', 'name')
+	owner_names = {owner['id']: owner['name'] for owner in owners}
+	
+	# 3.将要返回的数据组织为pydantic.BaseModel
+	return [
+		StoreCardParams(
+			card_id=card.id,
+			store_id=offer.store_id,
+			name=card.name,
+			image=card.image,
+			rarity=card.rarity,
+			package=card.package,
+			unlock_level=card.unlock_level,
+			description=card.description,
+			number=offer.number,
+			price=offer.price,
+			owner_name=owner_names.get(offer.owner_id),
+			is_publish=True,
+		)
+		for offer in offers
+	]
+
+
 async def list_card_service(
 	user_id: int,
 	card_to_list: StoreCardParams,
@@ -112,46 +196,92 @@ async def list_card_service(
 	
 	:return: 上架成功返回None
 	"""
-	# 1.确定卖家有足够的卡牌
-	seller_card = await UserCard.filter(
-		user_id=user_id,
-		card_id=card_to_list.card_id,
-	).select_for_update().first()
-	if not seller_card:
-		raise UnAtomicError(message='card not found')
-	elif seller_card.number < card_to_list.number:
-		raise UnAtomicError(message='card not enough')
-		
-	# 2.扣除卖家已上架的卡牌
-	seller_card.number -= card_to_list.number
-	if seller_card.number == 0:
-		await seller_card.delete()
-	else:
-		await seller_card.save()
-
-	# 3.商店中有该卖家上架的该卡牌则增加数量，没有则新建
-	store_card = await Store.filter(
-		card_id=card_to_list.card_id,
-		owner_id=user_id
-	).select_for_update().first()
-	if store_card:
-		store_card.number += card_to_list.number
-		store_card.price = card_to_list.price
-		await store_card.save()
-		
-	else:
-		await Store.create(
+	async with in_transaction():
+		# 1.确定卖家有足够的卡牌
+		seller_card = await UserCard.filter(
+			user_id=user_id,
 			card_id=card_to_list.card_id,
-			owner_id=user_id,
-			number=card_to_list.number,
-			price=card_to_list.price,
-			is_publish=card_to_list.is_publish,
-		)
+		).select_for_update().first()
+		if not seller_card:
+			raise UnAtomicError(message='card not found')
+		elif seller_card.number < card_to_list.number:
+			raise UnAtomicError(message='card not enough')
+			
+		# 2.扣除卖家已上架的卡牌
+		seller_card.number -= card_to_list.number
+		if seller_card.number == 0:
+			await seller_card.delete()
+		else:
+			await seller_card.save()
+	
+		# 3.商店中有该卖家上架的该卡牌则增加数量，没有则新建
+		store_card = await Store.filter(
+			card_id=card_to_list.card_id,
+			owner_id=user_id
+		).select_for_update().first()
+		if store_card:
+			store_card.number += card_to_list.number
+			store_card.price = card_to_list.price
+			await store_card.save()
+			
+		else:
+			store_card = await Store.create(
+				card_id=card_to_list.card_id,
+				owner_id=user_id,
+				number=card_to_list.number,
+				price=card_to_list.price,
+				is_publish=card_to_list.is_publish,
+			)
+	
+	# 4.事务提交后同步订单簿
+	store_order_book.sync(store_card, store_card.id)
+	return None
+
+
+async def match_listing(
+	card_id: int,
+	number: int,
+	max_price: int,
+	exclude_owner: int,
+) -> Optional[Store]:
+	"""
+	从订单簿中按价格从低到高撮合一条满足数量和价格上限的公开挂单，并在数据库中加锁确认，须在事务中调用。
+	订单簿中的候选挂单都不可成交时（可能已被其他 worker 修改），从数据库重建该卡牌的挂单后再撮合一次
+	
+	:param card_id: 卡牌id
+	:param number: 购买数量
+	:param max_price: 可接受的最高单价
+	:param exclude_owner: 买家id，不能买自己的挂单
 	
+	:return: 加锁后的挂单，没有满足条件的挂单时返回None
+	"""
+	for attempt in range(2):
+		if attempt:
+			await store_order_book.reload_card(card_id)
+		candidates = store_order_book.best_offers(
+			card_id=card_id,
+			limit=extra_params.SLIPPAGE_MATCH_ATTEMPTS,
+			max_price=max_price,
+			min_number=number,
+			exclude_owner=exclude_owner,
+		)
+		for listing in candidates:
+			store_card = await Store.filter(
+				id=listing.store_id,
+				is_publish=True         # 滑点购买自动检索只能检索公开购买的卡牌
+			).select_for_update().first()
+			if (
+				store_card
+				and store_card.number >= number
+				and store_card.price <= max_price
+				and store_card.owner_id != exclude_owner
+			):
+				return store_card
+			# 订单簿中的挂单已过期，用数据库中的状态修正
+			store_order_book.sync(store_card, listing.store_id)
 	return None
 
 
-@atomic()
 async def buy_card_service(
 	user_id: int,
 	card_to_buy: StoreCardParams,
@@ -168,94 +298,203 @@ async def buy_card_service(
 
 	:return: 购买卡牌消耗的比特
 	"""
-	# 1.确定商店中目标购买卡牌存在
-	store_card = await Store.filter(
-		id=card_to_buy.store_id,
-		is_publish=is_publish,
-	).select_related('card', 'owner').select_for_update().first()
-	if not store_card:
-		if except_slippage is None:
-			raise UnAtomicError(message='card not found')
-
-		else:
+	catalog = await card_catalog.get()
+	async with trade_limiter.reserve(user_id) as reservation:
+		async with in_transaction():
+			# 1.确定商店中目标购买卡牌存在，不满足时按滑点从订单簿中撮合
 			store_card = await Store.filter(
-				card__id=card_to_buy.card_id,
-				is_publish=True         # 滑点购买自动检索只能检索公开购买的卡牌
-			).select_related('card', 'owner').order_by('price').select_for_update().first()
+				id=card_to_buy.store_id,
+				is_publish=is_publish,
+			).select_for_update().first()
+			if not store_card or store_card.number < card_to_buy.number or card_to_buy.price < store_card.price:
+				if except_slippage is None:
+					raise UnAtomicError(message='card not found')
 			
-			if not store_card:
-				raise UnAtomicError(message='card not found with except_slippage')
-			elif store_card.number < card_to_buy.number or store_card.price < card_to_buy.price + except_slippage:
-				raise UnAtomicError(message='card not found with except_slippage')
-	elif store_card.number < card_to_buy.number or card_to_buy.price < store_card.price:
-		raise UnAtomicError(message='card not found')
-	
-	# 2.确定买家和卖家不是同一人
-	if user_id == store_card.owner.id:
-		raise UnAtomicError(message='can not buy self card')
+				store_card = await match_listing(
+					card_id=card_to_buy.card_id,
+					number=card_to_buy.number,
+					max_price=card_to_buy.price + except_slippage,
+					exclude_owner=user_id,
+				)
+				if not store_card:
+					raise UnAtomicError(message='card not found with except_slippage')
+		
+			# 2.确定买家和卖家不是同一人
+			if user_id == store_card.owner_id:
+				raise UnAtomicError(message='can not buy self card')
+		
+			# 3.确认买家24小时购买数量在限定次数以下（事务回滚时归还占用的次数）
+			if not await reservation.take(1):
+				raise UnAtomicError(message='trade today too march')
+		
+			# 4.确定买家等级高于卡牌解锁等级
+			card = catalog.get(store_card.card_id)
+			buyer = await User.get(id=user_id).values('level')
+			if card is not None and buyer['level'] < card.unlock_level:
+				raise UnAtomicError(message='user level not enough', unlock_level=card.unlock_level)
+		
+			# 5.更新用户-卡牌关系表，使买家获得卡牌（不存在则创建，存在则增加持有数量）
+			await grant_cards(user_id=user_id, deltas={store_card.card_id: card_to_buy.number})
+		
+			# 6.用一条条件更新扣除买家的比特、为卖家增加比特并记录流水，买家比特不足时回滚（如果需要收取手续费在此修改）
+			need_byte = store_card.price * card_to_buy.number
+			if not await apply_byte_deltas(
+				{user_id: -need_byte, store_card.owner_id: need_byte},
+				reason=ByteLedgerReason.STORE_TRADE,
+				ref_id=store_card.card_id,
+			):
+				raise UnAtomicError(message='user byte not enough', need_byte=need_byte)
+		
+			# 7.扣除商店表中已被购买的卡牌
+			store_card.number -= card_to_buy.number
+			if store_card.number == 0:
+				await store_card.delete()
+			else:
+				await store_card.save()
+			
+			# 8.记录购买记录并计入行情统计
+			await StoreRecord.create(
+				buyer_id=user_id,
+				seller_id=store_card.owner_id,
+				card_id=store_card.card_id,
+				number=card_to_buy.number,
+				price=store_card.price,
+			)
+			await record_trades(card_id=store_card.card_id, fills=[(store_card.price, card_to_buy.number)])
 	
-	# 3.确认买家24小时购买数量在限定次数以下
-	twenty_four_hours_ago = datetime.now(UTC) - timedelta(hours=24)
-	buy_count = await StoreRecord.filter(
-		buyer_id=user_id,
-		created_at__gte=twenty_four_hours_ago
-	).count()
-	if buy_count >= extra_params.MAX_TRADE_DAY:
-		raise UnAtomicError(message='trade today too march')
+	# 9.事务提交后同步订单簿
+	store_order_book.sync(store_card if store_card.number > 0 else None, store_card.id)
+	return need_byte
+
+
+async def market_buy_card_service(
+	user_id: int,
+	order: MarketBuyParams,
+) -> Tuple[List[MarketFillParams], int]:
+	"""
+	市价购买：按价格从低到高依次从多个卖家的公开挂单中成交，直到满足购买数量或达到价格上限，
+	所有成交在同一个事务中完成，卖家比特批量增加、交易记录批量写入
 	
-	# 4.确定买家有足够比特且等级高于卡牌解锁等级
-	need_byte = store_card.price * card_to_buy.number
-	buyer = await User.filter(id=user_id).select_for_update().first()
-	if buyer.byte < need_byte:
-		raise UnAtomicError(message='user byte not enough', need_byte=need_byte)
-	elif buyer.level < store_card.card.unlock_level:
-		raise UnAtomicError(message='user level not enough', unlock_level=store_card.card.unlock_level)
+	:param user_id: 买家 id
+	:param order: 市价购买请求
 	
-	# 5.更新用户-卡牌关系表，使买家获得卡牌（不存在则创建，存在则增加持有数量）
-	user_card = await UserCard.filter(
-		user_id=buyer.id,
-		card_id=store_card.card.id
-	).select_for_update().first()
+	:return: 各挂单的成交明细，购买卡牌消耗的比特
+	"""
+	# 1.确认卡牌存在，并从订单簿中选出足以满足购买数量的最优挂单
+	catalog = await card_catalog.get()
+	card = catalog.get(order.card_id)
+	if card is None:
+		raise UnAtomicError(message='card not found')
 	
-	if user_card:
-		user_card.number += card_to_buy.number
-		await user_card.save()
-	else:
-		await UserCard.create(
-			user_id=buyer.id,
-			card_id=store_card.card.id,
-			number=card_to_buy.number
+	offers = store_order_book.best_offers(
+		card_id=order.card_id,
+		limit=extra_params.MAX_MARKET_FILLS,
+		max_price=order.max_price,
+		exclude_owner=user_id,
+	)
+	if sum(listing.number for listing in offers) < order.number:
+		# 订单簿中的挂单不足时从数据库重建该卡牌的挂单（其他 worker 可能刚刚上架）
+		await store_order_book.reload_card(order.card_id)
+		offers = store_order_book.best_offers(
+			card_id=order.card_id,
+			limit=extra_params.MAX_MARKET_FILLS,
+			max_price=order.max_price,
+			exclude_owner=user_id,
 		)
 	
-	# 6.扣除买家购买卡牌需要的比特
-	buyer.byte -= need_byte
-	await buyer.save()
-	
-	# 7.为卖家增加出售卡牌获得的比特（如果需要收取手续费在此修改）
-	seller = await User.filter(id=store_card.owner.id).select_for_update().first()
-	seller.byte += need_byte
-	await seller.save()
+	candidates = []
+	planned = 0
+	for listing in offers:
+		candidates.append(listing.store_id)
+		planned += listing.number
+		if planned >= order.number:
+			break
+	if not candidates:
+		raise UnAtomicError(message='card not found with except_slippage')
 	
-	# 8.扣除商店表中已被购买的卡牌
-	store_card.number -= card_to_buy.number
-	if store_card.number == 0:
-		await store_card.delete()
-	else:
-		await store_card.save()
+	async with trade_limiter.reserve(user_id) as reservation:
+		async with in_transaction():
+			# 2.按商店id顺序一次锁定所有候选挂单，并在数据库中重新确认价格和数量
+			store_cards = await Store.filter(
+				id__in=candidates,
+				card_id=order.card_id,
+				is_publish=True,
+				price__lte=order.max_price,
+			).exclude(owner_id=user_id).order_by('id').select_for_update()
+			store_cards.sort(key=lambda store_card: (store_card.price, store_card.id))
 		
-	# 9.记录购买记录
-	await StoreRecord.create(
-		buyer_id=buyer.id,
-		seller_id=seller.id,
-		card_id=store_card.card.id,
-		number=card_to_buy.number,
-		price=store_card.price,
-	)
+			# 3.按价格从低到高分配成交数量
+			fills: List[MarketFillParams] = []
+			filled_cards: List[Store] = []
+			remain = order.number
+			for store_card in store_cards:
+				if remain == 0:
+					break
+				fill_num = min(remain, store_card.number)
+				fills.append(MarketFillParams(store_id=store_card.id, number=fill_num, price=store_card.price))
+				filled_cards.append(store_card)
+				remain -= fill_num
+			if not fills:
+				raise UnAtomicError(message='card not found with except_slippage')
+			elif remain and not order.allow_partial:
+				raise UnAtomicError(message='card not enough', available=order.number - remain)
+		
+			# 4.确认买家24小时购买数量在限定次数以下（每个成交的挂单记为一次交易，事务回滚时归还）
+			if not await reservation.take(len(fills)):
+				raise UnAtomicError(message='trade today too march')
+		
+			# 5.确定买家等级高于卡牌解锁等级
+			buyer = await User.get(id=user_id).values('level')
+			if buyer['level'] < card.unlock_level:
+				raise UnAtomicError(message='user level not enough', unlock_level=card.unlock_level)
+		
+			# 6.买家获得卡牌；用一条条件更新扣除买家比特、为各卖家增加比特并记录流水，买家比特不足时回滚（如果需要收取手续费在此修改）
+			filled_num = order.number - remain
+			await grant_cards(user_id=user_id, deltas={order.card_id: filled_num})
+		
+			need_byte = sum(fill.price * fill.number for fill in fills)
+			byte_deltas: Dict[int, int] = {user_id: -need_byte}
+			for store_card, fill in zip(filled_cards, fills):
+				byte_deltas[store_card.owner_id] = byte_deltas.get(store_card.owner_id, 0) + fill.price * fill.number
+			if not await apply_byte_deltas(byte_deltas, reason=ByteLedgerReason.STORE_TRADE, ref_id=order.card_id):
+				raise UnAtomicError(message='user byte not enough', need_byte=need_byte)
+		
+			# 7.扣除商店表中已被购买的卡牌：售罄的挂单一次删除，最多只有最后一个挂单部分成交
+			sold_out_ids = []
+			for store_card, fill in zip(filled_cards, fills):
+				store_card.number -= fill.number
+				if store_card.number == 0:
+					sold_out_ids.append(store_card.id)
+				else:
+					await store_card.save(update_fields=['number'])
+			if sold_out_ids:
+				await Store.filter(id__in=sold_out_ids).delete()
+		
+			# 8.批量记录购买记录并计入行情统计
+			await StoreRecord.bulk_create([
+				StoreRecord(
+					buyer_id=user_id,
+					seller_id=store_card.owner_id,
+					card_id=order.card_id,
+					number=fill.number,
+					price=fill.price,
+				)
+				for store_card, fill in zip(filled_cards, fills)
+			])
+			await record_trades(card_id=order.card_id, fills=[(fill.price, fill.number) for fill in fills])
 	
-	return need_byte
+	# 9.事务提交后同步订单簿，订单簿中已过期的候选挂单按数据库状态修正
+	for store_card in filled_cards:
+		store_order_book.sync(store_card if store_card.number > 0 else None, store_card.id)
+	stale_ids = set(candidates) - {store_card.id for store_card in store_cards}
+	if stale_ids:
+		stale_cards = {store_card.id: store_card for store_card in await Store.filter(id__in=stale_ids)}
+		for store_id in stale_ids:
+			store_order_book.sync(stale_cards.get(store_id), store_id)
+	
+	return fills, need_byte
 
 
-@atomic()
 async def delist_card_service(
 	user_id: int,
 	card_to_delist: StoreCardParams,
@@ -268,38 +507,30 @@ async def delist_card_service(
 
 	:return: 商店中的卡牌数量不足目标数量的量
 	"""
-	# 1.确认商店中待下架的卡牌存在
-	store_card = await Store.filter(
-		card_id=card_to_delist.card_id,
-		owner_id=user_id,
-	).select_for_update().first()
-	if not store_card:
-		raise UnAtomicError(message='card not found')
-	elif store_card.number < card_to_delist.number:
-		require_num = card_to_delist.number - store_card.number
-	else:
-		require_num = 0
-	
-	# 2.为用户增加下架后的卡牌
-	user_card = await UserCard.filter(
-		user_id=user_id,
-		card_id=card_to_delist.card_id
-	).select_for_update().first()
-	if user_card:
-		user_card.number += store_card.number
-		await user_card.save()
-	else:
-		await UserCard.create(
-			user_id=user_id,
+	async with in_transaction():
+		# 1.确认商店中待下架的卡牌存在
+		store_card = await Store.filter(
 			card_id=card_to_delist.card_id,
-			number=store_card.number,
-		)
-	
-	# 3.扣除商店中下架的卡牌
-	store_card.number -= card_to_delist.number
-	if store_card.number == 0:
-		await store_card.delete()
-	else:
-		await store_card.save()
+			owner_id=user_id,
+		).select_for_update().first()
+		if not store_card:
+			raise UnAtomicError(message='card not found')
+		elif store_card.number < card_to_delist.number:
+			require_num = card_to_delist.number - store_card.number
+		else:
+			require_num = 0
 		
+		# 2.为用户增加下架后的卡牌（最多为商店中剩余的数量）
+		delist_num = card_to_delist.number - require_num
+		await grant_cards(user_id=user_id, deltas={card_to_delist.card_id: delist_num})
+		
+		# 3.扣除商店中下架的卡牌
+		store_card.number -= delist_num
+		if store_card.number == 0:
+			await store_card.delete()
+		else:
+			await store_card.save()
+	
+	# 4.事务提交后同步订单簿
+	store_order_book.sync(store_card if store_card.number > 0 else None, store_card.id)
 	return require_num
@@ -0,0 +1,179 @@
+"""
+商店订单簿
+
+按卡牌维护公开出售挂单的价格有序索引，回答"某卡牌最优的N个报价"和滑点撮合查询，
+数据库只在锁定并提交选中的挂单时访问。挂单变更在事务提交后写入订单簿（write-through），
+数据库仍是唯一可信来源：撮合时以加锁读取的挂单为准，发现订单簿过期时顺带修正。
+订单簿是每个 worker 进程各自的，其他 worker 的上架、购买和下架通过每 STORE_ORDER_BOOK_RELOAD_SECONDS 重建一次同步；
+某卡牌在订单簿中没有可成交的挂单时，调用方用 reload_card 从数据库重建该卡牌的挂单后再试一次。
+"""
+import asyncio
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.db.models import Store
+
+
+LISTING_FIELDS = ('id', 'card_id', 'owner_id', 'price', 'number')
+
+
+@dataclass(slots=True)
+class Listing:
+    """订单簿中的挂单"""
+    store_id: int
+    card_id: int
+    owner_id: int
+    price: int
+    number: int
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'Listing':
+        return cls(
+            store_id=row['id'],
+            card_id=row['card_id'],
+            owner_id=row['owner_id'],
+            price=row['price'],
+            number=row['number'],
+        )
+
+    @classmethod
+    def from_store(cls, store: Store) -> 'Listing':
+        return cls(
+            store_id=store.id,
+            card_id=store.card_id,
+            owner_id=store.owner_id,
+            price=store.price,
+            number=store.number,
+        )
+
+
+class CardOrderBook:
+    """单张卡牌的挂单，按 (价格, 商店id) 升序排列"""
+    def __init__(self) -> None:
+        self._keys: List[Tuple[int, int]] = []
+        self._listings: Dict[int, Listing] = {}
+
+    def __len__(self) -> int:
+        return len(self._listings)
+
+    def get(self, store_id: int) -> Optional[Listing]:
+        return self._listings.get(store_id)
+
+    def upsert(self, listing: Listing) -> None:
+        self.remove(listing.store_id)
+        self._listings[listing.store_id] = listing
+        insort(self._keys, (listing.price, listing.store_id))
+
+    def remove(self, store_id: int) -> None:
+        listing = self._listings.pop(store_id, None)
+        if listing is None:
+            return
+        index = bisect_left(self._keys, (listing.price, store_id))
+        del self._keys[index]
+
+    def iter_offers(
+        self,
+        max_price: Optional[int] = None,
+        exclude_owner: Optional[int] = None,
+    ) -> Iterator[Listing]:
+        """按价格从低到高遍历挂单"""
+        for price, store_id in self._keys:
+            if max_price is not None and price > max_price:
+                return
+            listing = self._listings[store_id]
+            if exclude_owner is not None and listing.owner_id == exclude_owner:
+                continue
+            yield listing
+
+
+class StoreOrderBook:
+    """所有卡牌的订单簿"""
+    def __init__(self) -> None:
+        self._books: Dict[int, CardOrderBook] = {}
+        self._store_card: Dict[int, int] = {}  # 商店id -> 卡牌id
+        self._lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        """从 Store 表重建订单簿（启动时和每 STORE_ORDER_BOOK_RELOAD_SECONDS 调用）"""
+        async with self._lock:
+            rows = await Store.filter(is_publish=True).values(*LISTING_FIELDS)
+            self._books = {}
+            self._store_card = {}
+            for row in rows:
+                self.upsert(Listing.from_row(row))
+
+    async def reload_card(self, card_id: int) -> None:
+        """从 Store 表重建一张卡牌的挂单（订单簿中没有可成交的挂单、可能已经过期时调用）"""
+        rows = await Store.filter(is_publish=True, card_id=card_id).values(*LISTING_FIELDS)
+        book = self._books.get(card_id)
+        if book is not None:
+            for listing in list(book.iter_offers()):
+                self.remove(listing.store_id)
+        for row in rows:
+            self.upsert(Listing.from_row(row))
+
+    def upsert(self, listing: Listing) -> None:
+        """写入或更新挂单，数量为0时移除"""
+        if listing.number <= 0:
+            self.remove(listing.store_id)
+            return
+        old_card_id = self._store_card.get(listing.store_id)
+        if old_card_id is not None and old_card_id != listing.card_id:
+            self.remove(listing.store_id)
+        self._books.setdefault(listing.card_id, CardOrderBook()).upsert(listing)
+        self._store_card[listing.store_id] = listing.card_id
+
+    def remove(self, store_id: int) -> None:
+        card_id = self._store_card.pop(store_id, None)
+        if card_id is None:
+            return
+        book = self._books[card_id]
+        book.remove(store_id)
+        if not book:
+            del self._books[card_id]
+
+    def sync(self, store: Optional[Store], store_id: int) -> None:
+        """
+        用数据库中的挂单修正订单簿
+
+        :param store: 数据库中的挂单，已不存在时为None
+        :param store_id: 商店id
+        """
+        if store is None or not store.is_publish:
+            self.remove(store_id)
+        else:
+            self.upsert(Listing.from_store(store))
+
+    def best_offers(
+        self,
+        card_id: int,
+        limit: int,
+        max_price: Optional[int] = None,
+        min_number: int = 1,
+        exclude_owner: Optional[int] = None,
+    ) -> List[Listing]:
+        """
+        查询指定卡牌最优的N个报价
+
+        :param card_id: 卡牌id
+        :param limit: 返回数量
+        :param max_price: 价格上限
+        :param min_number: 挂单数量下限
+        :param exclude_owner: 排除的卖家（买家自己）
+
+        :return: 按价格升序的挂单
+        """
+        book = self._books.get(card_id)
+        if book is None:
+            return []
+        result = []
+        for listing in book.iter_offers(max_price=max_price, exclude_owner=exclude_owner):
+            if listing.number < min_number:
+                continue
+            result.append(listing)
+            if len(result) >= limit:
+                break
+        return result
+
+
+store_order_book = StoreOrderBook()
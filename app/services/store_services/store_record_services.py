@@ -1,8 +1,19 @@
+import io
+import csv
+import json
 from datetime import datetime, timedelta
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Literal, Type
 
-from app.db.models import StoreRecord
+from tortoise import timezone
+from tortoise.queryset import Q
+from app.core.extra_params import extra_params
+from app.db.models import User, StoreRecord, StoreRecordArchive
 from app.schemas.record_schemas import StoreRecordParams
+from app.services.archive_services.record_archive_services import archive_boundary
+from app.services.card_services.card_catalog import card_catalog
+
+
+EXPORT_FIELDS = ('trade_time', 'buyer_name', 'seller_name', 'card_id', 'card_name', 'number', 'price')
 
 
 async def query_buy_record_service(
@@ -11,21 +22,11 @@ async def query_buy_record_service(
     """
     获取玩家自己近一个月所有买入卡牌记录
     """
-    month_ago = datetime.now() - timedelta(days=30)
-    store_records = await StoreRecord.filter(
-        buy_id=user_id,
-        created_at__gte=month_ago
-    ).select_related('buyer', 'seller', 'card').all()
+    month_ago = timezone.now() - timedelta(days=30)
     return [
-        StoreRecordParams(
-            buyer_name=store_record.buyer.name,
-            seller_name=store_record.seller.name,
-            card_name=store_record.card.name,
-            number=store_record.number,
-            price=store_record.price,
-            trade_time=store_record.created_at
-        )
-        for store_record in store_records
+        to_store_record_params(record)
+        async for chunk in iter_trade_records(user_id, 'buy', month_ago)
+        for record in chunk
     ]
 
 
@@ -35,19 +36,124 @@ async def query_sell_record_service(
     """
     获取玩家自己近一个月所有出售卡牌记录
     """
-    month_ago = datetime.now() - timedelta(days=30)
-    store_records = await StoreRecord.filter(
-        seller_id=user_id,
-        created_at__gte=month_ago
-    ).select_related('buyer', 'seller', 'card').all()
+    month_ago = timezone.now() - timedelta(days=30)
     return [
-        StoreRecordParams(
-            buyer_name=store_record.buyer.name,
-            seller_name=store_record.seller.name,
-            card_name=store_record.card.name,
-            number=store_record.number,
-            price=store_record.price,
-            trade_time=store_record.created_at
-        )
-        for store_record in store_records
+        to_store_record_params(record)
+        async for chunk in iter_trade_records(user_id, 'sell', month_ago)
+        for record in chunk
     ]
+
+
+def to_store_record_params(record: Dict[str, Any]) -> StoreRecordParams:
+    return StoreRecordParams(
+        buyer_name=record['buyer_name'] or 'unknown',
+        seller_name=record['seller_name'] or 'unknown',
+        card_name=record['card_name'] or 'unknown',
+        number=record['number'],
+        price=record['price'],
+        trade_time=record['created_at'],
+    )
+
+
+async def iter_trade_records(
+    user_id: int,
+    role: Literal['buy', 'sell'],
+    since: datetime,
+    chunk_size: int = extra_params.EXPORT_CHUNK_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    按 (created_at, id) 游标分批读取玩家的交易记录，每批只查询需要的列，内存占用与记录总数无关。
+    查询范围早于归档边界时先读取归档表，再读取原表
+    
+    :param user_id: 玩家id
+    :param role: buy 为买入记录，sell 为出售记录
+    :param since: 只读取此时间之后的记录
+    :param chunk_size: 每批读取的记录数量
+    
+    :return: 按时间升序的记录批次
+    """
+    catalog = await card_catalog.get()
+    owner = Q(buyer_id=user_id) if role == 'buy' else Q(seller_id=user_id)
+    sources: List[Type[StoreRecord] | Type[StoreRecordArchive]] = [StoreRecord]
+    if since < archive_boundary():
+        sources.insert(0, StoreRecordArchive)
+    
+    for source in sources:
+        after = None
+        while True:
+            # 1.(buyer, created_at)/(seller, created_at) 索引上的范围扫描，从上一批最后一行之后继续
+            query = owner & Q(created_at__gte=since)
+            if after is not None:
+                after_time, after_id = after
+                query &= Q(created_at__gt=after_time) | Q(created_at=after_time, id__gt=after_id)
+            rows = await source.filter(query).order_by('created_at', 'id').limit(chunk_size).values(
+                'id', 'created_at', 'buyer_id', 'seller_id', 'card_id', 'number', 'price',
+            )
+            if not rows:
+                break
+            
+            # 2.一次查询取得本批涉及的玩家名称，卡牌名称从卡牌目录读取
+            user_ids = {row['buyer_id'] for row in rows} | {row['seller_id'] for row in rows}
+            names = {
+                user['id']: user['name']
+                for user in await User.filter(id__in=user_ids).values('id', 'name')
+            }
+            yield [
+                {
+                    'created_at': row['created_at'],
+                    'buyer_name': names.get(row['buyer_id']),
+                    'seller_name': names.get(row['seller_id']),
+                    'card_id': row['card_id'],
+                    'card_name': card.name if (card := catalog.get(row['card_id'])) else None,
+                    'number': row['number'],
+                    'price': row['price'],
+                }
+                for row in rows
+            ]
+            if len(rows) < chunk_size:
+                break
+            after = (rows[-1]['created_at'], rows[-1]['id'])
+
+
+def to_export_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'trade_time': record['created_at'].isoformat(),
+        'buyer_name': record['buyer_name'],
+        'seller_name': record['seller_name'],
+        'card_id': record['card_id'],
+        'card_name': record['card_name'],
+        'number': record['number'],
+        'price': record['price'],
+    }
+
+
+async def export_trade_records_service(
+    user_id: int,
+    role: Literal['buy', 'sell'],
+    export_format: Literal['ndjson', 'csv'],
+    days: int = 30,
+) -> AsyncIterator[str]:
+    """
+    流式导出玩家的交易记录，每读取一批记录就编码并交给响应写出
+    
+    :param user_id: 玩家id
+    :param role: buy 为买入记录，sell 为出售记录
+    :param export_format: ndjson 每行一个json对象；csv 首行为表头
+    :param days: 导出最近多少天的记录
+    
+    :return: 编码后的文本块
+    """
+    since = timezone.now() - timedelta(days=days)
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+        writer.writeheader()
+        yield buffer.getvalue()
+        async for chunk in iter_trade_records(user_id, role, since):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(to_export_row(record) for record in chunk)
+            yield buffer.getvalue()
+    else:
+        async for chunk in iter_trade_records(user_id, role, since):
+            yield ''.join(json.dumps(to_export_row(record), ensure_ascii=False) + '\n' for record in chunk)
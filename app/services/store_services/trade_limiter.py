@@ -0,0 +1,218 @@
+"""
+玩家交易次数限制
+
+按 bucket_seconds 分桶统计每名买家在滑动窗口（24小时）内的交易次数，不再在持有玩家和挂单锁的购买事务中对 store_record 执行 COUNT。
+次数以 trade_counter 表为准：购买事务中用一条 upsert 原子地增加当前桶的计数，再加锁读取窗口内的总次数，
+超过上限时由调用方回滚，多个 worker 进程共享同一份计数。
+每个进程在内存中维护一份不大于数据库计数的副本（第一次购买时从 trade_counter 加载，之后记录本进程的交易），
+超过上限的请求在访问数据库之前即被拒绝；窗口内没有交易的玩家会被清理，再次购买时重新加载。
+"""
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Tuple
+from app.core.extra_params import extra_params
+from app.db.models import TradeCounter
+from app.db.sql_dialect import model_connection
+from log.log_config.service_logger import info_logger
+
+
+class TradeReservation:
+    """
+    一次购买占用的交易次数，购买事务失败时由 TradeLimiter.reserve 整体归还
+    """
+    def __init__(self, limiter: 'TradeLimiter', user_id: int):
+        self._limiter = limiter
+        self.user_id = user_id
+        self._taken: List[Tuple[int, int]] = []     # (桶起始时间, 次数)
+
+    @property
+    def number(self) -> int:
+        return sum(number for _, number in self._taken)
+
+    async def take(self, number: int = 1) -> bool:
+        """
+        占用交易次数，须在购买事务中调用，数据库计数随事务一起提交或回滚
+
+        :param number: 本次交易次数（每个成交的挂单记为一次）
+
+        :return: 超过窗口内交易次数上限时返回False，不占用内存中的次数，调用方须回滚事务撤销数据库计数
+        """
+        bucket = self._limiter.try_add(self.user_id, number)
+        if bucket is None:
+            return False
+        if await self._limiter.add_to_counter(self.user_id, bucket, number) > self._limiter.limit:
+            self._limiter.remove(self.user_id, bucket, number)
+            return False
+        self._taken.append((bucket, number))
+        return True
+
+    def release(self) -> None:
+        for bucket, number in self._taken:
+            self._limiter.remove(self.user_id, bucket, number)
+        self._taken.clear()
+
+
+class TradeLimiter:
+    """
+    每名买家一个按时间分桶的滑动窗口计数器
+    """
+    def __init__(self, limit: int, window_seconds: int = 24 * 3600, bucket_seconds: int = 300):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self._buckets: Dict[int, Deque[List[int]]] = {}     # 玩家id -> [[桶起始时间, 次数], ...]
+        self._totals: Dict[int, int] = {}
+        self._loading: Dict[int, asyncio.Future[None]] = {}
+        self._operations = 0
+
+    def _bucket_of(self, timestamp: float) -> int:
+        return int(timestamp) // self.bucket_seconds * self.bucket_seconds
+
+    def _expire(self, user_id: int, now: float) -> None:
+        """丢弃整个桶都已滑出窗口的计数"""
+        buckets = self._buckets[user_id]
+        oldest = self.oldest_bucket(now)
+        while buckets and buckets[0][0] < oldest:
+            _, number = buckets.popleft()
+            self._totals[user_id] -= number
+
+    def oldest_bucket(self, now: float) -> int:
+        """窗口内最早的桶起始时间"""
+        return self._bucket_of(now - self.window_seconds)
+
+    async def _load(self, user_id: int) -> None:
+        """从 trade_counter 加载玩家窗口内的交易次数，同一玩家的并发加载只查询一次"""
+        if user_id in self._buckets:
+            return
+        future = self._loading.get(user_id)
+        if future is not None:
+            await future
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            counts = await TradeCounter.filter(
+                user_id=user_id,
+                bucket__gte=self.oldest_bucket(time.time()),
+            ).order_by('bucket').values_list('bucket', 'number')
+            self._buckets[user_id] = deque([bucket, number] for bucket, number in counts)
+            self._totals[user_id] = sum(number for _, number in counts)
+            future.set_result(None)
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他协程等待时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._loading[user_id]
+
+    async def add_to_counter(self, user_id: int, bucket: int, number: int) -> int:
+        """
+        在当前事务中原子地增加数据库中桶的计数，并加锁读取增加后窗口内的总次数。
+        同一玩家的并发购买在桶的计数行上排队，读到的总次数包含其他进程已提交的交易
+
+        :return: 增加后玩家窗口内的交易次数
+        """
+        connection, dialect = model_connection(TradeCounter)
+        table, placeholder = TradeCounter._meta.db_table, dialect.placeholder
+        upsert = (
+            dialect.insert(table, ('user_id', 'bucket', 'number'), 1) + ' '
+            + dialect.upsert(('user_id', 'bucket'), {'number': dialect.increment('number')})
+        )
+        total = (
+            f'SELECT COALESCE(SUM({dialect.quote("number")}), 0) AS {dialect.quote("total")} FROM {dialect.quote(table)} '
+            f'WHERE {dialect.quote("user_id")} = {placeholder} AND {dialect.quote("bucket")} >= {placeholder}{dialect.for_update}'
+        )
+
+        await connection.execute_query(upsert, [user_id, bucket, number])
+        _, rows = await connection.execute_query(total, [user_id, self.oldest_bucket(time.time())])
+        return int(rows[0]['total'])
+
+    def count(self, user_id: int) -> int:
+        """玩家窗口内的交易次数（未加载的玩家返回0）"""
+        if user_id not in self._buckets:
+            return 0
+        self._expire(user_id, time.time())
+        return self._totals[user_id]
+
+    def try_add(self, user_id: int, number: int) -> int | None:
+        """
+        在当前桶中增加交易次数，须先加载该玩家
+
+        :return: 增加到的桶起始时间，超过上限时返回None
+        """
+        now = time.time()
+        if user_id not in self._buckets:
+            # 加载后在窗口内没有交易、已被 prune 清理的玩家
+            self._buckets[user_id] = deque()
+            self._totals[user_id] = 0
+        self._expire(user_id, now)
+        if self._totals[user_id] + number > self.limit:
+            return None
+
+        buckets = self._buckets[user_id]
+        bucket = self._bucket_of(now)
+        if buckets and buckets[-1][0] == bucket:
+            buckets[-1][1] += number
+        else:
+            buckets.append([bucket, number])
+        self._totals[user_id] += number
+
+        self._operations += 1
+        if self._operations % 1024 == 0:
+            self.prune()
+        return bucket
+
+    def remove(self, user_id: int, bucket: int, number: int) -> None:
+        """归还之前增加的交易次数（桶已过期或玩家已被清理时忽略）"""
+        for entry in self._buckets.get(user_id, ()):
+            if entry[0] == bucket:
+                entry[1] -= number
+                self._totals[user_id] -= number
+                return
+
+    def prune(self) -> None:
+        """清理窗口内没有交易的玩家"""
+        now = time.time()
+        for user_id in list(self._buckets):
+            self._expire(user_id, now)
+            if not self._buckets[user_id]:
+                del self._buckets[user_id]
+                del self._totals[user_id]
+
+    @asynccontextmanager
+    async def reserve(self, user_id: int) -> AsyncIterator[TradeReservation]:
+        """
+        在购买事务外加载玩家的交易次数，事务中通过 reservation.take() 占用次数；
+        代码块抛出异常（事务回滚）时归还占用的次数
+
+        使用方式::
+
+            async with trade_limiter.reserve(user_id) as reservation:
+                async with in_transaction():
+                    if not await reservation.take(1):
+                        raise UnAtomicError(message='trade today too march')
+        """
+        await self._load(user_id)
+        reservation = TradeReservation(self, user_id)
+        try:
+            yield reservation
+        except BaseException:
+            reservation.release()
+            raise
+
+
+trade_limiter = TradeLimiter(limit=extra_params.MAX_TRADE_DAY)
+
+
+async def prune_trade_counters_job() -> None:
+    """清理周期任务：删除整个桶都已滑出窗口的计数，并清理内存中窗口内没有交易的玩家"""
+    deleted = await TradeCounter.filter(
+        bucket__lt=trade_limiter.oldest_bucket(time.time()),
+    ).delete()
+    trade_limiter.prune()
+    if deleted:
+        info_logger.info(f'pruned trade counters | params: deleted={deleted}')
@@ -0,0 +1,131 @@
+"""
+每日订单生成
+
+按 (餐馆主营业务, 有效等级) 从卡牌目录预先构建订单卡牌的别名表，生成一名玩家的24个订单只需要若干次 O(1) 采样，
+不访问数据库；批量生成时按批查询玩家等级和餐馆、按批多行插入订单。
+订单卡牌的权重为稀有度权重，餐馆主营业务对应卡包中的卡牌权重乘以 ORDER_BUSINESS_BONUS
+"""
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from app.core.extra_params import extra_params
+from app.db.model_dependencies import CardRarity, Package
+from app.services.card_services.card_catalog import CardCatalog, CatalogCard
+from app.services.card_services.gacha_tables import AliasTable, RARITY_WEIGHTS
+
+
+# 订单中每张卡牌的收益（比特, 经验），稀有度越高收益越高
+ORDER_CARD_REWARDS: Dict[int, Tuple[int, int]] = {
+    CardRarity.COMMON: (10, 2),
+    CardRarity.RARE: (40, 8),
+    CardRarity.EPIC: (160, 30),
+    CardRarity.LEGENDARY: (640, 120),
+}
+ORDER_BUSINESS_BONUS = 3
+
+
+@dataclass(frozen=True, slots=True)
+class OrderPlan:
+    """一个待写入的订单，require_card 的键为卡牌id字符串（JSON 对象的键只能是字符串）"""
+    require_card: Dict[str, int]
+    byte: int
+    exp: int
+
+
+def build_order_table(catalog: CardCatalog, business: Optional[str], level: int) -> Optional[AliasTable[CatalogCard]]:
+    """
+    构建指定餐馆主营业务和等级下的订单卡牌别名表
+
+    :param catalog: 卡牌目录
+    :param business: 餐馆主营业务（与卡包同名），没有餐馆时为None
+    :param level: 玩家等级
+
+    :return: 没有可用卡牌时返回None
+    """
+    cards: List[CatalogCard] = []
+    weights: List[float] = []
+    for card in catalog:
+        if card.unlock_level > level or card.rarity not in RARITY_WEIGHTS:
+            continue
+        if card.package != Package.BASE and card.package != business:
+            continue
+        weight = float(RARITY_WEIGHTS[card.rarity])
+        if business is not None and card.package == business:
+            weight *= ORDER_BUSINESS_BONUS
+        cards.append(card)
+        weights.append(weight)
+
+    if not cards:
+        return None
+    return AliasTable(cards, weights)
+
+
+class OrderTables:
+    """
+    订单卡牌别名表缓存，键为 (餐馆主营业务, 有效等级)，卡牌目录版本变化时整体失效
+    """
+    def __init__(self) -> None:
+        self._version = -1
+        self._tables: Dict[Tuple[Optional[str], int], Optional[AliasTable[CatalogCard]]] = {}
+
+    def get(self, catalog: CardCatalog, business: Optional[str], level: int) -> Optional[AliasTable[CatalogCard]]:
+        if catalog.version != self._version:
+            self._tables = {}
+            self._version = catalog.version
+
+        key = (business, catalog.effective_level(level))
+        if key not in self._tables:
+            self._tables[key] = build_order_table(catalog, *key)
+        return self._tables[key]
+
+
+order_tables = OrderTables()
+
+
+def plan_daily_orders(
+    catalog: CardCatalog,
+    level: int,
+    business: Optional[str] = None,
+    count: int = extra_params.DAILY_ORDER_COUNT,
+    rng: Optional[random.Random] = None,
+) -> List[OrderPlan]:
+    """
+    为一名玩家生成当日订单，不访问数据库
+
+    每个订单需要 1~ORDER_MAX_KINDS 种卡牌，每种卡牌的数量上限随玩家等级增长
+
+    :param catalog: 卡牌目录
+    :param level: 玩家等级
+    :param business: 餐馆主营业务，没有餐馆时为None
+    :param count: 订单数量
+    :param rng: 随机数生成器，测试和压测时可传入固定种子的 random.Random
+
+    :return: 订单列表，没有可用卡牌时返回空列表
+    """
+    table = order_tables.get(catalog, business, level)
+    if table is None:
+        return []
+    max_kinds = min(extra_params.ORDER_MAX_KINDS, len(table))
+    max_number = 1 + level // 10
+
+    # 一次采样所有订单需要的卡牌，再按每个订单的种类数切分
+    rand = (rng or random).random
+    kinds = [int(rand() * max_kinds) + 1 for _ in range(count)]
+    cards = table.sample(sum(kinds), rng)
+
+    plans = []
+    offset = 0
+    for order_kinds in kinds:
+        require_card: Dict[str, int] = {}
+        byte = exp = 0
+        # 重复采样到同一张卡牌时合并数量，种类可能少于 order_kinds
+        for card in cards[offset:offset + order_kinds]:
+            number = int(rand() * max_number) + 1
+            card_key = str(card.id)
+            require_card[card_key] = require_card.get(card_key, 0) + number
+            card_byte, card_exp = ORDER_CARD_REWARDS[card.rarity]
+            byte += card_byte * number
+            exp += card_exp * number
+        offset += order_kinds
+        plans.append(OrderPlan(require_card=require_card, byte=byte, exp=exp))
+    return plans
@@ -0,0 +1,160 @@
+"""
+玩家比特余额的批量写入原语与比特流水
+
+所有比特变动都通过 apply_byte_deltas 完成：一条条件 UPDATE 在数据库中完成加减和余额校验，
+并在同一事务中批量写入流水，不再先加锁读取玩家行、在内存中修改后整行保存
+"""
+from typing import Dict, List, Mapping, Optional
+from tortoise.functions import Sum
+from tortoise.transactions import in_transaction
+from app.core.extra_params import extra_params
+from app.db.models import User, ByteLedger
+from app.db.model_dependencies import ByteLedgerReason
+from app.db.sql_dialect import model_connection
+from log.log_config.service_logger import info_logger, err_logger
+
+
+async def apply_byte_deltas(
+    deltas: Mapping[int, int],
+    reason: ByteLedgerReason,
+    ref_id: Optional[int] = None,
+) -> bool:
+    """
+    用一条 UPDATE ... CASE 批量增减多名玩家的比特，只有变动后余额不小于0的玩家会被修改，
+    成功后批量写入每名玩家的流水。返回 False 时部分玩家可能已被修改，调用方必须在事务中调用并通过抛出异常回滚。
+
+    一次转账（买家扣除、卖家增加）在同一条语句中按主键顺序加锁，并发的互相交易不会交叉等待对方的玩家行
+
+    :param deltas: {玩家id: 比特变动量}，支出为负，变动量为0的条目被忽略
+    :param reason: 变动原因
+    :param ref_id: 关联的业务id，见 ByteLedger.ref_id
+
+    :return: 所有玩家的余额都足够、全部修改成功返回 True
+    """
+    # 按玩家id排序，保证并发写入时的加锁顺序一致
+    rows = [
+        (user_id, delta)
+        for user_id, delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return True
+
+    connection, dialect = model_connection(User)
+    placeholder = dialect.placeholder
+    byte, id_column = dialect.quote('byte'), dialect.quote('id')
+    case_expression = f'CASE {id_column} ' + ' '.join(
+        [f'WHEN {placeholder} THEN {placeholder}'] * len(rows)
+    ) + ' END'
+    sql = (
+        f'UPDATE {dialect.quote(User._meta.db_table)} SET {byte} = {byte} + {case_expression} '
+        f'WHERE {id_column} IN ({dialect.placeholders(len(rows))}) AND {byte} + {case_expression} >= 0'
+    )
+    case_values = [value for row in rows for value in row]
+    values = case_values + [user_id for user_id, _ in rows] + case_values
+
+    affected_rows, _ = await connection.execute_query(sql, values)
+    if affected_rows != len(rows):
+        return False
+
+    await ByteLedger.bulk_create([
+        ByteLedger(user_id=user_id, delta=delta, reason=reason, ref_id=ref_id)
+        for user_id, delta in rows
+    ])
+    return True
+
+
+async def ledger_totals(user_ids: List[int]) -> Dict[int, int]:
+    """一次查询取得玩家的流水之和，没有流水的玩家不返回"""
+    return {
+        row['user_id']: int(row['total'])
+        for row in await ByteLedger.filter(
+            user_id__in=user_ids,
+        ).annotate(total=Sum('delta')).group_by('user_id').values('user_id', 'total')
+    }
+
+
+async def open_byte_ledgers(user_ids: List[int]) -> int:
+    """
+    为还没有期初流水的玩家（启用流水之前注册的玩家和新注册的玩家）补记期初流水，金额为余额与已有流水之差。
+
+    先按主键顺序锁定玩家行再读取流水，期间该玩家的比特变动和其他进程的补记都会等待，补记不会重复
+
+    :param user_ids: 玩家id
+
+    :return: 补记的期初流水数量
+    """
+    async with in_transaction():
+        users = await User.filter(id__in=user_ids).order_by('id').select_for_update().values('id', 'byte')
+        opened = set(await ByteLedger.filter(
+            user_id__in=user_ids,
+            reason=ByteLedgerReason.OPENING,
+        ).values_list('user_id', flat=True))
+        totals = await ledger_totals(user_ids)
+        openings = [
+            ByteLedger(
+                user_id=user['id'],
+                delta=user['byte'] - totals.get(user['id'], 0),
+                reason=ByteLedgerReason.OPENING,
+            )
+            for user in users
+            if user['id'] not in opened
+        ]
+        if openings:
+            await ByteLedger.bulk_create(openings)
+    return len(openings)
+
+
+async def reconcile_byte_ledger(
+    batch_size: int = extra_params.LEDGER_RECONCILE_BATCH_SIZE,
+) -> int:
+    """
+    按玩家id分批核对比特余额与流水之和，不一致时记录错误日志
+
+    每批的余额和流水在一个事务中读取（MySQL 可重复读下为同一快照），不加锁、不阻塞交易；
+    还没有期初流水的玩家由 open_byte_ledgers 补记后在下一轮核对
+
+    :param batch_size: 每批核对的玩家数量
+
+    :return: 余额与流水不一致的玩家数量
+    """
+    mismatched = 0
+    after_id = 0
+    while True:
+        async with in_transaction():
+            # 1.按主键游标读取一批玩家的余额
+            users = await User.filter(id__gt=after_id).order_by('id').limit(batch_size).values('id', 'byte')
+            if not users:
+                break
+            after_id = users[-1]['id']
+            user_ids = [user['id'] for user in users]
+
+            # 2.一次查询取得这批玩家的流水之和，以及已经有期初流水的玩家
+            totals = await ledger_totals(user_ids)
+            opened = set(await ByteLedger.filter(
+                user_id__in=user_ids,
+                reason=ByteLedgerReason.OPENING,
+            ).values_list('user_id', flat=True))
+
+        # 3.核对已有期初流水的玩家，其余玩家补记期初流水
+        unopened = []
+        for user in users:
+            if user['id'] not in opened:
+                unopened.append(user['id'])
+            elif totals.get(user['id'], 0) != user['byte']:
+                mismatched += 1
+                err_logger.error(
+                    f'byte ledger mismatch | params: user_id={user["id"]}; byte={user["byte"]}; ledger={totals.get(user["id"], 0)}'
+                )
+        if unopened:
+            await open_byte_ledgers(unopened)
+
+        if len(users) < batch_size:
+            break
+    return mismatched
+
+
+async def reconcile_byte_ledger_job() -> None:
+    """比特流水对账周期任务"""
+    mismatched = await reconcile_byte_ledger()
+    info_logger.info(f'reconciled byte ledger | params: mismatched={mismatched}')
@@ -1,13 +1,15 @@
-import random
 from typing import List, Dict, Optional
-from collections import defaultdict
+from collections import Counter
 from tortoise.queryset import Q
-from tortoise.transactions import atomic
-from tortoise.exceptions import DoesNotExist
+from tortoise.transactions import atomic, in_transaction
 from app.core.exceptions import UnAtomicError
-from app.db.models import User, Card, UserCard
-from app.db.model_dependencies import Package
-from app.schemas.card_schemas import UserCardParams, PullCardParams
+from app.db.models import User, UserCard
+from app.db.model_dependencies import Package, ByteLedgerReason
+from app.schemas.card_schemas import UserCardParams, PullCardParams, CraftOperationParams, CraftResultParams
+from app.services.card_services.card_catalog import card_catalog
+from app.services.card_services.gacha_tables import gacha_tables
+from app.services.user_services.user_inventory_services import grant_cards, consume_cards
+from app.services.user_services.user_balance_services import apply_byte_deltas
 
 
 async def get_box_service(
@@ -26,31 +28,25 @@ async def get_box_service(
     
     :return: 符合条件的持有卡牌列表
     """
-    query = Q(user_id=user_id)
+    catalog = await card_catalog.get()
+    query = Q(user_id=user_id, number__gt=0)
     
-    if name_in is not None:
-        query &= Q(card__name__icontains=name_in)
-    if rarity is not None:
-        query &= Q(card__rarity=rarity)
-    if package is not None:
-        query &= Q(card__package=package)
+    # 卡牌条件在目录中解析为卡牌id集合，避免联表模糊查询
+    if name_in is not None or rarity is not None or package is not None:
+        card_ids = [
+            card.id
+            for card in catalog.filter(name_in=name_in, rarity=rarity, package=package)
+        ]
+        if not card_ids:
+            return []
+        query &= Q(card_id__in=card_ids)
         
-    card_items = await UserCard.filter(query).select_related('card').all()
-    
-    if not card_items:
-        return []
+    card_items = await UserCard.filter(query).values('card_id', 'number')
     
     cards = [
-        UserCardParams(
-            card_id=user_card.card.id,
-            name=user_card.card.name,
-            image=user_card.card.image,
-            rarity=user_card.card.rarity,
-            package=user_card.card.package,
-            description=user_card.card.description,
-            number=user_card.number,
-        )
+        catalog[user_card['card_id']].to_user_card_params(user_card['number'])
         for user_card in card_items
+        if user_card['card_id'] in catalog
     ]
     return cards
 
@@ -68,175 +64,93 @@ async def pull_card_service(
     
     :return: 抽卡是否成功，成功则返回抽到的卡牌列表，失败则返回失败信息
     """
-    def generate_random_number(n: int) -> List[int]:
-        """
-        生成n个随机数：75% 的概率返回 1, 20% 的概率返回 2, 4% 的概率返回 3, 1% 的概率返回 4
-        """
-        numbers = [1, 2, 3, 4]
-        weights = [75, 20, 4, 1]
-
-        result = random.choices(numbers, weights=weights, k=n)
-        
-        return result
-    
     # 1.确认扩展包名存在
     try:
         package = Package(card_to_pull.package)
     except ValueError:
         raise UnAtomicError(message='package not found')
     
-    # 2.确认玩家比特充足并扣除相应比特
-    need_byte = card_to_pull.times * 10
-    user = await User.filter(id=user_id).select_for_update().first()
-    if user.byte < need_byte:
-        raise UnAtomicError(message='byte not enough')
-    
-    user.byte -= need_byte
-    await user.save()
-    
-    # 3.随机生成抽到的稀有度
-    rarity_list = generate_random_number(card_to_pull.times)
-    rarity_set = set(rarity_list)
-    
-    # 4.查询所有符合稀有度的卡牌，并按照稀有度分组
-    all_available_card = await Card.filter(
-        package=package,
-        rarity__in=rarity_set,
-        unlock_level__gte=user.level
-    ).all()
-    cards_by_rarity: Dict[int, List[Card]] = defaultdict(list)
-    for card in all_available_card:
-        cards_by_rarity[card.rarity].append(card)
+    # 2.取出该卡包在玩家等级下预先构建的抽卡别名表
+    user = await User.get(id=user_id).values('level')
+    catalog = await card_catalog.get()
+    gacha_table = gacha_tables.get(catalog, package, user['level'])
+    if gacha_table is None:
+        raise UnAtomicError(message='package not found')
     
-    # 5.遍历稀有度列表，为每次抽卡随机选择对应稀有度的卡牌，并记录每张卡牌抽到的次数
+    # 3.一次性完成所有抽卡，并记录每张卡牌抽到的次数
     drawn_cards: Dict[int, UserCardParams] = {}
+    for card_id, number in Counter(card.id for card in gacha_table.sample(card_to_pull.times)).items():
+        drawn_cards[card_id] = catalog[card_id].to_user_card_params(number)
     
-    for rarity in rarity_list:
-        available_cards = cards_by_rarity.get(rarity)
-        selected_card: Card = random.choice(available_cards)
-        if selected_card.id in drawn_cards:
-            drawn_cards[selected_card.id].number += 1
-        else:
-            user_card = UserCardParams(
-                card_id=selected_card.id,
-                name=selected_card.name,
-                image=selected_card.image,
-                rarity=selected_card.rarity,
-                package=selected_card.package,
-                description=selected_card.description,
-                number=1
-            )
-            drawn_cards[selected_card.id] = user_card
-    
-    # 6.根据本次抽到的卡牌id，查询用户已有的卡牌方便后续更新操作
-    existing_user_cards = await UserCard.filter(
+    # 4.批量写入抽到的卡牌（不存在则创建，存在则增加持有数量），
+    #   先于扣除比特执行，与其他事务保持 玩家卡牌 -> 玩家 的加锁顺序
+    await grant_cards(
         user_id=user_id,
-        card_id__in=list(drawn_cards.keys())
-    ).select_for_update().select_related('card').all()
-    if existing_user_cards:
-        existing_card_dict = {uc.card.id: uc for uc in existing_user_cards}
-    else:
-        existing_card_dict = {}
-    
-    # 7.区分需要更新和创建的卡牌
-    to_update = []
-    to_create = []
-    for card_id, drawn_card in drawn_cards.items():
-        if card_id in existing_card_dict:
-            # 如果已存在，则更新数量
-            existing_card = existing_card_dict[card_id]
-            existing_card.number += drawn_card.number
-            to_update.append(existing_card)
-        else:
-            # 如果不存在，则准备创建新记录
-            to_create.append(UserCard(
-                user_id=user_id,
-                card_id=card_id,
-                number=drawn_card.number,
-            ))
+        deltas={card_id: drawn_card.number for card_id, drawn_card in drawn_cards.items()}
+    )
     
-    # 8.执行数据库更新操作
-    if to_update:
-        await UserCard.bulk_update(to_update, fields=['number'])
-    if to_create:
-        await UserCard.bulk_create(to_create)
+    # 5.用一条条件更新扣除相应比特并记录流水，比特不足时抛出异常回滚已写入的卡牌
+    need_byte = card_to_pull.times * 10
+    if not await apply_byte_deltas({user_id: -need_byte}, reason=ByteLedgerReason.PULL_CARD):
+        raise UnAtomicError(message='byte not enough')
 
     return list(drawn_cards.values())
 
 
-@atomic()
 async def compose_card_service(
     user_id: int,
     card_to_compose: UserCardParams,
 ) -> None:
     """
-    合成卡牌（修正版）
+    合成卡牌，材料的校验和扣减由一条条件更新完成，语句数量与配方材料数量无关
+    
+    :param user_id: 发起请求的用户id
+    :param card_to_compose: 目标合成的卡牌
+    
+    :return: 合成成功返回None
     """
-    user = await User.get(id=user_id)
     # 1.检查目标卡牌是否存在且可合成
-    try:
-        card = await Card.get(id=card_to_compose.card_id)
-    except DoesNotExist:
+    catalog = await card_catalog.get()
+    card = catalog.get(card_to_compose.card_id)
+    if card is None:
         raise UnAtomicError(message='card not found')
-
     if not card.compose_materials:
         raise UnAtomicError(message='not allow compose')
-    elif card.unlock_level > user.level:
-        raise UnAtomicError(message='level not enough', extra={'unlock_level': card.unlock_level})
+    
+    user = await User.get(id=user_id).values('level')
+    if card.unlock_level > user['level']:
+        raise UnAtomicError(message='level not enough', unlock_level=card.unlock_level)
 
     required_materials = {
-        int(card_id): num * card_to_compose.number
+        card_id: num * card_to_compose.number
         for card_id, num in card.compose_materials.items()
     }
-    required_card_ids = set(required_materials.keys())
 
-    # 2.加行锁查询用户所有相关材料卡
-    user_materials_map = {
-        uc.card.id: uc
-        for uc in await UserCard.filter(
-            user_id=user_id,
-            card_id__in=required_card_ids
-        ).select_for_update()
-    }
-
-    # 3.检查用户材料是否充足
-    lack_materials = []
-    for card_id, need_num in required_materials.items():
-        user_card = user_materials_map.get(card_id)
-        if not user_card:
-            # 用户完全没有该材料卡
-            lack_materials.append(UserCardParams(
-                card_id=card_id,
-                number=need_num,
-                # 可通过Card表补充其他字段
-                **await Card.get(id=card_id).values("name", "image", "rarity", "package", "description")
-            ))
-        elif user_card.number < need_num:
-            # 用户有该卡但数量不足
-            lack_materials.append(UserCardParams(
-                card_id=card_id,
-                number=need_num - user_card.number,
-                **await Card.get(id=card_id).values("name", "image", "rarity", "package", "description")
-            ))
-
-    if lack_materials:
+    # 2.在事务中扣减材料并添加目标卡牌，任一材料不足时整体回滚
+    try:
+        async with in_transaction():
+            if not await consume_cards(user_id=user_id, deltas=required_materials):
+                raise UnAtomicError(message='materials not enough')
+            await grant_cards(user_id=user_id, deltas={card_to_compose.card_id: card_to_compose.number})
+    
+    except UnAtomicError as e:
+        if e.message != 'materials not enough':
+            raise
+        # 3.回滚后查询材料持有量，从卡牌目录补充缺少的材料信息
+        owned = {
+            user_card['card_id']: user_card['number']
+            for user_card in await UserCard.filter(
+                user_id=user_id,
+                card_id__in=list(required_materials.keys())
+            ).values('card_id', 'number')
+        }
+        lack_materials = [
+            catalog[card_id].to_user_card_params(need_num - owned.get(card_id, 0))
+            for card_id, need_num in required_materials.items()
+            if owned.get(card_id, 0) < need_num and card_id in catalog
+        ]
         raise UnAtomicError(message='materials not enough', lack_materials=lack_materials)
 
-    # 4.扣减材料
-    for card_id, need_num in required_materials.items():
-        user_card = user_materials_map[card_id]
-        user_card.number -= need_num
-        await user_card.save()
-
-    # 5.添加目标卡牌
-    user_compose_card, created = await UserCard.get_or_create(
-        user_id=user_id,
-        card_id=card_to_compose.card_id,
-        defaults={"number": 0}
-    )
-    user_compose_card.number += card_to_compose.number
-    await user_compose_card.save()
-
     return None
 
 
@@ -255,65 +169,151 @@ async def decompose_card_service(
     """
     # 1.确认玩家持有目标分解的卡牌
     user_card = await UserCard.filter(
+        user_id=user_id,
         card_id=card_to_decompose.card_id
-    ).select_for_update().select_related('card').first()
+    ).select_for_update().first()
     if not user_card:
         raise UnAtomicError(message='card not found')
     elif user_card.number < card_to_decompose.number:
         raise UnAtomicError(message='card not found')
     
     # 2.确认目标分解卡牌可分解
-    if not user_card.card.decompose_materials:
+    catalog = await card_catalog.get()
+    card = catalog.get(card_to_decompose.card_id)
+    if card is None or not card.decompose_materials:
         raise UnAtomicError(message='not allow decompose')
     
     # 3.扣减指定数量的目标分解卡牌，若扣减后数量为0则删除该条目
     user_card.number -= card_to_decompose.number
-    if card_to_decompose.number == 0:
+    if user_card.number == 0:
         await user_card.delete()
     else:
         await user_card.save()
         
     # 4.为玩家增加分解后获得的卡牌
-    existing_user_cards = await UserCard.filter(
-        user_id=user_id,
-        card_id__in=list(user_card.card.decompose_materials.keys())
-    ).select_for_update().select_related('card').all()
-    existing_card_dict = {uc.card.id: uc for uc in existing_user_cards}
-    
-    to_update = []
-    to_create = []
-    for card_id, number in user_card.card.decompose_materials.items():
-        if card_id in existing_card_dict:
-            # 如果已存在，则更新数量
-            existing_card = existing_card_dict[card_id]
-            existing_card.number += number
-            to_update.append(existing_card)
-        else:
-            # 如果不存在，则准备创建新记录
-            to_create.append(UserCard(
-                user_id=user_id,
-                card_id=card_id,
-                number=number,
-            ))
-    
-    if to_update:
-        await UserCard.bulk_update(to_update, fields=['number'])
-    if to_create:
-        await UserCard.bulk_create(to_create)
+    decompose_products = {
+        product_id: number * card_to_decompose.number
+        for product_id, number in card.decompose_materials.items()
+    }
+    await grant_cards(user_id=user_id, deltas=decompose_products)
         
     # 5.返回分解获得的卡牌
-    decompose_materials_cards = await Card.filter(
-        card_id__in=list(user_card.card.decompose_materials.keys())
-    )
     return [
-        UserCardParams(
-            card_id=card.id,
-            name=card.name,
-            image=card.image,
-            rarity=card.rarity,
-            package=card.package,
-            description=card.description,
-            number=user_card.card.decompose_materials[card.id]
-        )
-        for card in decompose_materials_cards
+        catalog[product_id].to_user_card_params(number)
+        for product_id, number in decompose_products.items()
+        if product_id in catalog
     ]
+
+
+@atomic()
+async def batch_craft_service(
+    user_id: int,
+    operations: List[CraftOperationParams],
+) -> List[CraftResultParams]:
+    """
+    在一个事务中批量合成/分解卡牌：一次加锁读取相关库存，按顺序模拟每个操作得到库存净变化，再一次写入。
+    每个操作独立成功或失败，失败的操作不影响库存，后续操作可以使用前面操作得到的卡牌。
+    
+    :param user_id: 发起请求的用户id
+    :param operations: 合成/分解操作列表
+    
+    :return: 与操作一一对应的结果
+    """
+    # 1.确认所有涉及的卡牌（目标卡牌、合成材料、分解产物）
+    catalog = await card_catalog.get()
+    user = await User.get(id=user_id).values('level')
+    involved_card_ids = set()
+    for operation in operations:
+        involved_card_ids.add(operation.card_id)
+        card = catalog.get(operation.card_id)
+        if card is not None:
+            involved_card_ids.update(card.compose_materials.keys())
+            involved_card_ids.update(card.decompose_materials.keys())
+    
+    # 2.一次加锁读取相关库存
+    original = {
+        user_card['card_id']: user_card['number']
+        for user_card in await UserCard.filter(
+            user_id=user_id,
+            card_id__in=list(involved_card_ids)
+        ).select_for_update().values('card_id', 'number')
+    }
+    inventory = dict(original)
+    
+    # 3.按顺序在内存中模拟每个操作
+    results: List[CraftResultParams] = []
+    for index, operation in enumerate(operations):
+        result = CraftResultParams(
+            index=index,
+            action=operation.action,
+            card_id=operation.card_id,
+            number=operation.number,
+            success=False,
+        )
+        results.append(result)
+        card = catalog.get(operation.card_id)
+        
+        if operation.action == 'compose':
+            if card is None:
+                result.message = 'card not found'
+                continue
+            if not card.compose_materials:
+                result.message = 'not allow compose'
+                continue
+            if card.unlock_level > user['level']:
+                result.message = 'level not enough'
+                continue
+            required_materials = {
+                material_id: num * operation.number
+                for material_id, num in card.compose_materials.items()
+            }
+            # 配方中有卡牌目录里不存在的材料时无法合成
+            if any(material_id not in catalog for material_id in required_materials):
+                result.message = 'card not found'
+                continue
+            lack_materials = [
+                catalog[material_id].to_user_card_params(need_num - inventory.get(material_id, 0))
+                for material_id, need_num in required_materials.items()
+                if inventory.get(material_id, 0) < need_num and material_id in catalog
+            ]
+            if lack_materials:
+                result.message = 'materials not enough'
+                result.cards = lack_materials
+                continue
+            for material_id, need_num in required_materials.items():
+                inventory[material_id] -= need_num
+            inventory[card.id] = inventory.get(card.id, 0) + operation.number
+        
+        else:
+            if inventory.get(operation.card_id, 0) < operation.number:
+                result.message = 'card not found'
+                continue
+            if card is None or not card.decompose_materials:
+                result.message = 'not allow decompose'
+                continue
+            inventory[card.id] -= operation.number
+            decompose_products = {
+                product_id: num * operation.number
+                for product_id, num in card.decompose_materials.items()
+            }
+            for product_id, num in decompose_products.items():
+                inventory[product_id] = inventory.get(product_id, 0) + num
+            result.cards = [
+                catalog[product_id].to_user_card_params(num)
+                for product_id, num in decompose_products.items()
+                if product_id in catalog
+            ]
+        
+        result.success = True
+        result.message = f'{operation.action} card success'
+    
+    # 4.一次写入库存净变化（扣减的条目均已加锁且校验过数量）
+    await grant_cards(
+        user_id=user_id,
+        deltas={
+            card_id: number - original.get(card_id, 0)
+            for card_id, number in inventory.items()
+        }
+    )
+    
+    return results
@@ -0,0 +1,79 @@
+"""
+玩家卡牌库存的批量写入原语
+"""
+from typing import Mapping
+from app.db.models import UserCard
+from app.db.sql_dialect import model_connection
+
+
+async def grant_cards(
+    user_id: int,
+    deltas: Mapping[int, int],
+) -> None:
+    """
+    用一条 INSERT ... ON DUPLICATE KEY UPDATE 批量增加玩家持有的卡牌，不存在的条目直接创建，
+    省去先加锁查询再逐条更新/创建的往返。在事务中调用时使用当前事务的连接。
+
+    负数增量只能用于调用方已加锁并校验过数量的条目（否则可能扣成负数或插入负数条目）
+
+    :param user_id: 玩家id
+    :param deltas: {卡牌id: 增量}，增量为0的条目被忽略
+
+    :return: None
+    """
+    # 按卡牌id排序，保证并发写入时对唯一索引 (user_id, card_id) 的加锁顺序一致
+    rows = [
+        (user_id, card_id, delta)
+        for card_id, delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return None
+
+    connection, dialect = model_connection(UserCard)
+    sql = (
+        dialect.insert(UserCard._meta.db_table, ('user_id', 'card_id', 'number'), len(rows)) + ' '
+        + dialect.upsert(('user_id', 'card_id'), {'number': dialect.increment('number')})
+    )
+
+    await connection.execute_query(sql, [value for row in rows for value in row])
+    return None
+
+
+async def consume_cards(
+    user_id: int,
+    deltas: Mapping[int, int],
+) -> bool:
+    """
+    用一条条件 UPDATE 批量扣减玩家持有的卡牌，只有数量充足（number >= 扣减量）的条目会被扣减。
+    返回 False 时部分条目可能已被扣减，调用方必须在事务中调用并通过抛出异常回滚。
+
+    :param user_id: 玩家id
+    :param deltas: {卡牌id: 扣减量}，扣减量为0的条目被忽略
+
+    :return: 所有条目均扣减成功返回 True
+    """
+    rows = [
+        (card_id, delta)
+        for card_id, delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return True
+
+    connection, dialect = model_connection(UserCard)
+    placeholder = dialect.placeholder
+    number, card_id_column = dialect.quote('number'), dialect.quote('card_id')
+    case_expression = f'CASE {card_id_column} ' + ' '.join(
+        [f'WHEN {placeholder} THEN {placeholder}'] * len(rows)
+    ) + ' END'
+    sql = (
+        f'UPDATE {dialect.quote(UserCard._meta.db_table)} SET {number} = {number} - {case_expression} '
+        f'WHERE {dialect.quote("user_id")} = {placeholder} AND {card_id_column} IN ({dialect.placeholders(len(rows))}) '
+        f'AND {number} >= {case_expression}'
+    )
+    case_values = [value for row in rows for value in row]
+    values = case_values + [user_id] + [card_id for card_id, _ in rows] + case_values
+
+    affected_rows, _ = await connection.execute_query(sql, values)
+    return affected_rows == len(rows)
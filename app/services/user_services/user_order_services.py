@@ -1,80 +1,210 @@
-from datetime import datetime, UTC
-from typing import List, Dict
-from tortoise.transactions import atomic
+from datetime import datetime, timedelta
+from typing import List, Dict, Tuple
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
 from app.core.exceptions import UnAtomicError
-from app.db.models import User, Card, UserCard, Order
-from app.db.model_dependencies import OrderStatus
+from app.core.extra_params import extra_params
+from app.db.models import User, UserCard, Order, Restaurant
+from app.db.model_dependencies import OrderStatus, ByteLedgerReason
 from app.schemas.base_schemas import OrderParams
-from app.schemas.card_schemas import UserCardParams
+from app.services.card_services.card_catalog import card_catalog
+from app.services.user_services.order_generator import OrderPlan, plan_daily_orders
+from app.services.user_services.user_inventory_services import consume_cards
+from app.services.user_services.user_balance_services import apply_byte_deltas
+from log.log_config.service_logger import info_logger
 
 
 async def get_orders_service(
     user_id: int
 ) -> List[OrderParams]:
     """
-    查看待完成的订单，过期订单在此时删除
+    查看待完成且未过期的订单（过期订单由 expire_orders_job 定期批量标记为超时）
     
     :param user_id: 用户id
     
     :return:
     """
-    # 1.查看所有状态为等待完成的订单
+    # 1.查看所有状态为等待完成且未过期的订单，命中 (user, status, expires_at) 索引
     waiting_orders = await Order.filter(
         user_id=user_id,
-        status=OrderStatus.WAITING
-    ).select_for_update()
+        status=OrderStatus.WAITING,
+        expires_at__gt=timezone.now(),
+    ).order_by('expires_at').values('id', 'require_card', 'byte', 'exp', 'expires_at')
     if not waiting_orders:
         return []
     
-    # 2.将已超时的订单status改为2并保存
-    current_time = datetime.now(UTC)
-    timeout_orders = []
-    for order in waiting_orders:
-        if order.expires_at < current_time:
-            order.status = OrderStatus.TIMEOUT  # 假设OrderStatus.TIMEOUT对应值为2
-            timeout_orders.append(order)
-    if timeout_orders:
-        await Order.bulk_update(timeout_orders, fields=["status"])
-        
-    # 3.将其余订单组织为OrderParams返回
-    valid_orders = [order for order in waiting_orders if order.status == OrderStatus.WAITING]
+    # 2.将订单组织为OrderParams返回，订单JSON中的卡牌id存储后为字符串，统一转换为整数
+    catalog = await card_catalog.get()
     return [
         OrderParams(
-            order_id=order.id,
+            order_id=order['id'],
+            user_id=user_id,
+            require_card=[
+                catalog[int(card_id)].to_user_card_params(number)
+                for card_id, number in order['require_card'].items()
+                if int(card_id) in catalog
+            ],
+            byte=order['byte'],
+            exp=order['exp'],
+            expires_at=order['expires_at']
+        )
+        for order in waiting_orders
+    ]
+
+
+async def expire_orders(
+    batch_size: int = extra_params.ORDER_SWEEP_BATCH_SIZE,
+) -> int:
+    """
+    将已过期的待完成订单分批标记为超时，每批按 (status, expires_at) 索引取出主键后执行一条 UPDATE
+    
+    :param batch_size: 每批标记的订单数量
+    
+    :return: 标记为超时的订单数量
+    """
+    now = timezone.now()
+    expired = 0
+    while True:
+        order_ids = await Order.filter(
+            status=OrderStatus.WAITING,
+            expires_at__lte=now,
+        ).order_by('expires_at').limit(batch_size).values_list('id', flat=True)
+        if not order_ids:
+            break
+        # 再次限定状态，避免覆盖刚刚被完成或删除的订单
+        expired += await Order.filter(
+            id__in=list(order_ids),
+            status=OrderStatus.WAITING,
+        ).update(status=OrderStatus.TIMEOUT)
+        if len(order_ids) < batch_size:
+            break
+    return expired
+
+
+async def expire_orders_job() -> None:
+    """订单过期周期任务"""
+    expired = await expire_orders()
+    if expired:
+        info_logger.info(f'expired orders | params: number={expired}')
+
+
+def today_range() -> Tuple[datetime, datetime]:
+    """当日的开始时间和订单过期时间（次日零点）"""
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today, today + timedelta(days=1)
+
+
+def build_orders(
+    user_id: int,
+    plans: List[OrderPlan],
+    created_at: datetime,
+    expires_at: datetime,
+) -> List[Order]:
+    return [
+        Order(
             user_id=user_id,
-            require_card=order.require_card,
-            byte=order.byte,
-            exp=order.exp,
-            expires_at=order.expires_at
+            require_card=plan.require_card,
+            byte=plan.byte,
+            exp=plan.exp,
+            created_at=created_at,
+            expires_at=expires_at,
         )
-        for order in valid_orders
+        for plan in plans
     ]
 
 
-# async def generate_order_service(
-#     user_id: int,
-# ) -> List[OrderParams]:
-#     """
-#     如果今天没有生成过订单，生成24个新订单
-#
-#     :param user_id: 用户id
-#
-#     :return: 生成的新订单
-#     """
-#     # 1.查询今日是否创建过订单，如果已经创建过则返回空列表
-#     current_date = datetime.now(UTC).date()
-#     current_datetime = datetime(current_date.year, current_date.month, current_date.day)
-#     today_orders = await Order.filter(
-#         user_id=user_id,
-#         created_at__gte=current_datetime
-#     )
-#     if today_orders:
-#         return []
-#
-#     # 2.随机生成新的订单并写入数据库和返回
-
-
-@atomic()
+async def generate_order_service(
+    user_id: int,
+) -> List[OrderParams]:
+    """
+    如果今天没有生成过订单，生成当日的新订单
+    
+    :param user_id: 用户id
+    
+    :return: 生成的新订单，今天已经生成过订单时返回空列表
+    """
+    catalog = await card_catalog.get()
+    today, expires_at = today_range()
+    async with in_transaction():
+        # 1.锁定玩家，保证并发请求只生成一次；查询今日是否创建过订单
+        user = await User.filter(id=user_id).select_for_update().values('level')
+        if not user:
+            return []
+        if await Order.filter(user_id=user_id, created_at__gte=today).exists():
+            return []
+        
+        # 2.按玩家等级和餐馆主营业务生成订单，一次多行插入
+        business = await Restaurant.filter(user_id=user_id).first().values_list('main_business', flat=True)
+        plans = plan_daily_orders(
+            catalog=catalog,
+            level=user[0]['level'],
+            business=str(business) if business is not None else None,
+        )
+        await Order.bulk_create(build_orders(user_id, plans, timezone.now(), expires_at))
+    
+    return await get_orders_service(user_id=user_id)
+
+
+async def generate_daily_orders(
+    batch_size: int = extra_params.ORDER_GENERATION_BATCH_SIZE,
+) -> int:
+    """
+    为所有今天还没有订单的玩家生成当日订单，按玩家id分批：每批一次查询玩家等级、餐馆和已有订单，再分批多行插入。
+
+    每批在事务中按主键顺序锁定这批玩家后再确认今天是否生成过订单（与 generate_order_service 的加锁方式一致），
+    多个 worker 同时执行本任务、或与玩家当日第一次请求同时执行时，每名玩家只生成一次订单
+    
+    :param batch_size: 每批处理的玩家数量
+    
+    :return: 生成订单的玩家数量
+    """
+    catalog = await card_catalog.get()
+    today, expires_at = today_range()
+    generated = 0
+    after_id = 0
+    while True:
+        # 1.按主键游标读取一批玩家
+        user_ids = await User.filter(id__gt=after_id).order_by('id').limit(batch_size).values_list('id', flat=True)
+        if not user_ids:
+            break
+        after_id = user_ids[-1]
+        
+        async with in_transaction():
+            # 2.锁定这批玩家，一次查询取得玩家等级、餐馆主营业务和今天已经生成过订单的玩家
+            users = await User.filter(id__in=user_ids).order_by('id').select_for_update().values('id', 'level')
+            businesses = {
+                row['user_id']: str(row['main_business'])
+                for row in await Restaurant.filter(user_id__in=user_ids).values('user_id', 'main_business')
+            }
+            done = set(await Order.filter(
+                user_id__in=user_ids,
+                created_at__gte=today,
+            ).distinct().values_list('user_id', flat=True))
+            
+            # 3.在内存中生成订单后多行插入
+            now = timezone.now()
+            orders: List[Order] = []
+            for user in users:
+                if user['id'] in done:
+                    continue
+                plans = plan_daily_orders(catalog=catalog, level=user['level'], business=businesses.get(user['id']))
+                orders.extend(build_orders(user['id'], plans, now, expires_at))
+                generated += 1
+            if orders:
+                await Order.bulk_create(orders, batch_size=extra_params.ORDER_INSERT_BATCH_SIZE)
+        
+        if len(user_ids) < batch_size:
+            break
+    return generated
+
+
+async def generate_daily_orders_job() -> None:
+    """每日订单生成任务"""
+    generated = await generate_daily_orders()
+    info_logger.info(f'generated daily orders | params: users={generated}')
+
+
 async def complete_order_service(
     user_id: int,
     order_id: int,
@@ -82,82 +212,63 @@ async def complete_order_service(
     """
     完成订单、交付卡牌、获取经验和比特
     
+    事务内的加锁顺序固定为 订单 -> 玩家卡牌（按卡牌id） -> 玩家，卡牌和余额都由条件更新/表达式更新完成，
+    不读取完整的玩家行，并发完成订单时不会互相覆盖经验和比特；比特变动同时写入流水
+    
     :param user_id: 用户id
     :param order_id: 要交付的订单id
     
-    :return: 无法完成订单返回缺少的卡牌
+    :return: 订单收益，无法完成订单时抛出附带缺少卡牌的异常
     """
-    # 1.检查目标交付的订单存在
-    order_to_complete = await Order.filter(
-        id=order_id,
-        user_id=user_id,
-        status=OrderStatus.WAITING
-    ).select_for_update().first()
-    if not order_to_complete:
-        raise UnAtomicError(message='order not found')
-    
-    # 2.检查用户有足量卡牌可交付，没有则返回缺少的卡牌
-    # 提前准备需要的卡牌参数
-    cards = await Card.filter(
-        card_id__in=list(order_to_complete.require_card.keys())
-    ).all()
-    card_map = {
-        card.id: card
-        for card in cards
-    }
-    user_cards = await UserCard.filter(
-        user_id=user_id,
-        card_id__in=list(order_to_complete.require_card.keys())
-    ).select_for_update().select_related('card').all()
-    user_card_map = {
-        user_card.card.id: user_card
-        for user_card in user_cards
-    }
-    
-    lack_cards: List[UserCardParams] = []
-    to_order_cards: List[UserCard] = []
-    # 记录缺少的卡牌
-    for require_card_id, require_number in order_to_complete.require_card.items():
-        if require_card_id not in user_card_map:
-            lack_number = require_number
-        elif user_card_map[require_card_id].number < require_number:
-            lack_number = require_number - user_card_map[require_card_id].number
-        else:
-            lack_number = 0
-            to_order_card = user_card_map[require_card_id]
-            to_order_card.number -= require_number
-            to_order_cards.append(to_order_card)
+    try:
+        async with in_transaction():
+            # 1.锁定目标交付的订单，只读取需要的列
+            order = await Order.filter(
+                id=order_id,
+                user_id=user_id,
+                status=OrderStatus.WAITING,
+                expires_at__gt=timezone.now(),
+            ).select_for_update().values('require_card', 'byte', 'exp')
+            if not order:
+                raise UnAtomicError(message='order not found')
+            order = order[0]
             
-        if lack_number != 0:
-            lack_cards.append(UserCardParams(
-                    card_id=require_card_id,
-                    name=card_map[require_card_id].name,
-                    image=card_map[require_card_id].image,
-                    rarity=card_map[require_card_id].rarity,
-                    package=card_map[require_card_id].package,
-                    unlock_level=card_map[require_card_id].unlock_level,
-                    description=card_map[require_card_id].description,
-                    number=lack_number,
-                ))
-    if lack_cards:
-        raise UnAtomicError(message='lack cards', lack_cards=lack_cards)
-    
-    # 3.扣除用户交付的卡牌
-    await UserCard.bulk_update(to_order_cards, fields=['number'])
-    
-    # 4.修改订单状态为完成
-    order_to_complete.status = OrderStatus.CONFIRM
-    await order_to_complete.save()
+            # 2.用一条条件更新扣除交付的卡牌，任一卡牌不足时整体回滚
+            # 订单JSON中的卡牌id存储后为字符串，统一转换为整数
+            require_cards = {
+                int(card_id): number
+                for card_id, number in order['require_card'].items()
+            }
+            if not await consume_cards(user_id=user_id, deltas=require_cards):
+                raise UnAtomicError(message='lack cards')
+            
+            # 3.修改订单状态为完成，为用户增加经验和比特
+            await Order.filter(id=order_id).update(status=OrderStatus.CONFIRM)
+            await User.filter(id=user_id).update(exp=F('exp') + order['exp'])
+            await apply_byte_deltas({user_id: order['byte']}, reason=ByteLedgerReason.ORDER, ref_id=order_id)
     
-    # 5.为用户增加经验和比特
-    user = await User.get(id=user_id)
-    user.exp += order_to_complete.exp
-    user.byte += order_to_complete.byte
-    await user.save()
+    except UnAtomicError as e:
+        if e.message != 'lack cards':
+            raise
+        # 4.回滚后查询卡牌持有量，从卡牌目录补充缺少的卡牌信息
+        catalog = await card_catalog.get()
+        owned = {
+            user_card['card_id']: user_card['number']
+            for user_card in await UserCard.filter(
+                user_id=user_id,
+                card_id__in=list(require_cards.keys())
+            ).values('card_id', 'number')
+        }
+        lack_cards = [
+            catalog[card_id].to_user_card_params(need_num - owned.get(card_id, 0))
+            for card_id, need_num in require_cards.items()
+            if owned.get(card_id, 0) < need_num and card_id in catalog
+        ]
+        raise UnAtomicError(message='lack cards', lack_cards=lack_cards)
     
     return {
-        'exp': order_to_complete.exp,
-        'byte': order_to_complete.byte
+        'exp': order['exp'],
+        'byte': order['byte']
     }
     
 
@@ -24,7 +24,7 @@ async def create_user(
     :return: 注册是否成功，失败返回原因
     """
     uid = await generate_unique_uid(database='user')
-    hash_password = get_string_hash(password)
+    hash_password = await get_string_hash(password)
 
     try:
         await User.create(
@@ -1 +1,3 @@
 from .find_project_root import find_project_root
+from .keyset_cursor import encode_cursor, decode_cursor
+from .json_frames import encode_frame
@@ -0,0 +1,37 @@
+"""
+推送消息的 JSON 编码
+
+安装 orjson 时使用 orjson 编码（pip install .[orjson]），否则使用标准库 json；
+两者都将 datetime/date 编码为 ISO 8601 字符串，输出可直接作为 WebSocket 文本帧发送
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def encode_frame(message: Any) -> str:
+    """
+    将消息编码为 JSON 文本，广播时每条消息只编码一次，编码结果由所有接收者共享
+
+    :param message: 可 JSON 序列化的消息，可以包含 datetime
+
+    :return: 紧凑格式、不转义非 ASCII 字符的 JSON 文本
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(message, default=_default).decode()
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'), default=_default)
@@ -0,0 +1,33 @@
+import json
+import base64
+import binascii
+from typing import Any, Tuple
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    将上一页最后一行的排序键编码为不透明的分页游标
+    :param values: 排序键（须可被json序列化），如 (price, id)
+
+    :return: url安全的base64字符串
+    """
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, arity: int) -> Tuple[Any, ...]:
+    """
+    解码分页游标
+    :param cursor: encode_cursor 生成的游标
+    :param arity: 排序键的个数
+
+    :return: 排序键元组，游标无效时抛出ValueError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f'invalid cursor: {cursor}') from e
+    if not isinstance(values, list) or len(values) != arity:
+        raise ValueError(f'invalid cursor: {cursor}')
+    return tuple(values)
@@ -0,0 +1,98 @@
+import unicodedata
+from typing import Dict, Hashable, Iterable, Set, Tuple, TypeVar, Generic
+
+
+K = TypeVar('K', bound=Hashable)
+
+
+def normalize_text(text: str) -> str:
+    """
+    统一全角/半角、兼容字符和大小写，使搜索不区分这些差异
+    :param text: 原始文本
+
+    :return: 规范化后的文本
+    """
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def text_grams(text: str) -> Set[str]:
+    """
+    将规范化后的文本切分为单字和相邻二字组。
+    中文没有空格分词，名称又很短（不超过16个字符），按字符切分比按词切分召回更完整
+    :param text: 规范化后的文本
+
+    :return: 文本包含的所有单字和二字组
+    """
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class NgramIndex(Generic[K]):
+    """
+    进程内的名称子串索引，将 name_in（包含子串）查询解析为id集合，替代 LIKE '%x%' 全表扫描。
+
+    查询串长度为1时直接取单字倒排表，否则对查询串的所有二字组倒排表求交集得到候选，
+    再用子串匹配确认（二字组都命中不代表子串连续出现）
+    """
+    def __init__(self, items: Iterable[Tuple[K, str]] = ()):
+        self._texts: Dict[K, str] = {}
+        self._postings: Dict[str, Set[K]] = {}
+        for key, text in items:
+            self.add(key, text)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._texts
+
+    def add(self, key: K, text: str) -> None:
+        """写入或更新一条名称"""
+        self.remove(key)
+        normalized = normalize_text(text)
+        self._texts[key] = normalized
+        for gram in text_grams(normalized):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key: K) -> None:
+        """移除一条名称，不存在时忽略"""
+        normalized = self._texts.pop(key, None)
+        if normalized is None:
+            return
+        for gram in text_grams(normalized):
+            posting = self._postings[gram]
+            posting.discard(key)
+            if not posting:
+                del self._postings[gram]
+
+    def clear(self) -> None:
+        self._texts.clear()
+        self._postings.clear()
+
+    def search(self, query: str) -> Set[K]:
+        """
+        查询名称包含指定子串的所有id
+        :param query: 子串（不区分大小写和全角/半角）
+
+        :return: 匹配的id集合，查询串为空时返回全部id
+        """
+        needle = normalize_text(query)
+        if not needle:
+            return set(self._texts)
+        if len(needle) == 1:
+            return set(self._postings.get(needle, ()))
+
+        bigrams = sorted(
+            {needle[i:i + 2] for i in range(len(needle) - 1)},
+            key=lambda gram: len(self._postings.get(gram, ())),
+        )
+        candidates = set(self._postings.get(bigrams[0], ()))
+        for gram in bigrams[1:]:
+            if not candidates:
+                break
+            candidates &= self._postings.get(gram, set())
+
+        if len(bigrams) == 1:
+            return candidates
+        return {key for key in candidates if needle in self._texts[key]}
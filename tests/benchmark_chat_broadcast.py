@@ -0,0 +1,86 @@
+"""
+群聊广播编码压测
+
+    python -m tests.benchmark_chat_broadcast --messages 2000
+
+对比每条消息的 CPU 耗时：
+- per_recipient: 每个接收者各自编码一次（原先对每个连接调用 send_json 的方式）
+- encode_once: 每条消息编码一次，编码结果放入所有接收者的发送队列（broadcast_group_message 的方式）
+写协程的发送使用不做任何事的 WebSocket，只测量编码和入队的开销
+"""
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from app.services.group_services.chat_connection import ChatConnection, SlowConsumerPolicy
+from app.utils.json_frames import encode_frame, HAS_ORJSON
+
+
+RECIPIENTS = (10, 100, 300)
+
+
+class NullWebSocket:
+    async def send_text(self, frame: str) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def make_message(index: int) -> dict:
+    return {
+        'type': 'group_msg',
+        'group_uid': '100001',
+        'user_name': '萌新玩家',
+        'content': f'第{index}条消息：今天的订单需要两张桂花糕和一张绿豆糕，有人出吗？',
+        'message_type': 0,
+        'timestamp': datetime.now(),
+    }
+
+
+def make_connections(recipients: int, messages: int) -> list[ChatConnection]:
+    return [
+        ChatConnection(user_id=user_id, websocket=NullWebSocket(), queue_size=messages, policy=SlowConsumerPolicy.DROP_OLDEST)
+        for user_id in range(recipients)
+    ]
+
+
+async def run(recipients: int, messages: int) -> None:
+    payloads = [make_message(index) for index in range(messages)]
+
+    # 每个接收者各自编码（send_json 使用的编码参数，datetime 需要转换为字符串）
+    connections = make_connections(recipients, messages)
+    start = time.process_time()
+    for message in payloads:
+        for connection in connections:
+            connection.send(json.dumps(message, ensure_ascii=False, separators=(',', ':'), default=str))
+    per_recipient = time.process_time() - start
+
+    # 每条消息编码一次，所有接收者共享
+    connections = make_connections(recipients, messages)
+    start = time.process_time()
+    for message in payloads:
+        frame = encode_frame(message)
+        for connection in connections:
+            connection.send(frame)
+    encode_once = time.process_time() - start
+
+    print(
+        f'{recipients:>4} recipients: per_recipient {per_recipient / messages * 1e6:8.1f} us/msg, '
+        f'encode_once {encode_once / messages * 1e6:8.1f} us/msg ({per_recipient / encode_once:.1f}x)'
+    )
+
+
+async def main(messages: int) -> None:
+    print(f'encoder: {"orjson" if HAS_ORJSON else "json"}; messages: {messages}')
+    for recipients in RECIPIENTS:
+        await run(recipients, messages)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=2000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.messages))
@@ -0,0 +1,101 @@
+"""
+每日订单生成压测
+
+    python -m tests.benchmark_order_generation --users 100000
+    python -m tests.benchmark_order_generation --users 100000 --db
+
+默认只测量在内存中生成订单（plan_daily_orders）的吞吐量；
+--db 时在内存 SQLite 中创建玩家和卡牌，测量 generate_daily_orders 分批查询 + 多行插入的端到端吞吐量
+"""
+import time
+import random
+import asyncio
+import argparse
+from types import MappingProxyType
+from tortoise import Tortoise
+from app.db.model_dependencies import Package
+from app.services.card_services.card_catalog import CardCatalog, CatalogCard, card_catalog
+from app.services.user_services.order_generator import plan_daily_orders
+
+
+CARD_NUMBER = 200
+RARITIES = [1] * 120 + [2] * 50 + [3] * 20 + [4] * 10
+
+
+def synthetic_cards():
+    for card_id in range(1, CARD_NUMBER + 1):
+        yield CatalogCard(
+            id=card_id,
+            name=f'card{card_id}',
+            image='',
+            rarity=RARITIES[card_id - 1],
+            package=Package.BASE if card_id % 2 else Package.CHINESE_PASTRY,
+            unlock_level=1 + card_id % 20,
+            description='',
+            compose_materials=MappingProxyType({}),
+            decompose_materials=MappingProxyType({}),
+        )
+
+
+def benchmark_plan(users: int) -> None:
+    catalog = CardCatalog(synthetic_cards(), version=1)
+    rng = random.Random(0)
+    levels = [rng.randint(1, 60) for _ in range(users)]
+    businesses = [rng.choice([None, Package.CHINESE_PASTRY]) for _ in range(users)]
+
+    start = time.perf_counter()
+    orders = 0
+    for level, business in zip(levels, businesses):
+        orders += len(plan_daily_orders(catalog, level, business, rng=rng))
+    elapsed = time.perf_counter() - start
+    print(f'plan: {users} users, {orders} orders in {elapsed:.2f}s '
+          f'({users / elapsed:,.0f} users/s, {orders / elapsed:,.0f} orders/s)')
+
+
+async def benchmark_db(users: int) -> None:
+    from app.db.models import Card, User
+    from app.services.user_services.user_order_services import generate_daily_orders
+
+    await Tortoise.init(db_url='sqlite://:memory:', modules={'models': ['app.db.models']})
+    await Tortoise.generate_schemas()
+    await Card.bulk_create([
+        Card(
+            id=card.id,
+            name=card.name,
+            rarity=card.rarity,
+            package=card.package,
+            unlock_level=card.unlock_level,
+            description=card.description,
+            compose_materials={},
+            decompose_materials={},
+        )
+        for card in synthetic_cards()
+    ])
+    await card_catalog.refresh()
+    await User.bulk_create([
+        User(
+            uid=f'{user_id:06d}',
+            name=f'user{user_id}',
+            password='',
+            email=f'user{user_id}@example.com',
+            level=1 + user_id % 60,
+        )
+        for user_id in range(1, users + 1)
+    ], batch_size=5000)
+
+    start = time.perf_counter()
+    generated = await generate_daily_orders()
+    elapsed = time.perf_counter() - start
+    print(f'db: {generated} users in {elapsed:.2f}s ({generated / elapsed:,.0f} users/s)')
+    await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--db', action='store_true')
+    args = parser.parse_args()
+
+    benchmark_plan(args.users)
+    if args.db:
+        asyncio.run(benchmark_db(args.users))
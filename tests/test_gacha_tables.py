@@ -0,0 +1,135 @@
+"""
+抽卡概率表的分布测试：别名表还原的概率与权重一致，固定种子的采样频率通过卡方检验
+
+    python -m pytest tests/test_gacha_tables.py
+"""
+import math
+import random
+from collections import Counter
+from types import MappingProxyType
+from typing import Dict, List, Sequence
+import pytest
+
+pytest.importorskip('tortoise')
+
+from app.db.model_dependencies import CardRarity, Package
+from app.services.card_services.card_catalog import CardCatalog, CatalogCard
+from app.services.card_services.gacha_tables import AliasTable, RARITY_WEIGHTS, build_gacha_table
+
+
+SAMPLES = 200_000
+
+
+def chi_square(observed: Sequence[int], expected: Sequence[float]) -> float:
+    return sum((o - e) ** 2 / e for o, e in zip(observed, expected))
+
+
+def chi_square_critical(df: int, z: float = 3.09) -> float:
+    """卡方分布的上侧临界值（Wilson–Hilferty 近似），z=3.09 对应显著性水平 0.001"""
+    a = 2 / (9 * df)
+    return df * (1 - a + z * math.sqrt(a)) ** 3
+
+
+def make_card(card_id: int, rarity: int, package: str = Package.BASE, unlock_level: int = 1) -> CatalogCard:
+    return CatalogCard(
+        id=card_id,
+        name=f'card{card_id}',
+        image='',
+        rarity=rarity,
+        package=package,
+        unlock_level=unlock_level,
+        description='',
+        compose_materials=MappingProxyType({}),
+        decompose_materials=MappingProxyType({}),
+    )
+
+
+@pytest.mark.parametrize('weights', [
+    [1.0],
+    [1.0, 1.0, 1.0, 1.0],
+    [75, 20, 4, 1],
+    [random.Random(7).uniform(0.01, 10) for _ in range(50)],
+])
+def test_alias_probabilities_match_weights(weights: List[float]) -> None:
+    table = AliasTable(list(range(len(weights))), weights)
+    total = sum(weights)
+    for probability, weight in zip(table.probabilities(), weights):
+        assert probability == pytest.approx(weight / total, abs=1e-12)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_alias_sample_frequencies(seed: int) -> None:
+    weights = [random.Random(seed).uniform(0.5, 10) for _ in range(30)]
+    table = AliasTable(list(range(len(weights))), weights)
+
+    counts = Counter(table.sample(SAMPLES, random.Random(seed)))
+    observed = [counts[i] for i in range(len(weights))]
+    expected = [p * SAMPLES for p in table.probabilities()]
+    assert chi_square(observed, expected) < chi_square_critical(len(weights) - 1)
+
+
+def test_alias_rejects_invalid_weights() -> None:
+    with pytest.raises(ValueError):
+        AliasTable([], [])
+    with pytest.raises(ValueError):
+        AliasTable([1, 2], [1.0])
+    with pytest.raises(ValueError):
+        AliasTable([1, 2], [0.0, 0.0])
+
+
+def rarity_probabilities(table: AliasTable[CatalogCard]) -> Dict[int, float]:
+    result: Dict[int, float] = {}
+    for card, probability in zip(table.items, table.probabilities()):
+        result[card.rarity] = result.get(card.rarity, 0.0) + probability
+    return result
+
+
+def test_gacha_table_rarity_weights() -> None:
+    # 每种稀有度的卡牌数量不同，稀有度的总概率仍等于稀有度权重，同一稀有度内的卡牌等概率
+    cards = [make_card(i, CardRarity.COMMON) for i in range(1, 11)]
+    cards += [make_card(i, CardRarity.RARE) for i in range(11, 16)]
+    cards += [make_card(i, CardRarity.EPIC) for i in range(16, 18)]
+    cards += [make_card(18, CardRarity.LEGENDARY), make_card(19, CardRarity.SPECIAL)]
+    table = build_gacha_table(CardCatalog(cards, version=1), Package.BASE, level=1)
+    assert table is not None
+
+    total = sum(RARITY_WEIGHTS.values())
+    for rarity, probability in rarity_probabilities(table).items():
+        assert probability == pytest.approx(RARITY_WEIGHTS[rarity] / total, abs=1e-12)
+    assert CardRarity.SPECIAL not in {card.rarity for card in table.items}
+
+    probabilities = dict(zip((card.id for card in table.items), table.probabilities()))
+    assert probabilities[1] == pytest.approx(probabilities[10], abs=1e-12)
+    assert probabilities[11] == pytest.approx(probabilities[15], abs=1e-12)
+
+    # 按稀有度统计固定种子的采样频率
+    counts = Counter(card.rarity for card in table.sample(SAMPLES, random.Random(42)))
+    rarities = sorted(RARITY_WEIGHTS)
+    observed = [counts[rarity] for rarity in rarities]
+    expected = [RARITY_WEIGHTS[rarity] / total * SAMPLES for rarity in rarities]
+    assert chi_square(observed, expected) < chi_square_critical(len(rarities) - 1)
+
+
+def test_gacha_table_renormalizes_missing_rarity_and_unlock_level() -> None:
+    cards = [
+        make_card(1, CardRarity.COMMON),
+        make_card(2, CardRarity.RARE),
+        make_card(3, CardRarity.EPIC, unlock_level=10),
+        make_card(4, CardRarity.LEGENDARY, package=Package.CHINESE_PASTRY),
+    ]
+    catalog = CardCatalog(cards, version=1)
+
+    # 等级不足时史诗卡牌不进入卡池，其他卡包的传说卡牌不进入卡池，剩余稀有度按权重重新归一化
+    table = build_gacha_table(catalog, Package.BASE, level=1)
+    assert table is not None
+    total = RARITY_WEIGHTS[CardRarity.COMMON] + RARITY_WEIGHTS[CardRarity.RARE]
+    assert rarity_probabilities(table) == pytest.approx({
+        CardRarity.COMMON: RARITY_WEIGHTS[CardRarity.COMMON] / total,
+        CardRarity.RARE: RARITY_WEIGHTS[CardRarity.RARE] / total,
+    })
+
+    table = build_gacha_table(catalog, Package.BASE, level=10)
+    assert table is not None
+    assert {card.id for card in table.items} == {1, 2, 3}
+
+    assert build_gacha_table(catalog, 'unknown', level=10) is None
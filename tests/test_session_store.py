@@ -0,0 +1,133 @@
+"""
+RedisSessionStore 测试，使用 fakeredis 代替 Redis 服务
+
+    pip install .[test]
+    python -m pytest tests/test_session_store.py
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta, UTC
+from typing import Callable
+import pytest
+
+pytest.importorskip('tortoise')
+fakeredis = pytest.importorskip('fakeredis')
+
+from app.core.session_cache import SessionCache
+from app.core.session_store import MemorySessionStore, RedisSessionStore, SessionRecord, SessionStore
+
+
+def make_record(session_id: str = 'sid', expires_in: timedelta = timedelta(hours=1)) -> SessionRecord:
+    return SessionRecord(
+        session_id=session_id,
+        user_id='1',
+        expires_at=datetime.now(UTC) + expires_in,
+        user_agent='pytest',
+        ip_address='127.0.0.1',
+    )
+
+
+def make_store() -> RedisSessionStore:
+    return RedisSessionStore(fakeredis.aioredis.FakeRedis(), key_prefix='session:')
+
+
+def test_create_and_get() -> None:
+    async def main() -> None:
+        store = make_store()
+        record = make_record()
+        await store.save(record)
+
+        loaded = await store.get('sid')
+        assert loaded == record
+        # key 的过期时间与会话过期时间一致
+        ttl = await store.client.ttl('session:sid')
+        assert 3590 <= ttl <= 3600
+        assert await store.get('missing') is None
+
+    asyncio.run(main())
+
+
+def test_expire() -> None:
+    async def main() -> None:
+        store = make_store()
+
+        # 已经过期的会话不写入
+        await store.save(make_record('expired', expires_in=timedelta(seconds=-1)))
+        assert await store.client.exists('session:expired') == 0
+        assert await store.get('expired') is None
+
+        # key 到期后由 Redis 清理
+        await store.save(make_record('short'))
+        await store.client.pexpire('session:short', 1)
+        await asyncio.sleep(0.05)
+        assert await store.get('short') is None
+
+        # key 仍存在但会话时间已过期时视为不存在
+        stale = make_record('stale', expires_in=timedelta(seconds=-1)).to_dict()
+        await store.client.set('session:stale', json.dumps(stale), ex=60)
+        assert await store.get('stale') is None
+
+    asyncio.run(main())
+
+
+def test_delete() -> None:
+    async def main() -> None:
+        store = make_store()
+        await store.save(make_record())
+        await store.delete('sid')
+        assert await store.get('sid') is None
+        # 删除不存在的会话不报错
+        await store.delete('sid')
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('make_session_store', [make_store, MemorySessionStore])
+def test_logout_invalidates_other_worker_cache(make_session_store: Callable[[], SessionStore]) -> None:
+    async def main() -> None:
+        # 两个缓存实例模拟两个 worker 进程，共用同一个会话存储
+        store: SessionStore = make_session_store()
+        workers = [SessionCache(max_size=10, ttl_seconds=300, revocation_check_seconds=0) for _ in range(2)]
+        record = make_record()
+        await store.save(record)
+
+        async def verify(cache: SessionCache, session_id: str) -> SessionRecord | None:
+            await cache.sync_revocations(store)
+            cached = cache.get(session_id)
+            if cached is None:
+                cached = await store.get(session_id)
+                if cached is not None:
+                    cache.put(cached)
+            return cached
+
+        for cache in workers:
+            assert await verify(cache, 'sid') == record
+        assert workers[1].get('sid') == record
+
+        # 在第一个 worker 登出
+        workers[0].invalidate('sid')
+        await store.delete('sid')
+
+        assert await verify(workers[0], 'sid') is None
+        assert await verify(workers[1], 'sid') is None
+
+    asyncio.run(main())
+
+
+def test_revocation_check_interval() -> None:
+    async def main() -> None:
+        store = make_store()
+        cache = SessionCache(max_size=10, ttl_seconds=300, revocation_check_seconds=60)
+        await cache.sync_revocations(store)
+        cache.put(make_record())
+
+        # 间隔内不读取撤销记录，条目最多保留到下一次读取
+        await store.delete('sid')
+        await cache.sync_revocations(store)
+        assert cache.get('sid') is not None
+
+        cache.revocation_check_seconds = 0
+        await cache.sync_revocations(store)
+        assert cache.get('sid') is None
+
+    asyncio.run(main())